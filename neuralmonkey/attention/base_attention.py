@@ -22,6 +22,10 @@ input, and once in the *running* mode, in which it gets its own outputs. The
 histories object is constructed *after* the decoding and its construction
 should be triggered manually from the decoder by calling the ``finalize_loop``
 method.
+
+The histories are recorded only if the experiment needs them (see
+``Experiment.record_attention_histories``). Otherwise, the attention objects
+do not write to the arrays in the loop state and the histories stay empty.
 """
 from typing import NamedTuple, Dict, Optional, Any, Tuple, Union
 
@@ -30,6 +34,7 @@ import tensorflow as tf
 from neuralmonkey.model.stateful import TemporalStateful, SpatialStateful
 from neuralmonkey.model.model_part import ModelPart, FeedDict, InitializerSpecs
 from neuralmonkey.dataset import Dataset
+from neuralmonkey.tf_utils import float_dtype, records_attention_histories
 
 # pylint: disable=invalid-name
 Attendable = Union[TemporalStateful, SpatialStateful]
@@ -52,10 +57,10 @@ def empty_attention_loop_state() -> AttentionLoopStateTA:
     """
     return AttentionLoopStateTA(
         contexts=tf.TensorArray(
-            dtype=tf.float32, size=0, dynamic_size=True,
+            dtype=float_dtype(), size=0, dynamic_size=True,
             name="contexts"),
         weights=tf.TensorArray(
-            dtype=tf.float32, size=0, dynamic_size=True,
+            dtype=float_dtype(), size=0, dynamic_size=True,
             name="distributions", clear_after_read=False))
 
 
@@ -102,6 +107,7 @@ class BaseAttention(ModelPart):
 
         self.query_state_size = None  # type: tf.Tensor
         self._histories = {}  # type: Dict[str, tf.Tensor]
+        self.record_histories = records_attention_histories()
 
         with self.use_scope():
             self.train_mode = tf.placeholder(tf.bool, [], "train_mode")
@@ -110,6 +116,13 @@ class BaseAttention(ModelPart):
     def histories(self) -> Dict[str, tf.Tensor]:
         return self._histories
 
+    def write_history(self, history: tf.TensorArray, step: tf.Tensor,
+                      value: tf.Tensor) -> tf.TensorArray:
+        """Write a value to a history array if the histories are recorded."""
+        if not self.record_histories:
+            return history
+        return history.write(step, value)
+
     def attention(self,
                   query: tf.Tensor,
                   decoder_prev_state: tf.Tensor,
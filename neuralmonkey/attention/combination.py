@@ -164,7 +164,8 @@ class FlatMultiAttention(MultiAttention):
 
             if self._use_sentinels:
                 self._encoders_masks.append(
-                    tf.ones([tf.shape(self._encoders_masks[0])[0], 1]))
+                    tf.ones([tf.shape(self._encoders_masks[0])[0], 1],
+                            dtype=self._encoders_masks[0].dtype))
 
             self.masks_concat = tf.concat(self._encoders_masks, 1)
     # pylint: enable=too-many-arguments
@@ -256,8 +257,10 @@ class FlatMultiAttention(MultiAttention):
                 tf.expand_dims(attentions, 2) * projections_concat, [1])
 
             next_loop_state = AttentionLoopStateTA(
-                contexts=loop_state.contexts.write(step, contexts),
-                weights=loop_state.weights.write(step, attentions))
+                contexts=self.write_history(
+                    loop_state.contexts, step, contexts),
+                weights=self.write_history(
+                    loop_state.weights, step, attentions))
 
             return contexts, next_loop_state
     # pylint: enable=too-many-locals
@@ -288,7 +291,8 @@ class FlatMultiAttention(MultiAttention):
                       last_loop_state: AttentionLoopStateTA) -> None:
         # TODO factorization of the flat distribution across encoders
         # could take place here.
-        self.histories[key] = last_loop_state.weights.stack()
+        if self.record_histories:
+            self.histories[key] = last_loop_state.weights.stack()
 
 
 def _sentinel(state, prev_state, input_):
@@ -411,8 +415,10 @@ class HierarchicalMultiAttention(MultiAttention):
                 tf.expand_dims(attention_distr, 2) * projections_concat, [1])
 
             prev_loop_state = loop_state.loop_state
-            next_contexts = prev_loop_state.contexts.write(step, context)
-            next_weights = prev_loop_state.weights.write(step, attention_distr)
+            next_contexts = self.write_history(
+                prev_loop_state.contexts, step, context)
+            next_weights = self.write_history(
+                prev_loop_state.weights, step, attention_distr)
 
             next_loop_state = AttentionLoopStateTA(
                 contexts=next_contexts,
@@ -430,7 +436,8 @@ class HierarchicalMultiAttention(MultiAttention):
                 self.attentions, last_loop_state.child_loop_states):
             c_attention.finalize_loop(key, c_loop_state)
 
-        self.histories[key] = last_loop_state.loop_state.weights.stack()
+        if self.record_histories:
+            self.histories[key] = last_loop_state.loop_state.weights.stack()
 
     @property
     def context_vector_size(self) -> int:
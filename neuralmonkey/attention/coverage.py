@@ -29,6 +29,8 @@ class CoverageAttention(Attention):
                            save_checkpoint, load_checkpoint, initializers)
 
         self.max_fertility = max_fertility
+        # the coverage is computed from the previous attention weights
+        self.record_histories = True
 
         self.coverage_weights = tf.get_variable(
             "coverage_matrix", [1, 1, 1, self.state_size])
@@ -46,11 +48,12 @@ class CoverageAttention(Attention):
             lambda: 0.0)
 
         coverage = weight_sum / self.fertility * self.attention_mask
-        coverage_exp = tf.expand_dims(tf.expand_dims(coverage, -1), -1)
-        logits = tf.reduce_sum(
-            self.similarity_bias_vector * tf.tanh(
-                self.hidden_features + y
-                + self.coverage_weights * coverage_exp),
-            [2, 3])
+        coverage_exp = tf.expand_dims(coverage[:, :self.num_keys], -1)
+        coverage_weights = tf.reshape(self.coverage_weights,
+                                      [1, 1, self.state_size])
+        logits = tf.tensordot(
+            tf.tanh(self.hidden_features + y
+                    + coverage_weights * coverage_exp),
+            self.similarity_bias_vector, axes=1)
 
         return logits
@@ -3,6 +3,12 @@
 This is the attention mechanism used in Bahdanau et al. (2015)
 
 See arxiv.org/abs/1409.0473
+
+The keys are projected once for all the decoder steps by a single matrix
+multiplication. The attention works only with the encoder positions up to the
+last one that is not masked out in some sequence of the batch, so the padding
+shared by all the sequences (e.g., in bucketed batches from fixed-length
+encoders) is skipped.
 """
 from typing import Optional, Tuple
 
@@ -19,6 +25,27 @@ from neuralmonkey.model.model_part import InitializerSpecs
 from neuralmonkey.tf_utils import get_variable
 
 
+def masked_softmax(energies: tf.Tensor,
+                   mask: Optional[tf.Tensor]) -> tf.Tensor:
+    """Compute the softmax over the positions where the mask is nonzero.
+
+    The rows with all the positions masked out get zero weights.
+
+    Arguments:
+        energies: The energies of shape ``(batch, time)``.
+        mask: A float mask of zeros and ones of the same shape or None.
+    """
+    if mask is None:
+        return tf.nn.softmax(energies)
+
+    condition = tf.greater(mask, 0)
+    masked_energies = tf.where(
+        condition, energies, tf.fill(tf.shape(energies), energies.dtype.min))
+    nonempty_rows = tf.reduce_any(condition, axis=1, keep_dims=True)
+    return tf.nn.softmax(masked_energies) * tf.cast(nonempty_rows,
+                                                    energies.dtype)
+
+
 class Attention(BaseAttention):
 
     def __init__(self,
@@ -102,24 +129,46 @@ class Attention(BaseAttention):
     # pylint: enable=no-self-use
 
     @tensor
-    def _att_states_reshaped(self) -> tf.Tensor:
-        # To calculate W1 * h_t we use a 1-by-1 convolution, need to
-        # reshape before.
-        return tf.expand_dims(self.attention_states, 2)
+    def num_keys(self) -> tf.Tensor:
+        """Get the number of the encoder positions used by the attention.
+
+        These are the positions up to the last one that is not masked out in
+        some sequence of the batch. The masks need not be prefixes.
+        """
+        if self.attention_mask is None:
+            return tf.shape(self.attention_states)[1]
+
+        used_positions = tf.reduce_any(
+            tf.greater(self.attention_mask, 0), axis=0)
+        return tf.reduce_max(
+            tf.range(1, tf.shape(self.attention_mask)[1] + 1)
+            * tf.to_int32(used_positions))
+
+    @tensor
+    def keys(self) -> tf.Tensor:
+        return self.attention_states[:, :self.num_keys]
+
+    @tensor
+    def keys_mask(self) -> Optional[tf.Tensor]:
+        if self.attention_mask is None:
+            return None
+        return self.attention_mask[:, :self.num_keys]
 
     @tensor
     def hidden_features(self) -> tf.Tensor:
         # This variable corresponds to Bahdanau's U_a in the paper
-        key_proj_reshaped = tf.expand_dims(
-            tf.expand_dims(self.key_projection_matrix, 0), 0)
+        keys_shape = tf.shape(self.keys)
+        flat_keys = tf.reshape(self.keys, [-1, self.context_vector_size])
 
-        return tf.nn.conv2d(
-            self._att_states_reshaped, key_proj_reshaped, [1, 1, 1, 1], "SAME")
+        return tf.reshape(
+            tf.matmul(flat_keys, self.key_projection_matrix),
+            [keys_shape[0], keys_shape[1], self.state_size])
 
     def get_energies(self, y, _):
-        return tf.reduce_sum(
-            self.similarity_bias_vector * tf.tanh(self.hidden_features + y),
-            [2, 3]) + self.bias_term
+        # the product with the vector as a single matrix multiplication
+        return tf.tensordot(
+            tf.tanh(self.hidden_features + y),
+            self.similarity_bias_vector, axes=1) + self.bias_term
 
     def attention(self,
                   query: tf.Tensor,
@@ -131,32 +180,25 @@ class Attention(BaseAttention):
 
         y = tf.matmul(query, self.query_projection_matrix)
         y = y + self.projection_bias_vector
-        y = tf.reshape(y, [-1, 1, 1, self.state_size])
+        y = tf.expand_dims(y, 1)
 
         energies = self.get_energies(y, loop_state.weights.identity())
-
-        if self.attention_mask is None:
-            weights = tf.nn.softmax(energies)
-        else:
-            weights_all = tf.nn.softmax(energies) * self.attention_mask
-            norm = tf.reduce_sum(weights_all, 1, keep_dims=True) + 1e-8
-            weights = weights_all / norm
-
-            # condition = tf.equal(self.attention_mask, 1)
-            # masked_logits = tf.where(
-            #     tf.tile(condition, [tf.shape(energies)[0], 1]),
-            #     energies, -np.inf * tf.ones_like(energies))
-            # weights = tf.nn.softmax(masked_logits)
+        weights = masked_softmax(energies, self.keys_mask)
 
         # Now calculate the attention-weighted vector d.
-        context = tf.reduce_sum(
-            tf.expand_dims(tf.expand_dims(weights, -1), -1)
-            * self._att_states_reshaped, [1, 2])
-        context = tf.reshape(context, [-1, self.context_vector_size])
+        context = tf.squeeze(
+            tf.matmul(tf.expand_dims(weights, 1), self.keys), axis=1)
+        context.set_shape([None, self.context_vector_size])
+
+        # the history covers all the encoder positions
+        padded_weights = tf.pad(
+            weights, [[0, 0], [0, tf.shape(self.attention_states)[1]
+                               - self.num_keys]])
 
         next_loop_state = AttentionLoopStateTA(
-            contexts=loop_state.contexts.write(step, context),
-            weights=loop_state.weights.write(step, weights))
+            contexts=self.write_history(loop_state.contexts, step, context),
+            weights=self.write_history(
+                loop_state.weights, step, padded_weights))
 
         return context, next_loop_state
 
@@ -165,4 +207,5 @@ class Attention(BaseAttention):
 
     def finalize_loop(self, key: str,
                       last_loop_state: AttentionLoopStateTA) -> None:
-        self.histories[key] = last_loop_state.weights.stack()
+        if self.record_histories:
+            self.histories[key] = last_loop_state.weights.stack()
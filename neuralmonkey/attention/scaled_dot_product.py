@@ -4,10 +4,15 @@ The attention energies are computed as dot products between the query vector
 and the key vector. The query vector is scaled down by the square root of its
 dimensionality. This attention function has no trainable parameters.
 
+For long sequences, the attention can be computed in chunks of queries and
+keys with an online softmax, so the full matrix of the energies is never
+built. This saves memory only at inference time, the backward pass would keep
+the energies of all the chunks, so the full attention is used in training.
+
 See arxiv.org/abs/1706.03762
 """
 import math
-from typing import Tuple, List, NamedTuple, Callable
+from typing import Tuple, List, NamedTuple, Callable, Optional
 
 import tensorflow as tf
 from typeguard import check_argument_types
@@ -16,6 +21,7 @@ from neuralmonkey.nn.utils import dropout
 from neuralmonkey.model.model_part import InitializerSpecs
 from neuralmonkey.attention.base_attention import (
     BaseAttention, Attendable, get_attention_states, get_attention_mask)
+from neuralmonkey.tf_utils import float_dtype
 
 # pylint: disable=invalid-name
 MultiHeadLoopStateTA = NamedTuple("MultiHeadLoopStateTA",
@@ -45,6 +51,30 @@ def split_for_heads(x: tf.Tensor, n_heads: int, head_dim: int) -> tf.Tensor:
     return tf.transpose(x_4d, perm=[0, 2, 1, 3])
 
 
+def _safe_mask_value(mask_value: float, dtype: tf.DType) -> float:
+    """Clip the mask value to the range of the energies dtype.
+
+    In half precision, -1e9 overflows to negative infinity, which would give
+    NaN after multiplying with zero or subtracting the maximum.
+    """
+    return max(mask_value, float(dtype.min))
+
+
+def _apply_mask(energies: tf.Tensor, mask: tf.Tensor,
+                mask_value: float) -> tf.Tensor:
+    """Replace the energies where the mask is zero with the mask value.
+
+    The mask of zeros and ones is broadcast to the shape of the energies,
+    so no full-size condition or tensor of the mask values is built.
+    """
+    mask_value = _safe_mask_value(mask_value, energies.dtype)
+
+    # Energies are log probabilities, so setting the invalid energies to
+    # negative infinity (aka -1e9 for compatibility with tensor2tensor) yields
+    # probability of zero to the padded positions.
+    return energies * mask + (1 - mask) * mask_value
+
+
 def mask_energies(energies_4d: tf.Tensor,
                   mask: tf.Tensor,
                   mask_value=-1e9) -> tf.Tensor:
@@ -63,13 +93,9 @@ def mask_energies(energies_4d: tf.Tensor,
     NOTE:
         We do not use ``mask_value=-np.inf`` to avoid potential underflow.
     """
-    mask_4d = tf.expand_dims(tf.expand_dims(mask, 1), 1)
-    energies_all = energies_4d * mask_4d
-
-    # Energies are log probabilities, so setting the invalid energies to
-    # negative infinity (aka -1e9 for compatibility with tensor2tensor) yields
-    # probability of zero to the padded positions.
-    return energies_all + (1.0 - mask_4d) * mask_value
+    mask_4d = tf.expand_dims(
+        tf.expand_dims(tf.cast(mask, energies_4d.dtype), 1), 1)
+    return _apply_mask(energies_4d, mask_4d, mask_value)
 
 
 def mask_future(energies: tf.Tensor, mask_value=-1e9) -> tf.Tensor:
@@ -92,11 +118,162 @@ def mask_future(energies: tf.Tensor, mask_value=-1e9) -> tf.Tensor:
 
     # Note that for compatibility with tensor2tensor, we use -1e9 for negative
     # infinity.
-    masked_value = tf.fill(tf.shape(energies), mask_value)
+    masked_value = tf.fill(tf.shape(energies),
+                           _safe_mask_value(mask_value, energies.dtype))
     return tf.where(mask_area, energies, masked_value)
 
 
-# pylint: disable=too-many-locals
+# pylint: disable=too-many-locals,too-many-arguments
+def chunked_attention(
+        queries: tf.Tensor,
+        keys: tf.Tensor,
+        values: tf.Tensor,
+        keys_mask: Optional[tf.Tensor],
+        chunk_size: int,
+        dropout_callback: Callable[[tf.Tensor], tf.Tensor],
+        masked: bool = False,
+        mask_value: float = -1e9) -> tf.Tensor:
+    """Compute the attention contexts in chunks using an online softmax.
+
+    The queries are processed in blocks of ``chunk_size``. For each block,
+    the keys are processed in blocks of the same size and the contexts are
+    accumulated together with the running maximum and sum of the exponentiated
+    energies, which rescale the partial results. Only the energies of a pair
+    of blocks exist at a time, so the memory does not grow with the product
+    of the sequence lengths. The contexts and their gradients are the same
+    as from the full softmax.
+
+    The memory is saved only in the forward pass, i.e. at inference time.
+    For the backward pass, the while loops keep the energies of all the
+    pairs of blocks, so training needs as much memory as the full attention,
+    which ``attention`` computes instead when given the train mode.
+
+    Arguments:
+        queries: Scaled queries of shape ``(batch, head, time(q), dim)``.
+        keys: Keys of shape ``(batch, head, time(k), dim)``.
+        values: Values of shape ``(batch, head, time(k), v_dim)``.
+        keys_mask: A float Tensor for masking sequences in keys.
+        chunk_size: The number of queries and keys in a block.
+        dropout_callback: Callable function implementing dropout.
+        masked: Boolean indicating whether we want to mask future energies.
+        mask_value: Value used to mask energies.
+
+    Returns:
+        Contexts of shape ``(batch, head, time(q), v_dim)``.
+    """
+    if chunk_size <= 0:
+        raise ValueError("Chunk size must be greater than zero.")
+
+    mask_value = _safe_mask_value(mask_value, queries.dtype)
+    time_q = tf.shape(queries)[2]
+    time_k = tf.shape(keys)[2]
+    num_q_chunks = (time_q + chunk_size - 1) // chunk_size
+    num_k_chunks = (time_k + chunk_size - 1) // chunk_size
+
+    def key_chunk(q_start, q_chunk, k_index, max_energies, sums, contexts):
+        k_start = k_index * chunk_size
+        k_end = k_start + chunk_size
+        k_chunk = keys[:, :, k_start:k_end]
+        energies = tf.matmul(q_chunk, k_chunk, transpose_b=True)
+
+        # the mask is broadcast to the shape of the energies
+        valid = None  # type: Optional[tf.Tensor]
+        if keys_mask is not None:
+            valid = tf.expand_dims(tf.expand_dims(
+                tf.cast(keys_mask[:, k_start:k_end], energies.dtype), 1), 1)
+        if masked:
+            q_positions = q_start + tf.range(tf.shape(q_chunk)[2])
+            k_positions = k_start + tf.range(tf.shape(k_chunk)[2])
+            future = tf.cast(tf.greater_equal(
+                tf.expand_dims(q_positions, 1),
+                tf.expand_dims(k_positions, 0)), energies.dtype)
+            valid = future if valid is None else valid * future
+        if valid is not None:
+            energies = _apply_mask(energies, valid, mask_value)
+
+        new_max = tf.maximum(
+            max_energies, tf.reduce_max(energies, axis=-1, keep_dims=True))
+        correction = tf.exp(max_energies - new_max)
+        exp_energies = tf.exp(energies - new_max)
+
+        new_sums = sums * correction + tf.reduce_sum(
+            exp_energies, axis=-1, keep_dims=True)
+        new_contexts = contexts * correction + tf.matmul(
+            dropout_callback(exp_energies), values[:, :, k_start:k_end])
+
+        return q_start, q_chunk, k_index + 1, new_max, new_sums, new_contexts
+
+    def query_chunk(q_index, contexts_ta):
+        q_start = q_index * chunk_size
+        q_chunk = queries[:, :, q_start:q_start + chunk_size]
+
+        stats_shape = tf.concat([tf.shape(q_chunk)[:-1], [1]], 0)
+        contexts_shape = tf.concat(
+            [tf.shape(q_chunk)[:-1], tf.shape(values)[-1:]], 0)
+
+        _, _, _, _, sums, contexts = tf.while_loop(
+            lambda *args: args[2] < num_k_chunks,
+            key_chunk,
+            [q_start, q_chunk, tf.constant(0),
+             tf.fill(stats_shape, tf.constant(mask_value, queries.dtype)),
+             tf.zeros(stats_shape, queries.dtype),
+             tf.zeros(contexts_shape, queries.dtype)])
+
+        # time-major, so the chunks can be concatenated
+        return q_index + 1, contexts_ta.write(
+            q_index, tf.transpose(contexts / sums, perm=[2, 0, 1, 3]))
+
+    _, contexts_ta = tf.while_loop(
+        lambda q_index, _: q_index < num_q_chunks,
+        query_chunk,
+        [tf.constant(0),
+         tf.TensorArray(dtype=queries.dtype, size=num_q_chunks,
+                        infer_shape=False, name="chunked_contexts")])
+
+    return tf.transpose(contexts_ta.concat(), perm=[1, 2, 0, 3])
+# pylint: enable=too-many-locals,too-many-arguments
+
+
+def _full_attention(
+        queries: tf.Tensor,
+        keys: tf.Tensor,
+        values: tf.Tensor,
+        keys_mask: Optional[tf.Tensor],
+        dropout_callback: Callable[[tf.Tensor], tf.Tensor],
+        masked: bool) -> Tuple[tf.Tensor, tf.Tensor]:
+    """Compute the contexts and weights from the full energy matrix.
+
+    The arguments are the same as of ``chunked_attention``.
+
+    Returns:
+        Contexts of shape ``(batch, head, time(q), v_dim)`` and weights of
+        shape ``(batch, head, time(q), time(k))``.
+    """
+    # For dot-product, we use matrix multiplication
+    # shape: batch, head, time(q), time(k) (k_channels is the matmul axis)
+    energies = tf.matmul(queries, keys, transpose_b=True)
+
+    # To protect the attention from looking ahead of time, we must
+    # replace the energies of future keys with negative infinity
+    if masked:
+        energies = mask_future(energies)
+
+    # To exclude the padded positions (those after the end of sentence),
+    # we mask the attention energies given this mask.
+    if keys_mask is not None:
+        energies = mask_energies(energies, keys_mask)
+
+    # Softmax along the last axis
+    # shape: batch, head, time(q), time(k)
+    weights = tf.nn.softmax(energies)
+
+    # apply dropout to the weights (Attention Dropout)
+    weights = dropout_callback(weights)
+
+    return tf.matmul(weights, values), weights
+
+
+# pylint: disable=too-many-locals,too-many-arguments
 # TODO split this to more functions
 def attention(
         queries: tf.Tensor,
@@ -106,7 +283,10 @@ def attention(
         num_heads: int,
         dropout_callback: Callable[[tf.Tensor], tf.Tensor],
         masked: bool = False,
-        use_bias: bool = False) -> tf.Tensor:
+        use_bias: bool = False,
+        chunk_size: int = None,
+        train_mode: tf.Tensor = None) -> Tuple[tf.Tensor,
+                                               Optional[tf.Tensor]]:
     """Run multi-head scaled dot-product attention.
 
     See arxiv.org/abs/1706.03762
@@ -139,10 +319,17 @@ def attention(
         num_heads: Number of attention heads.
         dropout_callback: Callable function implementing dropout.
         masked: Boolean indicating whether we want to mask future energies.
+        use_bias: Add bias when transforming qkv vectors.
+        chunk_size: If set, compute the contexts with ``chunked_attention``
+            in blocks of this size. The weights are not computed then. This
+            saves memory only at inference time.
+        train_mode: Boolean scalar, if given with ``chunk_size``, the full
+            attention is computed in training and the chunked one otherwise.
 
     Returns:
         Contexts of shape ``(batch, time(q), v_channels)`` and
-        weights of shape ``(batch, time(q), time(k))``.
+        weights of shape ``(batch, n_heads, time(q), time(k))``, or None
+        when the attention is chunked.
     """
     if num_heads <= 0:
         raise ValueError("Number of heads must be greater than zero.")
@@ -187,28 +374,24 @@ def attention(
     keys = split_for_heads(keys, num_heads, head_dim)
     values = split_for_heads(values, num_heads, head_dim)
 
-    # For dot-product, we use matrix multiplication
-    # shape: batch, head, time(q), time(k) (k_channels is the matmul axis)
-    energies = tf.matmul(queries, keys, transpose_b=True)
-
-    # To protect the attention from looking ahead of time, we must replace the
-    # energies of future keys with negative infinity
-    if masked:
-        energies = mask_future(energies)
-
-    # To exclude the padded positions (those after the end of sentence),
-    # we mask the attention energies given this mask.
-    if keys_mask is not None:
-        energies = mask_energies(energies, keys_mask)
-
-    # Softmax along the last axis
-    # shape: batch, head, time(q), time(k)
-    weights = tf.nn.softmax(energies)
-
-    # apply dropout to the weights (Attention Dropout)
-    weights = dropout_callback(weights)
-
-    context = tf.matmul(weights, values)
+    if chunk_size is None:
+        context, weights = _full_attention(
+            queries, keys, values, keys_mask, dropout_callback, masked)
+    else:
+        weights = None
+
+        def chunked() -> tf.Tensor:
+            return chunked_attention(queries, keys, values, keys_mask,
+                                     chunk_size, dropout_callback, masked)
+
+        if train_mode is None:
+            context = chunked()
+        else:
+            context = tf.cond(
+                train_mode,
+                lambda: _full_attention(queries, keys, values, keys_mask,
+                                        dropout_callback, masked)[0],
+                chunked)
 
     # transpose and reshape to shape [batch, time(q), v_channels]
     context_shape = tf.shape(context)
@@ -221,16 +404,16 @@ def attention(
             context, queries_dim, use_bias=use_bias, name="output_proj")
 
     return context, weights
-# pylint: enable=too-many-locals
+# pylint: enable=too-many-locals,too-many-arguments
 
 
 def empty_multi_head_loop_state(num_heads: int) -> MultiHeadLoopStateTA:
     return MultiHeadLoopStateTA(
         contexts=tf.TensorArray(
-            dtype=tf.float32, size=0, dynamic_size=True,
+            dtype=float_dtype(), size=0, dynamic_size=True,
             name="contexts"),
         head_weights=[tf.TensorArray(
-            dtype=tf.float32, size=0, dynamic_size=True,
+            dtype=float_dtype(), size=0, dynamic_size=True,
             name="distributions_head{}".format(i)) for i in range(num_heads)])
 
 
@@ -310,10 +493,11 @@ class MultiHeadAttention(BaseAttention):
         context = tf.squeeze(context_3d, axis=1)
         head_weights = [tf.squeeze(w, axis=[1, 2]) for w in head_weights_3d]
 
-        next_contexts = loop_state.contexts.write(step, context)
-        next_head_weights = [loop_state.head_weights[i].write(step,
-                                                              head_weights[i])
-                             for i in range(self.n_heads)]
+        next_contexts = self.write_history(loop_state.contexts, step, context)
+        next_head_weights = [
+            self.write_history(loop_state.head_weights[i], step,
+                               head_weights[i])
+            for i in range(self.n_heads)]
 
         next_loop_state = MultiHeadLoopStateTA(
             contexts=next_contexts,
@@ -326,6 +510,9 @@ class MultiHeadAttention(BaseAttention):
 
     def finalize_loop(self, key: str,
                       last_loop_state: MultiHeadLoopStateTA) -> None:
+        if not self.record_histories:
+            return
+
         for i in range(self.n_heads):
             head_weights = last_loop_state.head_weights[i].stack()
             self.histories["{}_head{}".format(key, i)] = head_weights
@@ -63,11 +63,11 @@ class StatefulContext(BaseAttention):
                   step: tf.Tensor) -> Tuple[tf.Tensor, AttentionLoopStateTA]:
         context = tf.reshape(self.attention_states,
                              [-1, self.context_vector_size])
-        weights = tf.ones(shape=[tf.shape(context)[0]])
+        weights = tf.ones(shape=[tf.shape(context)[0]], dtype=context.dtype)
 
         next_loop_state = AttentionLoopStateTA(
-            contexts=loop_state.contexts.write(step, context),
-            weights=loop_state.weights.write(step, weights))
+            contexts=self.write_history(loop_state.contexts, step, context),
+            weights=self.write_history(loop_state.weights, step, weights))
 
         return context, next_loop_state
 
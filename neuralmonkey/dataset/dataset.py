@@ -180,3 +180,16 @@ class Dataset(collections.Sized):
                          for k, v in self._series.items()}
 
         return Dataset(subset_name, subset_series, subset_outputs)
+
+    def shard(self, index: int, num_shards: int) -> "Dataset":
+        """Return one of the equally sized parts of the dataset.
+
+        Arguments:
+            index: The index of the shard.
+            num_shards: The number of shards the dataset is split into.
+
+        Returns:
+            The contiguous part of the dataset with the given index.
+        """
+        shard_size = -(-len(self) // num_shards)
+        return self.subset(index * shard_size, shard_size)
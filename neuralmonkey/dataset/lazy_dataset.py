@@ -1,10 +1,12 @@
 """Lazy dataset which does not load the whole data into memory."""
+import copy
 import os
 from itertools import islice
 from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from typeguard import check_argument_types
 from neuralmonkey.dataset.dataset import Dataset
+from neuralmonkey.profiling import Profiler
 
 # pylint: disable=invalid-name
 Reader = Callable[[List[str]], Any]
@@ -100,6 +102,7 @@ class LazyDataset(Dataset):
             src_series = self.maybe_get_series(src_id)
             if src_series is None:
                 return None
+            func = Profiler.wrap("preprocess", func)
             return (func(item) for item in src_series)
 
     def get_series(self, name: str) -> Iterable:
@@ -123,6 +126,7 @@ class LazyDataset(Dataset):
         elif name in self.preprocess_series:
             src_id, func = self.preprocess_series[name]
             src_series = self.get_series(src_id)
+            func = Profiler.wrap("preprocess", func)
             return (func(item) for item in src_series)
         else:
             raise KeyError("Series '{}' is not in the dataset.".format(name))
@@ -154,3 +158,32 @@ class LazyDataset(Dataset):
             for s_id in self.series_ids}
 
         return Dataset(subset_name, subset_series, subset_outputs)
+
+    def shard(self, index: int, num_shards: int) -> "LazyDataset":
+        """Return a lazy dataset with every n-th item of this one.
+
+        Unlike ``subset``, the shard is not loaded into the memory.
+
+        Arguments:
+            index: The index of the shard.
+            num_shards: The number of shards the dataset is split into.
+
+        Returns:
+            The lazy dataset of the items whose position modulo
+            ``num_shards`` is ``index``.
+        """
+        sharded = copy.copy(self)
+        sharded.name = "{}.shard-{}".format(self.name, index)
+        sharded.series_paths_and_readers = {
+            name: (paths, _sharded_reader(reader, index, num_shards))
+            for name, (paths, reader)
+            in self.series_paths_and_readers.items()}
+
+        return sharded
+
+
+def _sharded_reader(reader: Reader, index: int, num_shards: int) -> Reader:
+    def sharded(files: List[str]) -> Iterable[Any]:
+        return islice(reader(files), index, None, num_shards)
+
+    return sharded
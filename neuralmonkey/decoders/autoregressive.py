@@ -6,21 +6,32 @@ The autoregressive decoder uses the while loop to get the outputs.
 Descendants should only specify the initial state and the while loop body.
 """
 from typing import (
-    NamedTuple, Callable, Tuple, cast, Type, List, Optional, Any)
+    NamedTuple, Callable, Tuple, cast, Type, List, Optional, Any, Dict,
+    Union)
 
 import numpy as np
 import tensorflow as tf
 
 from neuralmonkey.dataset import Dataset
+from neuralmonkey.decoders.shortlist import LexicalShortlist
 from neuralmonkey.decorators import tensor
 from neuralmonkey.model.model_part import ModelPart, FeedDict, InitializerSpecs
 from neuralmonkey.logging import log, warn
 from neuralmonkey.model.sequence import EmbeddedSequence
+from neuralmonkey.nn.softmax import (
+    SOFTMAX_TYPES, adaptive_softmax_logprobs, adaptive_softmax_xent,
+    frequency_clusters, sampled_softmax_xent, smoothed_softmax_xent)
 from neuralmonkey.nn.utils import dropout
-from neuralmonkey.tf_utils import get_variable
+from neuralmonkey.quantization import gather
+from neuralmonkey.tf_utils import (get_variable, float_dtype,
+                                   outside_control_flow)
 from neuralmonkey.vocabulary import Vocabulary, START_TOKEN, UNK_TOKEN_INDEX
 
 
+# The logit of the words outside the shortlist, representable in float16.
+SHORTLIST_PENALTY = -1e4
+
+
 def extend_namedtuple(name: str, parent: Type,
                       fields: List[Tuple[str, Type]]) -> Type:
     """Extend a named tuple to contain more elements."""
@@ -46,7 +57,9 @@ DecoderHistories = NamedTuple(
     [("logits", tf.TensorArray),
      ("decoder_outputs", tf.TensorArray),
      ("outputs", tf.TensorArray),
-     ("mask", tf.TensorArray)])  # float matrix, 0s and 1s
+     ("mask", tf.TensorArray),  # float matrix, 0s and 1s
+     ("top_k_logprobs", tf.TensorArray),  # runtime only, see runtime_top_k
+     ("top_k_ids", tf.TensorArray)])
 
 DecoderConstants = NamedTuple(
     "DecoderConstants",
@@ -75,6 +88,11 @@ class AutoregressiveDecoder(ModelPart):
                  tie_embeddings: bool = False,
                  label_smoothing: float = None,
                  supress_unk: bool = False,
+                 softmax: str = "full",
+                 num_sampled: int = 1024,
+                 adaptive_cutoffs: List[int] = None,
+                 shortlist: LexicalShortlist = None,
+                 runtime_top_k: int = None,
                  save_checkpoint: str = None,
                  load_checkpoint: str = None,
                  initializers: InitializerSpecs = None) -> None:
@@ -94,6 +112,19 @@ class AutoregressiveDecoder(ModelPart):
             label_smoothing: Label smoothing parameter.
             supress_unk: If true, decoder will not produce symbols for unknown
                 tokens.
+            softmax: The training objective over the vocabulary. One of
+                'full', 'sampled' (sampled softmax), 'nce' (noise-contrastive
+                estimation) and 'adaptive' (frequency-clustered softmax). The
+                adaptive softmax decodes with its log-probabilities, the other
+                objectives with the full softmax.
+            num_sampled: Number of sampled words for 'sampled' and 'nce'.
+            adaptive_cutoffs: Sizes of the head and the head with the tail
+                clusters of the 'adaptive' softmax, e.g. [2000, 10000].
+            shortlist: A lexical shortlist. If given, the logits are computed
+                only for the candidate words when decoding.
+            runtime_top_k: If given, the decoding loop stores this many best
+                log-probabilities and their word ids in each step (see
+                ``runtime_top_k_logprobs``).
         """
         ModelPart.__init__(self, name, save_checkpoint, load_checkpoint,
                            initializers)
@@ -109,6 +140,12 @@ class AutoregressiveDecoder(ModelPart):
         self.label_smoothing = label_smoothing
         self.tie_embeddings = tie_embeddings
         self.supress_unk = supress_unk
+        self.softmax = softmax
+        self.num_sampled = num_sampled
+        self.adaptive_cutoffs = adaptive_cutoffs
+        self.shortlist = shortlist
+        self.runtime_top_k = runtime_top_k
+        self._runtime_histories = None  # type: Optional[DecoderHistories]
 
         # check the values of the parameters (max_output_len, ...)
         if max_output_len <= 0:
@@ -119,6 +156,21 @@ class AutoregressiveDecoder(ModelPart):
             raise ValueError("Dropout keep probability must be"
                              "a real number in the interval [0,1].")
 
+        if softmax not in SOFTMAX_TYPES:
+            raise ValueError("Unknown softmax '{}', use one of {}".format(
+                softmax, ", ".join(SOFTMAX_TYPES)))
+
+        if softmax == "adaptive" and not adaptive_cutoffs:
+            raise ValueError("The adaptive softmax needs adaptive_cutoffs.")
+
+        if softmax != "full" and label_smoothing:
+            warn("Label smoothing is only used with the full softmax.")
+
+        if runtime_top_k is not None and not 0 < runtime_top_k <= len(
+                vocabulary):
+            raise ValueError("The runtime top k must be between 1 and the "
+                             "vocabulary size.")
+
         if self.embedding_size is None and self.embeddings_source is None:
             raise ValueError("You must specify either embedding size or the "
                              "embedded sequence from which to reuse the "
@@ -140,7 +192,11 @@ class AutoregressiveDecoder(ModelPart):
             self.train_inputs = tf.placeholder(
                 tf.int32, [None, None], "train_inputs")
             self.train_mask = tf.placeholder(
-                tf.float32, [None, None], "train_mask")
+                float_dtype(), [None, None], "train_mask")
+
+            # the whole vocabulary unless a shortlist is fed
+            self.shortlist_ids = tf.placeholder_with_default(
+                tf.range(len(self.vocabulary)), [None], "shortlist_ids")
     # pylint: enable=too-many-arguments
 
     @tensor
@@ -167,7 +223,7 @@ class AutoregressiveDecoder(ModelPart):
     @tensor
     def decoding_b(self) -> Optional[tf.Variable]:
         if self.tie_embeddings:
-            return tf.zeros(len(self.vocabulary))
+            return tf.zeros(len(self.vocabulary), dtype=float_dtype())
 
         with tf.name_scope("output_projection"):
             return get_variable(
@@ -175,6 +231,29 @@ class AutoregressiveDecoder(ModelPart):
                 [len(self.vocabulary)],
                 initializer=tf.zeros_initializer())
 
+    @tensor
+    def adaptive_cluster_projection(self) -> Tuple[tf.Variable, tf.Variable]:
+        """Get the weights and biases of the adaptive softmax clusters."""
+        cutoffs, _, _ = frequency_clusters(self.vocabulary,
+                                           self.adaptive_cutoffs)
+        num_clusters = len(cutoffs) - 1
+
+        with tf.name_scope("output_projection"):
+            weights = get_variable(
+                "adaptive_cluster_W", [num_clusters, self.output_dimension],
+                initializer=tf.glorot_uniform_initializer())
+            biases = get_variable(
+                "adaptive_cluster_b", [num_clusters],
+                initializer=tf.zeros_initializer())
+
+        return weights, biases
+
+    def _word_projection(self) -> Tuple[tf.Tensor, tf.Tensor]:
+        """Get the output projection with a row for each word."""
+        if self.tie_embeddings:
+            return self.embedding_matrix, self.decoding_b
+        return tf.transpose(self.decoding_w), self.decoding_b
+
     @tensor
     def embedding_matrix(self) -> tf.Variable:
         """Variables and operations for embedding of input words.
@@ -192,18 +271,109 @@ class AutoregressiveDecoder(ModelPart):
             shape=[len(self.vocabulary), self.embedding_size],
             initializer=tf.glorot_uniform_initializer())
 
-    def get_logits(self, state: tf.Tensor) -> tf.Tensor:
-        """Project the decoder's output layer to logits over the vocabulary."""
+    @tensor
+    def shortlist_projection(self) -> Tuple[tf.Tensor, tf.Tensor, tf.Tensor]:
+        """Get the output projection restricted to the shortlist.
+
+        Returns:
+            The shortlisted columns of the weight matrix, the shortlisted
+            biases and the logit penalty of the words not in the shortlist.
+        """
+        # computed once per run, even when first needed inside a loop
+        with outside_control_flow():
+            if self.tie_embeddings:
+                weights = tf.transpose(gather(
+                    self.embedding_matrix, self.shortlist_ids))
+            else:
+                weights = gather(self.decoding_w, self.shortlist_ids, axis=1)
+            biases = tf.gather(self.decoding_b, self.shortlist_ids)
+
+            in_shortlist = tf.scatter_nd(
+                tf.expand_dims(self.shortlist_ids, 1),
+                tf.ones_like(self.shortlist_ids, dtype=float_dtype()),
+                [len(self.vocabulary)])
+            penalty = (1 - in_shortlist) * SHORTLIST_PENALTY
+
+        return weights, biases, penalty
+
+    def get_logits(self, state: tf.Tensor,
+                   use_shortlist: bool = False) -> tf.Tensor:
+        """Project the decoder's output layer to logits over the vocabulary.
+
+        Arguments:
+            state: The output states of the decoder.
+            use_shortlist: Compute only the logits of the shortlisted words
+                if the decoder has a shortlist. The logits are then indexed
+                by the positions in the shortlist, see ``vocabulary_ids``
+                and ``vocabulary_logits``.
+        """
         state = dropout(state, self.dropout_keep_prob, self.train_mode)
-        logits = tf.matmul(state, self.decoding_w) + self.decoding_b
+        return self.vocabulary_projection(state, use_shortlist)
+
+    def vocabulary_projection(self, state: tf.Tensor,
+                              use_shortlist: bool = False) -> tf.Tensor:
+        """Compute the logits as ``get_logits`` but without dropout.
+
+        The adaptive softmax returns the log-probabilities of the words, the
+        shortlisted ones are gathered from the whole vocabulary.
+        """
+        if self.softmax == "adaptive":
+            weights, biases = self._word_projection()
+            cluster_weights, cluster_biases = self.adaptive_cluster_projection
+            logits = adaptive_softmax_logprobs(
+                state, weights, biases, cluster_weights, cluster_biases,
+                self.vocabulary, self.adaptive_cutoffs)
+            if use_shortlist and self.shortlist is not None:
+                logits = tf.gather(logits, self.shortlist_ids, axis=1)
+        elif use_shortlist and self.shortlist is not None:
+            weights, biases, _ = self.shortlist_projection
+            logits = tf.matmul(state, weights) + biases
+        else:
+            logits = tf.matmul(state, self.decoding_w) + self.decoding_b
 
         if self.supress_unk:
+            # the special tokens keep their indices in the shortlist
             unk_mask = tf.one_hot(
-                UNK_TOKEN_INDEX, depth=len(self.vocabulary), on_value=-1e-9)
+                UNK_TOKEN_INDEX, depth=tf.shape(logits)[-1], on_value=-1e-9)
             logits += unk_mask
 
         return logits
 
+    def vocabulary_ids(self, ids: tf.Tensor,
+                       use_shortlist: bool = False) -> tf.Tensor:
+        """Map the indices of the logits to the vocabulary ids.
+
+        Arguments:
+            ids: Indices to the last dimension of the logits.
+            use_shortlist: Whether the logits were computed with
+                ``use_shortlist``.
+        """
+        if use_shortlist and self.shortlist is not None:
+            return tf.gather(self.shortlist_ids, ids)
+        return ids
+
+    def vocabulary_logits(self, logits: tf.Tensor,
+                          use_shortlist: bool = False) -> tf.Tensor:
+        """Scatter the time-major logits to the full vocabulary.
+
+        The words not in the shortlist get a large negative logit.
+
+        Arguments:
+            logits: The logits of shape ``(time, batch, shortlist)``.
+            use_shortlist: Whether the logits were computed with
+                ``use_shortlist``.
+        """
+        if not use_shortlist or self.shortlist is None:
+            return logits
+
+        _, _, penalty = self.shortlist_projection
+        shape = tf.shape(logits)
+        scattered = tf.scatter_nd(
+            tf.expand_dims(self.shortlist_ids, 1),
+            tf.transpose(logits, [2, 0, 1]),
+            [len(self.vocabulary), shape[0], shape[1]])
+        return tf.transpose(scattered, [1, 2, 0]) + penalty
+
     @tensor
     def train_loop_result(self) -> Tuple[tf.Tensor, tf.Tensor,
                                          tf.Tensor, tf.Tensor]:
@@ -223,22 +393,56 @@ class AutoregressiveDecoder(ModelPart):
     def train_logprobs(self) -> tf.Tensor:
         return tf.nn.log_softmax(self.train_logits)
 
+    @tensor
+    def train_logit_inputs(self) -> tf.Tensor:
+        """Time-major inputs of the vocabulary projection in training.
+
+        Only needed by the objectives other than the full softmax.
+        """
+        raise NotImplementedError("Abstract property")
+
     @tensor
     def train_xents(self) -> tf.Tensor:
-        train_targets = tf.transpose(self.train_inputs)
-        softmax_function = None
-        if self.label_smoothing:
-            softmax_function = (
-                lambda labels, logits: tf.losses.softmax_cross_entropy(
-                    tf.one_hot(labels, len(self.vocabulary)),
-                    logits, label_smoothing=self.label_smoothing))
+        if self.softmax != "full":
+            return self._approximate_train_xents()
 
+        train_targets = tf.transpose(self.train_inputs)
+        # the loss is computed in float32 regardless of the precision
         return tf.contrib.seq2seq.sequence_loss(
-            tf.transpose(self.train_logits, perm=[1, 0, 2]),
+            tf.to_float(tf.transpose(self.train_logits, perm=[1, 0, 2])),
             train_targets,
-            tf.transpose(self.train_mask),
+            tf.to_float(tf.transpose(self.train_mask)),
             average_across_batch=False,
-            softmax_loss_function=softmax_function)
+            softmax_loss_function=lambda labels, logits: (
+                smoothed_softmax_xent(labels, logits, self.label_smoothing)))
+
+    def _approximate_train_xents(self) -> tf.Tensor:
+        """Compute the train cross entropy without the full softmax."""
+        logit_inputs = tf.to_float(self.train_logit_inputs)
+        shape = tf.shape(logit_inputs)
+        flat_inputs = tf.reshape(logit_inputs, [-1, self.output_dimension])
+        flat_labels = tf.reshape(self.train_inputs[:shape[0]], [-1])
+
+        weights, biases = self._word_projection()
+        weights = tf.to_float(weights)
+        biases = tf.to_float(biases)
+
+        if self.softmax == "adaptive":
+            cluster_weights, cluster_biases = self.adaptive_cluster_projection
+            flat_xents = adaptive_softmax_xent(
+                flat_inputs, flat_labels, weights, biases,
+                tf.to_float(cluster_weights), tf.to_float(cluster_biases),
+                self.vocabulary, self.adaptive_cutoffs)
+        else:
+            flat_xents = sampled_softmax_xent(
+                flat_inputs, flat_labels, weights, biases, self.vocabulary,
+                self.num_sampled, nce=self.softmax == "nce")
+
+        # average over the time steps as tf.contrib.seq2seq.sequence_loss
+        xents = tf.reshape(flat_xents, shape[:2])
+        mask = tf.to_float(self.train_mask[:shape[0]])
+        return (tf.reduce_sum(xents * mask, axis=0)
+                / (tf.reduce_sum(mask, axis=0) + 1e-12))
 
     @tensor
     def train_loss(self) -> tf.Tensor:
@@ -255,6 +459,12 @@ class AutoregressiveDecoder(ModelPart):
 
     @tensor
     def runtime_logits(self) -> tf.Tensor:
+        """Get the time-major logits of the decoding loop.
+
+        The logits are stacked from the loop histories only when this tensor
+        (or a tensor computed from it, like the runtime loss) is fetched.
+        Otherwise, the histories are pruned from the executed graph.
+        """
         return tuple(self.runtime_loop_result)[0]
 
     @tensor
@@ -267,13 +477,29 @@ class AutoregressiveDecoder(ModelPart):
 
     @tensor
     def decoded(self) -> tf.Tensor:
-        # We disable generating of <pad> tokens at index 0
-        # (self.runtime_logits[:, :, 1:]). This shifts the indices
-        # of the decoded tokens (therefore, we add +1 to the decoded
-        # output indices).
+        """Get the time-major ids of the symbols decoded in the loop.
 
-        # self.runtime_logits is of size [batch, sentence_len, vocabulary_size]
-        return tf.argmax(self.runtime_logits[:, :, 1:], -1) + 1
+        The loop never decodes ``<pad>``, it only fills the steps after the
+        end of the sentences. The ids are int64 as from ``tf.argmax``.
+        """
+        return tf.to_int64(tuple(self.runtime_loop_result)[3])
+
+    @tensor
+    def runtime_top_k_logprobs(self) -> Tuple[tf.Tensor, tf.Tensor]:
+        """Get the best log-probabilities of the decoding steps.
+
+        Returns:
+            A tuple of the time-major log-probabilities and word ids of
+            shape ``(time, batch, runtime_top_k)``.
+        """
+        if self.runtime_top_k is None:
+            raise ValueError("The decoder does not store the top k "
+                             "log-probabilities, set runtime_top_k.")
+
+        # make sure the loop is built
+        self.runtime_loop_result  # pylint: disable=pointless-statement
+        histories = self._runtime_histories
+        return histories.top_k_logprobs.stack(), histories.top_k_ids.stack()
 
     @tensor
     def runtime_xents(self) -> tf.Tensor:
@@ -286,9 +512,9 @@ class AutoregressiveDecoder(ModelPart):
         # sequence instead of cropping to the length of the shorter one
 
         return tf.contrib.seq2seq.sequence_loss(
-            logits=batch_major_logits[:, :min_time],
+            logits=tf.to_float(batch_major_logits[:, :min_time]),
             targets=train_targets[:, :min_time],
-            weights=tf.transpose(self.train_mask)[:, :min_time],
+            weights=tf.to_float(tf.transpose(self.train_mask)[:, :min_time]),
             average_across_batch=False)
 
     @tensor
@@ -303,12 +529,19 @@ class AutoregressiveDecoder(ModelPart):
     def output_dimension(self) -> int:
         raise NotImplementedError("Abstract property")
 
+    @property
+    def num_runtime_logits(self) -> Union[int, tf.Tensor]:
+        """Get the number of the logits of a runtime decoding step."""
+        if self.shortlist is not None:
+            return tf.shape(self.shortlist_ids)[0]
+        return len(self.vocabulary)
+
     def get_initial_loop_state(self) -> LoopState:
 
-        dec_output_ta = tf.TensorArray(dtype=tf.float32, dynamic_size=True,
+        dec_output_ta = tf.TensorArray(dtype=float_dtype(), dynamic_size=True,
                                        size=0, name="decoder_outputs")
 
-        logit_ta = tf.TensorArray(dtype=tf.float32, dynamic_size=True,
+        logit_ta = tf.TensorArray(dtype=float_dtype(), dynamic_size=True,
                                   size=0, name="logits")
 
         mask_ta = tf.TensorArray(dtype=tf.bool, dynamic_size=True,
@@ -317,17 +550,27 @@ class AutoregressiveDecoder(ModelPart):
         outputs_ta = tf.TensorArray(dtype=tf.int32, dynamic_size=True,
                                     size=0, name="outputs")
 
+        top_k_logprobs_ta = tf.TensorArray(
+            dtype=float_dtype(), dynamic_size=True, size=0,
+            name="top_k_logprobs")
+
+        top_k_ids_ta = tf.TensorArray(dtype=tf.int32, dynamic_size=True,
+                                      size=0, name="top_k_ids")
+
         feedables = DecoderFeedables(
             step=tf.constant(0, tf.int32),
             finished=tf.zeros([self.batch_size], dtype=tf.bool),
             input_symbol=self.go_symbols,
-            prev_logits=tf.zeros([self.batch_size, len(self.vocabulary)]))
+            prev_logits=tf.zeros([self.batch_size, self.num_runtime_logits],
+                                 dtype=float_dtype()))
 
         histories = DecoderHistories(
             logits=logit_ta,
             decoder_outputs=dec_output_ta,
             mask=mask_ta,
-            outputs=outputs_ta)
+            outputs=outputs_ta,
+            top_k_logprobs=top_k_logprobs_ta,
+            top_k_ids=top_k_ids_ta)
 
         constants = DecoderConstants(train_inputs=self.train_inputs)
 
@@ -354,6 +597,32 @@ class AutoregressiveDecoder(ModelPart):
         """Return the while loop body function."""
         raise NotImplementedError("Abstract method")
 
+    def write_top_k(self, histories: DecoderHistories, step: tf.Tensor,
+                    logits: tf.Tensor,
+                    train_mode: bool) -> Dict[str, tf.TensorArray]:
+        """Write the best log-probabilities of a runtime step to the histories.
+
+        Arguments:
+            histories: The histories of the decoder loop state.
+            step: The current decoding step.
+            logits: The logits of the step computed with the shortlist.
+            train_mode: Boolean flag, telling whether this is
+                a training run.
+
+        Returns:
+            The ``top_k_logprobs`` and ``top_k_ids`` histories.
+        """
+        if train_mode or self.runtime_top_k is None:
+            return {"top_k_logprobs": histories.top_k_logprobs,
+                    "top_k_ids": histories.top_k_ids}
+
+        logprobs, ids = tf.nn.top_k(tf.nn.log_softmax(logits),
+                                    k=self.runtime_top_k)
+        ids = self.vocabulary_ids(ids, use_shortlist=True)
+        return {
+            "top_k_logprobs": histories.top_k_logprobs.write(step, logprobs),
+            "top_k_ids": histories.top_k_ids.write(step, ids)}
+
     def finalize_loop(self, final_loop_state: LoopState,
                       train_mode: bool) -> None:
         """Execute post-while loop operations.
@@ -365,6 +634,26 @@ class AutoregressiveDecoder(ModelPart):
                 a training run.
         """
 
+    def stack_logits(self, final_loop_state: LoopState, train_mode: bool,
+                     sample: bool) -> tf.Tensor:
+        """Return the time-major logits from the decoder loop state.
+
+        Descendants may postpone computing the logits until the end of the
+        loop, when they are not needed inside it.
+
+        Arguments:
+            final_loop_state: Decoder loop state at the end
+                of the decoding loop.
+            train_mode: Boolean flag, telling whether this is
+                a training run.
+            sample: Boolean flag, telling whether the outputs were sampled.
+        """
+        # pylint: disable=unused-argument
+        # the runtime loops keep the logits of the shortlist only
+        return self.vocabulary_logits(
+            final_loop_state.histories.logits.stack(),
+            use_shortlist=not train_mode)
+
     def decoding_loop(self, train_mode: bool, sample: bool = False) -> Tuple[
             tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor]:
         """Run the decoding while loop.
@@ -391,8 +680,10 @@ class AutoregressiveDecoder(ModelPart):
             initial_loop_state)
 
         self.finalize_loop(final_loop_state, train_mode)
+        if not train_mode and not sample:
+            self._runtime_histories = final_loop_state.histories
 
-        logits = final_loop_state.histories.logits.stack()
+        logits = self.stack_logits(final_loop_state, train_mode, sample)
         decoder_outputs = final_loop_state.histories.decoder_outputs.stack()
         decoded = final_loop_state.histories.outputs.stack()
 
@@ -417,6 +708,9 @@ class AutoregressiveDecoder(ModelPart):
         fd = {}  # type: FeedDict
         fd[self.train_mode] = train
 
+        if self.shortlist is not None and not train:
+            fd[self.shortlist_ids] = self.shortlist.candidates(dataset)
+
         go_symbol_idx = self.vocabulary.get_word_index(START_TOKEN)
         fd[self.go_symbols] = np.full([len(dataset)], go_symbol_idx,
                                       dtype=np.int32)
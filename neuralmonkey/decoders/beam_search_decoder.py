@@ -31,12 +31,15 @@ import tensorflow as tf
 from typeguard import check_argument_types
 
 from neuralmonkey.model.model_part import ModelPart, FeedDict, InitializerSpecs
+from neuralmonkey.model.stateful import (
+    Stateful, TemporalStateful, SpatialStateful)
 from neuralmonkey.dataset import Dataset
 from neuralmonkey.decoders.autoregressive import (
     LoopState, AutoregressiveDecoder)
 from neuralmonkey.vocabulary import (
     Vocabulary, END_TOKEN_INDEX, PAD_TOKEN_INDEX)
 from neuralmonkey.decorators import tensor
+from neuralmonkey.tf_utils import float_dtype
 
 # pylint: disable=invalid-name
 SearchState = NamedTuple("SearchState",
@@ -113,8 +116,42 @@ class BeamSearchDecoder(ModelPart):
 
         # Output
         self.outputs = self._decoding_loop()
+        self.encoder_states  # pylint: disable=pointless-statement
     # pylint: enable=too-many-arguments
 
+    @tensor
+    def encoder_states(self) -> List[tf.Tensor]:
+        """Get the states of the encoders the parent decoder depends on.
+
+        The states do not change during the decoding, so when the search is
+        run step by step (in ensembles), they are computed in the first step
+        and fed to the following ones instead of running the encoders again.
+        """
+        states = []  # type: List[tf.Tensor]
+        for part in self.parent_decoder.get_dependencies():
+            if part is self.parent_decoder:
+                continue
+
+            names = []  # type: List[str]
+            if isinstance(part, Stateful):
+                names.append("output")
+            if isinstance(part, TemporalStateful):
+                names.extend(["temporal_states", "temporal_mask"])
+            if isinstance(part, SpatialStateful):
+                names.extend(["spatial_states", "spatial_mask"])
+
+            for name in names:
+                # not all the model parts implement all their states
+                try:
+                    value = getattr(part, name)
+                except (NotImplementedError, AttributeError):
+                    continue
+
+                if isinstance(value, tf.Tensor) and value not in states:
+                    states.append(value)
+
+        return states
+
     @property
     def batch_size(self) -> tf.Tensor:
         return self.parent_decoder.batch_size
@@ -142,7 +179,7 @@ class BeamSearchDecoder(ModelPart):
     def get_initial_loop_state(self) -> BeamSearchLoopState:
         # TODO make these feedable
         output_ta = SearchStepOutputTA(
-            scores=tf.TensorArray(dtype=tf.float32, dynamic_size=True,
+            scores=tf.TensorArray(dtype=float_dtype(), dynamic_size=True,
                                   size=0, name="beam_scores"),
             parent_ids=tf.TensorArray(dtype=tf.int32, dynamic_size=True,
                                       size=0, name="beam_parents"),
@@ -208,7 +245,8 @@ class BeamSearchDecoder(ModelPart):
         # by something more reasonable
         scores = tf.cond(
             tf.equal(final_state.bs_output.scores.size(), 0),
-            lambda: tf.fill([1, self.batch_size, self.beam_size], 0.0),
+            lambda: tf.zeros([1, self.batch_size, self.beam_size],
+                             dtype=float_dtype()),
             final_state.bs_output.scores.stack)
         parent_ids = tf.cond(
             tf.equal(final_state.bs_output.parent_ids.size(), 0),
@@ -265,18 +303,22 @@ class BeamSearchDecoder(ModelPart):
             step = dec_loop_state.feedables.step - 1
 
             # mask the probabilities
-            # shape(logprobs) = (batch*beam) x vocabulary
+            # shape(logprobs) = (batch*beam) x vocabulary, or x shortlist
+            # if the parent decoder has one
             logprobs = bs_state.prev_logprobs
+            num_logits = tf.shape(logprobs)[1]
 
-            finished_mask = tf.expand_dims(tf.to_float(bs_state.finished), 1)
+            finished_mask = tf.expand_dims(
+                tf.cast(bs_state.finished, float_dtype()), 1)
             unfinished_logprobs = (1. - finished_mask) * logprobs
 
+            # the special tokens keep their indices in the shortlist
             finished_row = tf.one_hot(
                 PAD_TOKEN_INDEX,
-                len(self.vocabulary),
-                dtype=tf.float32,
+                num_logits,
+                dtype=float_dtype(),
                 on_value=0.,
-                off_value=tf.float32.min)
+                off_value=float_dtype().min)
 
             finished_logprobs = finished_mask * finished_row
             logprobs = unfinished_logprobs + finished_logprobs
@@ -294,7 +336,7 @@ class BeamSearchDecoder(ModelPart):
 
             # reshape to batch x (beam*vocabulary) for topk
             scores_flat = tf.reshape(
-                scores, [-1, bs_state.input_beam_size * len(self.vocabulary)])
+                scores, [-1, bs_state.input_beam_size * num_logits])
 
             # shape(both) = batch x beam
             topk_scores, topk_indices = tf.nn.top_k(
@@ -336,8 +378,8 @@ class BeamSearchDecoder(ModelPart):
                 tf.range(
                     start=0,
                     limit=(self.batch_size * bs_state.input_beam_size
-                           * len(self.vocabulary)),
-                    delta=(bs_state.input_beam_size * len(self.vocabulary))),
+                           * num_logits),
+                    delta=(bs_state.input_beam_size * num_logits)),
                 axis=1)
             topk_indices_flat = tf.reshape(
                 topk_indices + beam_voc_offset, [-1])
@@ -372,8 +414,9 @@ class BeamSearchDecoder(ModelPart):
                     delta=bs_state.input_beam_size),
                 axis=1)
 
-            next_word_ids = tf.mod(topk_indices, len(self.vocabulary))
-            next_beam_ids = tf.div(topk_indices, len(self.vocabulary))
+            next_word_ids = self.parent_decoder.vocabulary_ids(
+                tf.mod(topk_indices, num_logits), use_shortlist=True)
+            next_beam_ids = tf.div(topk_indices, num_logits)
 
             next_word_ids_flat = tf.reshape(next_word_ids, [-1])
             next_beam_ids_flat = tf.reshape(
@@ -452,5 +495,6 @@ class BeamSearchDecoder(ModelPart):
     def _length_penalty(self, lengths):
         """Apply lp term from eq. 14."""
 
-        return ((5. + tf.to_float(lengths)) ** self._length_normalization
+        lengths = tf.cast(lengths, float_dtype())
+        return ((5. + lengths) ** self._length_normalization
                 / (5. + 1.) ** self._length_normalization)
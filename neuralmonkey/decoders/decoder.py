@@ -1,4 +1,4 @@
-from typing import List, Callable, Tuple, cast
+from typing import List, Callable, Optional, Tuple, cast
 
 import tensorflow as tf
 from typeguard import check_argument_types
@@ -20,7 +20,10 @@ from neuralmonkey.decoders.encoder_projection import (
     EncoderProjection)
 from neuralmonkey.decoders.output_projection import (
     OutputProjectionSpec, OutputProjection, nonlinear_output)
+from neuralmonkey.decoders.shortlist import LexicalShortlist
+from neuralmonkey.quantization import gather
 from neuralmonkey.decorators import tensor
+from neuralmonkey.tf_utils import float_dtype
 
 
 RNN_CELL_TYPES = {
@@ -40,7 +43,8 @@ RNNFeedables = extend_namedtuple(
 RNNHistories = extend_namedtuple(
     "RNNHistories",
     DecoderHistories,
-    [("attention_histories", List[Tuple])])  # AttentionLoopStateTA and kids
+    [("attention_histories", List[Tuple]),  # AttentionLoopStateTA and kids
+     ("output_states", tf.TensorArray)])  # logit inputs, teacher forcing only
 # pylint: enable=invalid-name
 
 
@@ -69,6 +73,11 @@ class Decoder(AutoregressiveDecoder):
                  rnn_cell: str = "GRU",
                  conditional_gru: bool = False,
                  supress_unk: bool = False,
+                 softmax: str = "full",
+                 num_sampled: int = 1024,
+                 adaptive_cutoffs: List[int] = None,
+                 shortlist: LexicalShortlist = None,
+                 runtime_top_k: int = None,
                  save_checkpoint: str = None,
                  load_checkpoint: str = None,
                  initializers: InitializerSpecs = None) -> None:
@@ -101,6 +110,13 @@ class Decoder(AutoregressiveDecoder):
                 step should be combined with the input in the next step.
             supress_unk: If true, decoder will not produce symbols for unknown
                 tokens.
+            softmax: The training objective over the vocabulary, 'full',
+                'sampled', 'nce' or 'adaptive'.
+            num_sampled: Number of sampled words for 'sampled' and 'nce'.
+            adaptive_cutoffs: Cluster sizes for the 'adaptive' softmax.
+            shortlist: A lexical shortlist of the vocabulary for decoding.
+            runtime_top_k: Number of the best log-probabilities stored in
+                each decoding step.
         """
         check_argument_types()
         AutoregressiveDecoder.__init__(
@@ -115,6 +131,11 @@ class Decoder(AutoregressiveDecoder):
             tie_embeddings=tie_embeddings,
             label_smoothing=label_smoothing,
             supress_unk=supress_unk,
+            softmax=softmax,
+            num_sampled=num_sampled,
+            adaptive_cutoffs=adaptive_cutoffs,
+            shortlist=shortlist,
+            runtime_top_k=runtime_top_k,
             save_checkpoint=save_checkpoint,
             load_checkpoint=load_checkpoint,
             initializers=initializers)
@@ -124,6 +145,7 @@ class Decoder(AutoregressiveDecoder):
         self._conditional_gru = conditional_gru
         self._attention_on_input = attention_on_input
         self._rnn_cell_str = rnn_cell
+        self._train_output_states = None  # type: Optional[tf.Tensor]
 
         self.attentions = []  # type: List[BaseAttention]
         if attentions is not None:
@@ -229,7 +251,7 @@ class Decoder(AutoregressiveDecoder):
 
     def embed_input_symbol(self, *args) -> tf.Tensor:
         loop_state = LoopState(*args)
-        embedded_input = tf.nn.embedding_lookup(
+        embedded_input = gather(
             self.embedding_matrix, loop_state.feedables.input_symbol)
 
         return dropout(embedded_input, self.dropout_keep_prob, self.train_mode)
@@ -250,6 +272,11 @@ class Decoder(AutoregressiveDecoder):
     def get_body(self,
                  train_mode: bool,
                  sample: bool = False) -> Callable:
+        # With teacher forcing, the logits are not needed for the next step,
+        # so only their inputs are collected and the vocabulary projection
+        # is done for all the steps at once after the loop.
+        postpone_logits = train_mode and not sample
+
         # pylint: disable=too-many-branches
         def body(*args) -> LoopState:
             loop_state = LoopState(*args)
@@ -306,7 +333,7 @@ class Decoder(AutoregressiveDecoder):
                     raise ValueError("Unknown RNN cell.")
 
                 with tf.name_scope("rnn_output_projection"):
-                    embedded_input = tf.nn.embedding_lookup(
+                    embedded_input = gather(
                         self.embedding_matrix,
                         loop_state.feedables.input_symbol)
 
@@ -314,23 +341,30 @@ class Decoder(AutoregressiveDecoder):
                         cell_output, embedded_input, list(contexts),
                         self.train_mode)
 
-                logits = self.get_logits(output)
+                if not postpone_logits:
+                    logits = self.get_logits(
+                        output, use_shortlist=not train_mode)
 
             self.step_scope.reuse_variables()
 
             if sample:
-                next_symbols = tf.to_int32(
-                    tf.squeeze(tf.multinomial(logits, num_samples=1), axis=1))
+                next_symbols = self.vocabulary_ids(
+                    tf.to_int32(tf.squeeze(
+                        tf.multinomial(logits, num_samples=1), axis=1)),
+                    use_shortlist=not train_mode)
             elif train_mode:
                 next_symbols = loop_state.constants.train_inputs[step]
             else:
-                next_symbols = tf.to_int32(tf.argmax(logits, axis=1))
-                int_unfinished_mask = tf.to_int32(
-                    tf.logical_not(loop_state.feedables.finished))
-
                 # Note this works only when PAD_TOKEN_INDEX is 0. Otherwise
                 # this have to be rewritten
                 assert PAD_TOKEN_INDEX == 0
+
+                # <pad> is never decoded, it only marks the finished outputs
+                next_symbols = self.vocabulary_ids(
+                    tf.to_int32(tf.argmax(logits[:, 1:], axis=1)) + 1,
+                    use_shortlist=True)
+                int_unfinished_mask = tf.to_int32(
+                    tf.logical_not(loop_state.feedables.finished))
                 next_symbols = next_symbols * int_unfinished_mask
 
             has_just_finished = tf.equal(next_symbols, END_TOKEN_INDEX)
@@ -338,23 +372,37 @@ class Decoder(AutoregressiveDecoder):
                                          has_just_finished)
             not_finished = tf.logical_not(has_finished)
 
+            if postpone_logits:
+                prev_logits = loop_state.feedables.prev_logits
+                logit_histories = loop_state.histories.logits
+                output_states = loop_state.histories.output_states.write(
+                    step, output)
+            else:
+                prev_logits = logits
+                logit_histories = loop_state.histories.logits.write(
+                    step, logits)
+                output_states = loop_state.histories.output_states
+
             # pylint: disable=not-callable
             new_feedables = RNNFeedables(
                 step=step + 1,
                 finished=has_finished,
                 input_symbol=next_symbols,
-                prev_logits=logits,
+                prev_logits=prev_logits,
                 prev_rnn_state=next_state,
                 prev_rnn_output=cell_output,
                 prev_contexts=list(contexts))
 
             new_histories = RNNHistories(
                 attention_histories=list(att_loop_states),
-                logits=loop_state.histories.logits.write(step, logits),
+                output_states=output_states,
+                logits=logit_histories,
                 decoder_outputs=loop_state.histories.decoder_outputs.write(
                     step, cell_output),
                 outputs=loop_state.histories.outputs.write(step, next_symbols),
-                mask=loop_state.histories.mask.write(step, not_finished))
+                mask=loop_state.histories.mask.write(step, not_finished),
+                **self.write_top_k(loop_state.histories, step, prev_logits,
+                                   train_mode))
             # pylint: enable=not-callable
 
             new_loop_state = LoopState(
@@ -373,7 +421,8 @@ class Decoder(AutoregressiveDecoder):
         histories = default_ls.histories._asdict()
 
         feedables["prev_contexts"] = [
-            tf.zeros([self.batch_size, a.context_vector_size])
+            tf.zeros([self.batch_size, a.context_vector_size],
+                     dtype=float_dtype())
             for a in self.attentions]
 
         feedables["prev_rnn_state"] = self.initial_state
@@ -383,6 +432,10 @@ class Decoder(AutoregressiveDecoder):
             a.initial_loop_state()
             for a in self.attentions if a is not None]
 
+        histories["output_states"] = tf.TensorArray(
+            dtype=float_dtype(), dynamic_size=True, size=0,
+            name="output_states")
+
         # pylint: disable=not-callable
         rnn_feedables = RNNFeedables(**feedables)
         rnn_histories = RNNHistories(**histories)
@@ -393,8 +446,36 @@ class Decoder(AutoregressiveDecoder):
             constants=default_ls.constants,
             feedables=rnn_feedables)
 
+    @tensor
+    def train_logit_inputs(self) -> tf.Tensor:
+        # the states are stacked when the train loop is finalized
+        self.train_loop_result  # pylint: disable=pointless-statement
+        return dropout(self._train_output_states, self.dropout_keep_prob,
+                       self.train_mode)
+
+    def stack_logits(self, final_loop_state: LoopState, train_mode: bool,
+                     sample: bool) -> tf.Tensor:
+        if not train_mode or sample:
+            return AutoregressiveDecoder.stack_logits(
+                self, final_loop_state, train_mode, sample)
+
+        # one large matrix multiplication for all the time steps
+        output_states = self._train_output_states
+        time_steps = tf.shape(output_states)[0]
+        flat_states = tf.reshape(
+            output_states, [time_steps * self.batch_size,
+                            self.output_dimension])
+
+        flat_logits = self.get_logits(flat_states)
+        return tf.reshape(flat_logits, [time_steps, self.batch_size,
+                                        len(self.vocabulary)])
+
     def finalize_loop(self, final_loop_state: LoopState,
                       train_mode: bool) -> None:
+        if train_mode:
+            self._train_output_states = (
+                final_loop_state.histories.output_states.stack())
+
         for att_state, attn_obj in zip(
                 final_loop_state.histories.attention_histories,
                 self.attentions):
@@ -404,5 +485,5 @@ class Decoder(AutoregressiveDecoder):
 
             attn_obj.finalize_loop(att_history_key, att_state)
 
-            if not train_mode:
+            if not train_mode and attn_obj.record_histories:
                 attn_obj.visualize_attention(att_history_key)
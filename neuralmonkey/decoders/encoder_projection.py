@@ -23,7 +23,7 @@ from neuralmonkey.model.stateful import Stateful, TemporalStatefulWithOutput
 from neuralmonkey.nn.utils import dropout
 from neuralmonkey.nn.ortho_gru_cell import orthogonal_initializer
 from neuralmonkey.logging import log, warn
-from neuralmonkey.tf_utils import get_initializer
+from neuralmonkey.tf_utils import get_initializer, float_dtype
 
 
 # pylint: disable=invalid-name
@@ -41,7 +41,7 @@ def empty_initial_state(train_mode: tf.Tensor,
     if rnn_size is None:
         raise ValueError(
             "You must supply rnn_size for this type of encoder projection")
-    return tf.zeros([rnn_size])
+    return tf.zeros([rnn_size], dtype=float_dtype())
 
 
 def linear_encoder_projection(dropout_keep_prob: float) -> EncoderProjection:
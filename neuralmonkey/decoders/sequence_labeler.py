@@ -8,7 +8,7 @@ from neuralmonkey.encoders.recurrent import RecurrentEncoder
 from neuralmonkey.encoders.facebook_conv import SentenceEncoder
 from neuralmonkey.vocabulary import Vocabulary
 from neuralmonkey.decorators import tensor
-from neuralmonkey.tf_utils import get_variable
+from neuralmonkey.tf_utils import get_variable, float_dtype
 
 
 class SequenceLabeler(ModelPart):
@@ -43,7 +43,7 @@ class SequenceLabeler(ModelPart):
 
     @tensor
     def train_weights(self) -> tf.Tensor:
-        return tf.placeholder(tf.float32, shape=[None, None],
+        return tf.placeholder(float_dtype(), shape=[None, None],
                               name="labeler_padding_weights")
 
     @tensor
@@ -8,6 +8,7 @@ from neuralmonkey.dataset import Dataset
 from neuralmonkey.model.model_part import ModelPart, FeedDict, InitializerSpecs
 from neuralmonkey.model.stateful import Stateful
 from neuralmonkey.decorators import tensor
+from neuralmonkey.tf_utils import float_dtype
 
 
 class SequenceRegressor(ModelPart):
@@ -57,7 +58,7 @@ class SequenceRegressor(ModelPart):
 
     @tensor
     def train_inputs(self):
-        return tf.placeholder(tf.float32, shape=[None], name="targets")
+        return tf.placeholder(float_dtype(), shape=[None], name="targets")
     # pylint: enable=no-self-use
 
     @tensor
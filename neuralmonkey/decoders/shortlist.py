@@ -0,0 +1,88 @@
+"""Lexical shortlists of the target vocabulary for decoding.
+
+At inference time, the decoder can compute the logits only for a shortlist
+of candidate target words for the batch. The candidates are the most
+frequent target words and the most probable translations of the source
+words in the batch according to a lexical table. Inside the decoding loop,
+the logits are indexed by the positions in the shortlist and only the
+emitted ids are mapped back to the vocabulary ids. The stacked runtime
+logits are scattered to the full vocabulary, where the other words get
+a very low logit. The candidates are sorted and always include the special
+tokens, so these keep their indices in the shortlist.
+
+The lexical table is a text file with one ``source target probability``
+triple per line, e.g. created by ``scripts/build_lexical_shortlist.py``
+from a parallel corpus and optionally its word alignments.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+from typeguard import check_argument_types
+
+from neuralmonkey.dataset import Dataset
+from neuralmonkey.logging import log
+from neuralmonkey.vocabulary import Vocabulary, UNK_TOKEN_INDEX
+
+
+# pylint: disable=too-few-public-methods
+class LexicalShortlist(object):
+    """Select candidate target words for a batch of source sentences."""
+
+    def __init__(self,
+                 path: str,
+                 source_id: str,
+                 vocabulary: Vocabulary,
+                 translations_per_word: int = 50,
+                 frequent_words: int = 500,
+                 encoding: str = "utf-8") -> None:
+        """Load the lexical table.
+
+        Arguments:
+            path: The lexical table file.
+            source_id: The data series of the source sentences.
+            vocabulary: The target vocabulary.
+            translations_per_word: Number of the most probable translations
+                of each source word added to the shortlist.
+            frequent_words: Number of the most frequent target words that
+                are always in the shortlist (besides the special tokens).
+            encoding: The encoding of the lexical table.
+        """
+        check_argument_types()
+        self.source_id = source_id
+        self.vocabulary = vocabulary
+
+        translations = {}  # type: Dict[str, List[Tuple[float, int]]]
+        with open(path, encoding=encoding) as f_lex:
+            for line in f_lex:
+                fields = line.split()
+                if len(fields) != 3 or fields[1] not in vocabulary:
+                    continue
+                translations.setdefault(fields[0], []).append(
+                    (float(fields[2]), vocabulary.get_word_index(fields[1])))
+
+        self._translations = {
+            word: np.array([index for _, index in sorted(
+                candidates, reverse=True)[:translations_per_word]],
+                           dtype=np.int32)
+            for word, candidates in translations.items()}
+
+        counts = np.array([vocabulary.word_count.get(word, 0)
+                           for word in vocabulary.index_to_word])
+        counts[:UNK_TOKEN_INDEX + 1] = np.iinfo(counts.dtype).max
+        self._frequent = np.argsort(
+            -counts, kind="mergesort")[:UNK_TOKEN_INDEX + 1 + frequent_words]
+        self._frequent = self._frequent.astype(np.int32)
+
+        log("Loaded lexical shortlist for {} source words from {}".format(
+            len(self._translations), path))
+
+    def candidates(self, dataset: Dataset) -> np.ndarray:
+        """Get the sorted ids of the candidate words for a batch."""
+        candidates = [self._frequent]
+        source_words = {word
+                        for sentence in dataset.get_series(self.source_id)
+                        for word in sentence}
+        candidates.extend(self._translations[word] for word in source_words
+                          if word in self._translations)
+
+        return np.unique(np.concatenate(candidates))
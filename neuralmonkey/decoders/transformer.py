@@ -13,6 +13,7 @@ from neuralmonkey.attention.scaled_dot_product import (
 from neuralmonkey.attention.base_attention import (
     Attendable, get_attention_states, get_attention_mask)
 from neuralmonkey.decorators import tensor
+from neuralmonkey.decoders.shortlist import LexicalShortlist
 from neuralmonkey.decoders.autoregressive import (
     AutoregressiveDecoder, LoopState, extend_namedtuple, DecoderHistories,
     DecoderFeedables)
@@ -21,9 +22,10 @@ from neuralmonkey.encoders.transformer import (
 from neuralmonkey.model.sequence import EmbeddedSequence
 from neuralmonkey.logging import log
 from neuralmonkey.nn.utils import dropout
+from neuralmonkey.quantization import gather
 from neuralmonkey.vocabulary import (
     Vocabulary, PAD_TOKEN_INDEX, END_TOKEN_INDEX)
-from neuralmonkey.tf_utils import layer_norm
+from neuralmonkey.tf_utils import layer_norm, float_dtype
 
 # pylint: disable=invalid-name
 TransformerHistories = extend_namedtuple(
@@ -58,6 +60,12 @@ class TransformerDecoder(AutoregressiveDecoder):
                  attention_dropout_keep_prob: float = 1.0,
                  use_att_transform_bias: bool = False,
                  supress_unk: bool = False,
+                 softmax: str = "full",
+                 num_sampled: int = 1024,
+                 adaptive_cutoffs: List[int] = None,
+                 shortlist: LexicalShortlist = None,
+                 runtime_top_k: int = None,
+                 attention_chunk_size: int = None,
                  save_checkpoint: str = None,
                  load_checkpoint: str = None) -> None:
         """Create a decoder of the Transformer model.
@@ -88,6 +96,17 @@ class TransformerDecoder(AutoregressiveDecoder):
                 during dropout on the attention output.
             supress_unk: If true, decoder will not produce symbols for unknown
                 tokens.
+            softmax: The training objective over the vocabulary, 'full',
+                'sampled', 'nce' or 'adaptive'.
+            num_sampled: Number of sampled words for 'sampled' and 'nce'.
+            adaptive_cutoffs: Cluster sizes for the 'adaptive' softmax.
+            shortlist: A lexical shortlist of the vocabulary for decoding.
+            runtime_top_k: Number of the best log-probabilities stored in
+                each decoding step.
+            attention_chunk_size: If set, the attention is computed in
+                blocks of this size without building the full matrix of
+                the attention energies, which saves memory on long outputs
+                at inference time. The full attention is used in training.
         """
         check_argument_types()
         AutoregressiveDecoder.__init__(
@@ -102,6 +121,11 @@ class TransformerDecoder(AutoregressiveDecoder):
             tie_embeddings=tie_embeddings,
             label_smoothing=label_smoothing,
             supress_unk=supress_unk,
+            softmax=softmax,
+            num_sampled=num_sampled,
+            adaptive_cutoffs=adaptive_cutoffs,
+            shortlist=shortlist,
+            runtime_top_k=runtime_top_k,
             save_checkpoint=save_checkpoint,
             load_checkpoint=load_checkpoint)
 
@@ -112,11 +136,16 @@ class TransformerDecoder(AutoregressiveDecoder):
         self.depth = depth
         self.attention_dropout_keep_prob = attention_dropout_keep_prob
         self.use_att_transform_bias = use_att_transform_bias
+        self.attention_chunk_size = attention_chunk_size
 
         self.encoder_states = get_attention_states(self.encoder)
         self.encoder_mask = get_attention_mask(self.encoder)
         self.dimension = self.encoder_states.get_shape()[2].value
 
+        if attention_chunk_size is not None and attention_chunk_size <= 0:
+            raise ValueError("Attention chunk size must be a positive "
+                             "integer.")
+
         if self.embedding_size != self.dimension:
             raise ValueError("Model dimension and input embedding size"
                              "do not match")
@@ -131,7 +160,7 @@ class TransformerDecoder(AutoregressiveDecoder):
         return self.dimension
 
     def embed_inputs(self, inputs: tf.Tensor) -> tf.Tensor:
-        embedded = tf.nn.embedding_lookup(self.embedding_matrix, inputs)
+        embedded = gather(self.embedding_matrix, inputs)
 
         if (self.embeddings_source is not None
                 and self.embeddings_source.scale_embeddings_by_depth):
@@ -180,7 +209,9 @@ class TransformerDecoder(AutoregressiveDecoder):
             masked=True,
             dropout_callback=lambda x: dropout(
                 x, self.attention_dropout_keep_prob, self.train_mode),
-            use_bias=self.use_att_transform_bias)
+            use_bias=self.use_att_transform_bias,
+            chunk_size=self.attention_chunk_size,
+            train_mode=self.train_mode)
 
         # Apply dropout
         self_context = dropout(
@@ -208,7 +239,9 @@ class TransformerDecoder(AutoregressiveDecoder):
             num_heads=self.n_heads_enc,
             dropout_callback=lambda x: dropout(
                 x, self.attention_dropout_keep_prob, self.train_mode),
-            use_bias=self.use_att_transform_bias)
+            use_bias=self.use_att_transform_bias,
+            chunk_size=self.attention_chunk_size,
+            train_mode=self.train_mode)
 
         # Apply dropout
         encoder_context = dropout(
@@ -269,16 +302,22 @@ class TransformerDecoder(AutoregressiveDecoder):
         return TransformerLayer(states=output_states, mask=mask)
 
     @tensor
-    def train_logits(self) -> tf.Tensor:
+    def train_logit_inputs(self) -> tf.Tensor:
         last_layer = self.layer(self.depth, self.embedded_train_inputs,
                                 tf.transpose(self.train_mask))
 
+        # time-major shape (time, batch, channels)
+        return tf.transpose(last_layer.temporal_states, perm=[1, 0, 2])
+
+    @tensor
+    def train_logits(self) -> tf.Tensor:
         # t_states shape: (batch, time, channels)
         # dec_w shape: (channels, vocab)
-        last_layer_shape = tf.shape(last_layer.temporal_states)
+        temporal_states = tf.transpose(self.train_logit_inputs,
+                                       perm=[1, 0, 2])
+        last_layer_shape = tf.shape(temporal_states)
         last_layer_states = tf.reshape(
-            last_layer.temporal_states,
-            [-1, last_layer_shape[-1]])
+            temporal_states, [-1, last_layer_shape[-1]])
 
         # Reusing input embedding matrix for generating logits
         # significantly reduces the overall size of the model.
@@ -286,9 +325,8 @@ class TransformerDecoder(AutoregressiveDecoder):
         #
         # shape (batch, time, vocab)
         logits = tf.reshape(
-            tf.matmul(last_layer_states, self.decoding_w),
+            self.vocabulary_projection(last_layer_states),
             [last_layer_shape[0], last_layer_shape[1], len(self.vocabulary)])
-        logits += tf.reshape(self.decoding_b, [1, 1, -1])
 
         # return logits in time-major shape
         return tf.transpose(logits, perm=[1, 0, 2])
@@ -312,11 +350,11 @@ class TransformerDecoder(AutoregressiveDecoder):
             clear_after_read=False, name="decoded_symbols")
 
         input_mask = tf.TensorArray(
-            dtype=tf.float32, dynamic_size=True, size=0,
+            dtype=float_dtype(), dynamic_size=True, size=0,
             clear_after_read=False, name="input_mask")
 
         histories["input_mask"] = input_mask.write(
-            0, tf.ones_like(self.go_symbols, dtype=tf.float32))
+            0, tf.ones_like(self.go_symbols, dtype=float_dtype()))
 
         # TransformerHistories is a type and should be callable
         # pylint: disable=not-callable
@@ -362,19 +400,25 @@ class TransformerDecoder(AutoregressiveDecoder):
                 output_state = last_layer.temporal_states[:, -1, :]
 
                 # See train_logits definition
-                logits = tf.matmul(output_state, self.decoding_w)
-                logits += self.decoding_b
+                logits = self.vocabulary_projection(
+                    output_state, use_shortlist=True)
 
                 if sample:
-                    next_symbols = tf.multinomial(logits, num_samples=1)
+                    next_symbols = self.vocabulary_ids(
+                        tf.multinomial(logits, num_samples=1),
+                        use_shortlist=True)
                 else:
-                    next_symbols = tf.to_int32(tf.argmax(logits, axis=1))
-                    int_unfinished_mask = tf.to_int32(
-                        tf.logical_not(loop_state.feedables.finished))
-
                     # Note this works only when PAD_TOKEN_INDEX is 0. Otherwise
                     # this have to be rewritten
                     assert PAD_TOKEN_INDEX == 0
+
+                    # <pad> is never decoded, it only marks the finished
+                    # outputs
+                    next_symbols = self.vocabulary_ids(
+                        tf.to_int32(tf.argmax(logits[:, 1:], axis=1)) + 1,
+                        use_shortlist=True)
+                    int_unfinished_mask = tf.to_int32(
+                        tf.logical_not(loop_state.feedables.finished))
                     next_symbols = next_symbols * int_unfinished_mask
 
                     has_just_finished = tf.equal(next_symbols, END_TOKEN_INDEX)
@@ -402,7 +446,8 @@ class TransformerDecoder(AutoregressiveDecoder):
                 self_attention_histories=histories.self_attention_histories,
                 inter_attention_histories=histories.inter_attention_histories,
                 input_mask=histories.input_mask.write(
-                    step + 1, tf.to_float(not_finished)))
+                    step + 1, tf.cast(not_finished, float_dtype())),
+                **self.write_top_k(histories, step, logits, False))
             # pylint: enable=not-callable
 
             new_loop_state = LoopState(
@@ -10,6 +10,7 @@ from neuralmonkey.logging import warn
 from neuralmonkey.model.model_part import ModelPart, FeedDict, InitializerSpecs
 from neuralmonkey.model.sequence import Sequence
 from neuralmonkey.decorators import tensor
+from neuralmonkey.tf_utils import float_dtype
 
 
 class WordAlignmentDecoder(ModelPart):
@@ -52,7 +53,7 @@ class WordAlignmentDecoder(ModelPart):
     def ref_alignment(self) -> tf.Tensor:
         # TODO dynamic shape?
         return tf.placeholder(
-            dtype=tf.float32,
+            dtype=float_dtype(),
             shape=[None, self.decoder.max_output_len,
                    self.enc_input.max_length],
             name="ref_alignment")
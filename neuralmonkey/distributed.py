@@ -0,0 +1,129 @@
+"""Training in several worker processes with model averaging.
+
+Each worker process trains its own copy of the model on a shard of the
+training data. Periodically, the workers send the values of their variables
+to an averaging server over a local connection and continue training from
+the average.
+"""
+# pylint: disable=unused-import
+from typing import Any, Dict, List, Tuple
+# pylint: enable=unused-import
+
+from multiprocessing.connection import Client, Connection, Listener
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.logging import log
+from neuralmonkey.tf_manager import TensorFlowManager
+
+# pylint: disable=invalid-name
+Address = Tuple[str, int]
+# pylint: enable=invalid-name
+
+
+class ModelAveraging(object):
+    """Client of the averaging server used in a worker process.
+
+    The averaging is synchronous: every worker must call ``synchronize``
+    (possibly through ``step``) the same number of times before it calls
+    ``close``.
+    """
+
+    def __init__(self,
+                 address: Address,
+                 authkey: bytes,
+                 worker_id: int,
+                 num_workers: int,
+                 period: int) -> None:
+        """Connect to the averaging server.
+
+        Arguments:
+            address: The address of the averaging server.
+            authkey: The authentication key of the server.
+            worker_id: The index of this worker. Worker 0 is the chief which
+                validates and saves the model.
+            num_workers: The total number of workers.
+            period: Number of training steps between the averagings.
+        """
+        self.worker_id = worker_id
+        self.num_workers = num_workers
+        self.period = period
+
+        self._connection = Client(address, authkey=authkey)
+        self._connection.send(worker_id)
+
+    @property
+    def is_chief(self) -> bool:
+        return self.worker_id == 0
+
+    def synchronize(self, tf_manager: TensorFlowManager) -> None:
+        """Replace the variables with their average over the workers."""
+        # integer variables, e.g., the global step, are kept
+        variables = [var for var in tf.global_variables()
+                     if var.dtype.base_dtype.is_floating]
+
+        self._connection.send([sess.run(variables)
+                               for sess in tf_manager.sessions])
+        tf_manager.assign_variables(variables, self._connection.recv())
+
+    def step(self, tf_manager: TensorFlowManager, step: int) -> None:
+        """Synchronize the variables if the step is in the period."""
+        if step % self.period == 0:
+            self.synchronize(tf_manager)
+
+    def close(self) -> None:
+        """Tell the server that the worker will not average any more."""
+        self._connection.send(None)
+        self._connection.close()
+
+
+def averaging_server(listener: Listener, num_workers: int) -> None:
+    """Average the variables sent by the workers.
+
+    In each round, the server waits for a message from every worker that has
+    not finished yet and sends the average of the received variables back.
+    A worker finishes by sending ``None``. If a worker disconnects without
+    finishing, all the connections are closed.
+
+    Arguments:
+        listener: The listener the workers connect to.
+        num_workers: Number of the workers.
+    """
+    active = {}  # type: Dict[int, Connection]
+    for _ in range(num_workers):
+        connection = listener.accept()
+        active[connection.recv()] = connection
+
+    try:
+        while active:
+            messages = {worker_id: connection.recv()
+                        for worker_id, connection in active.items()}
+
+            for worker_id, message in messages.items():
+                if message is None:
+                    active.pop(worker_id).close()
+
+            # list of workers, sessions, variables
+            values = [msg for msg in messages.values() if msg is not None]
+            if not values:
+                continue
+
+            averaged = [[_average(var_values)
+                         for var_values in zip(*session_values)]
+                        for session_values in zip(*values)]
+            for connection in active.values():
+                connection.send(averaged)
+    except EOFError:
+        log("A worker disconnected before finishing, stopping averaging.",
+            color="red")
+        for connection in active.values():
+            connection.close()
+
+
+def _average(arrays: Tuple[np.ndarray, ...]) -> np.ndarray:
+    result = np.array(arrays[0], copy=True)
+    for array in arrays[1:]:
+        result += array
+    result /= len(arrays)
+    return result
@@ -10,6 +10,7 @@ from neuralmonkey.dataset import Dataset
 from neuralmonkey.decorators import tensor
 from neuralmonkey.attention.base_attention import (
     get_attention_states, get_attention_mask, Attendable)
+from neuralmonkey.tf_utils import float_dtype
 
 
 class AttentiveEncoder(ModelPart, TemporalStatefulWithOutput):
@@ -90,7 +91,7 @@ class AttentiveEncoder(ModelPart, TemporalStatefulWithOutput):
 
     @tensor
     def temporal_mask(self) -> tf.Tensor:
-        return tf.ones(tf.shape(self.temporal_states)[:2], tf.float32)
+        return tf.ones(tf.shape(self.temporal_states)[:2], float_dtype())
 
     @tensor
     def output(self) -> tf.Tensor:
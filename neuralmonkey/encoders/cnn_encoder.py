@@ -12,6 +12,7 @@ from neuralmonkey.model.model_part import ModelPart, FeedDict, InitializerSpecs
 from neuralmonkey.model.stateful import (SpatialStatefulWithOutput,
                                          TemporalStatefulWithOutput)
 from neuralmonkey.nn.projection import multilayer_projection
+from neuralmonkey.tf_utils import float_dtype
 
 
 # Tuples used for configuration of the convolutional layers. See docstring of
@@ -89,7 +90,7 @@ class CNNEncoder(ModelPart, SpatialStatefulWithOutput):
     @tensor
     def image_input(self) -> tf.Tensor:
         return tf.placeholder(
-            tf.float32,
+            float_dtype(),
             shape=(None, self.image_height, self.image_width,
                    self.pixel_dim),
             name="input_images")
@@ -97,7 +98,7 @@ class CNNEncoder(ModelPart, SpatialStatefulWithOutput):
     @tensor
     def image_mask(self) -> tf.Tensor:
         return tf.placeholder(
-            tf.float32,
+            float_dtype(),
             shape=(None, self.image_height, self.image_width, 1),
             name="input_mask")
 
@@ -356,7 +357,7 @@ class CNNTemporalView(ModelPart, TemporalStatefulWithOutput):
     def temporal_mask(self) -> tf.Tensor:
         mask = tf.squeeze(self._cnn.spatial_mask, 3)
         summed = tf.reduce_sum(mask, axis=1)
-        return tf.to_float(tf.greater(summed, 0))
+        return tf.cast(tf.greater(summed, 0), float_dtype())
 
     def feed_dict(self, dataset: Dataset, train: bool = False) -> FeedDict:
         return {}
@@ -17,6 +17,7 @@ from neuralmonkey.dataset import Dataset
 from neuralmonkey.decorators import tensor
 from neuralmonkey.model.model_part import ModelPart, FeedDict, InitializerSpecs
 from neuralmonkey.model.stateful import SpatialStatefulWithOutput
+from neuralmonkey.tf_utils import float_dtype
 
 
 ImageNetSpec = NamedTuple(
@@ -173,7 +174,7 @@ class ImageNet(ModelPart, SpatialStatefulWithOutput):
     @tensor
     def input_image(self) -> tf.Tensor:
         return tf.placeholder(
-            tf.float32, [None, self.height, self.width, 3])
+            float_dtype(), [None, self.height, self.width, 3])
 
     @tensor
     def spatial_states(self) -> Optional[tf.Tensor]:
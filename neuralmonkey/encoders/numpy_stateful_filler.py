@@ -7,7 +7,7 @@ from neuralmonkey.dataset import Dataset
 from neuralmonkey.decorators import tensor
 from neuralmonkey.model.model_part import ModelPart, FeedDict, InitializerSpecs
 from neuralmonkey.model.stateful import Stateful, SpatialStatefulWithOutput
-from neuralmonkey.tf_utils import get_variable
+from neuralmonkey.tf_utils import get_variable, float_dtype
 
 
 # pylint: disable=too-few-public-methods
@@ -46,7 +46,7 @@ class StatefulFiller(ModelPart, Stateful):
             raise ValueError("Output vector dimension must be positive.")
 
         self.vector = tf.placeholder(
-            tf.float32, shape=[None, dimension])
+            float_dtype(), shape=[None, dimension])
         self.data_id = data_id
 
         with self.use_scope():
@@ -109,7 +109,7 @@ class SpatialFiller(ModelPart, SpatialStatefulWithOutput):
         features_shape = [None] + self.input_shape  # type: ignore
         with self.use_scope():
             self.spatial_input = tf.placeholder(
-                tf.float32, shape=features_shape, name="spatial_states")
+                float_dtype(), shape=features_shape, name="spatial_states")
 
     @tensor
     def output(self) -> tf.Tensor:
@@ -11,6 +11,7 @@ from neuralmonkey.logging import log
 from neuralmonkey.nn.ortho_gru_cell import OrthoGRUCell
 from neuralmonkey.nn.utils import dropout
 from neuralmonkey.dataset import Dataset
+from neuralmonkey.tf_utils import float_dtype
 
 
 # pylint: disable=invalid-name
@@ -88,7 +89,7 @@ class RawRNNEncoder(ModelPart, TemporalStatefulWithOutput):
             self._create_input_placeholders()
 
             self.states_mask = tf.sequence_mask(self._input_lengths,
-                                                dtype=tf.float32)
+                                                dtype=float_dtype())
 
             states = self.inputs
             states_reversed = False
@@ -106,7 +107,7 @@ class RawRNNEncoder(ModelPart, TemporalStatefulWithOutput):
                         outputs_tup, encoded_tup = (
                             tf.nn.bidirectional_dynamic_rnn(
                                 cell(), cell(), states, self._input_lengths,
-                                dtype=tf.float32)
+                                dtype=float_dtype())
                         )
 
                         if states_reversed:
@@ -125,7 +126,7 @@ class RawRNNEncoder(ModelPart, TemporalStatefulWithOutput):
                         states, encoded = tf.nn.dynamic_rnn(
                             cell(), states,
                             sequence_length=self._input_lengths,
-                            dtype=tf.float32)
+                            dtype=float_dtype())
                     else:
                         raise ValueError(
                             "Unknown RNN direction {}".format(layer.direction))
@@ -158,7 +159,7 @@ class RawRNNEncoder(ModelPart, TemporalStatefulWithOutput):
         """Create an input placeholder nodes in the computation graph."""
         self.train_mode = tf.placeholder(tf.bool, shape=[], name="train_mode")
 
-        self.inputs = tf.placeholder(tf.float32,
+        self.inputs = tf.placeholder(float_dtype(),
                                      shape=[None, None,
                                             self.input_size],
                                      name="encoder_input")
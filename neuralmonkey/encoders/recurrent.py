@@ -6,6 +6,8 @@ from typeguard import check_argument_types
 from neuralmonkey.model.stateful import (
     TemporalStatefulWithOutput, TemporalStateful)
 from neuralmonkey.model.model_part import ModelPart, FeedDict, InitializerSpecs
+from neuralmonkey.logging import warn
+from neuralmonkey.nn.block_cells import BlockGRUCell, fused_lstm
 from neuralmonkey.nn.ortho_gru_cell import OrthoGRUCell, NematusGRUCell
 from neuralmonkey.nn.utils import dropout
 from neuralmonkey.vocabulary import Vocabulary
@@ -13,6 +15,7 @@ from neuralmonkey.dataset import Dataset
 from neuralmonkey.decorators import tensor
 from neuralmonkey.model.sequence import (
     EmbeddedSequence, EmbeddedFactorSequence)
+from neuralmonkey.tf_utils import float_dtype
 
 RNN_CELL_TYPES = {
     "NematusGRU": NematusGRUCell,
@@ -20,6 +23,9 @@ RNN_CELL_TYPES = {
     "LSTM": tf.nn.rnn_cell.LSTMCell
 }
 
+# Cell types which can be computed by the fused kernels
+FUSED_RNN_CELL_TYPES = ["GRU", "LSTM"]
+
 RNN_DIRECTIONS = ["forward", "backward", "bidirectional"]
 
 
@@ -28,7 +34,8 @@ RNNCellTuple = Tuple[tf.nn.rnn_cell.RNNCell, tf.nn.rnn_cell.RNNCell]
 
 RNNSpec = NamedTuple("RNNSpec", [("size", int),
                                  ("direction", str),
-                                 ("cell_type", str)])
+                                 ("cell_type", str),
+                                 ("fused", bool)])
 
 RNNSpecTuple = Union[Tuple[int], Tuple[int, str], Tuple[int, str, str]]
 # pylint: enable=invalid-name
@@ -36,7 +43,8 @@ RNNSpecTuple = Union[Tuple[int], Tuple[int, str], Tuple[int, str, str]]
 
 def _make_rnn_spec(size: int,
                    direction: str = "bidirectional",
-                   cell_type: str = "GRU") -> RNNSpec:
+                   cell_type: str = "GRU",
+                   fused: bool = False) -> RNNSpec:
     if size <= 0:
         raise ValueError(
             "RNN size must be a positive integer. {} given.".format(size))
@@ -49,14 +57,46 @@ def _make_rnn_spec(size: int,
         raise ValueError("RNN cell type must be one of {}. {} given."
                          .format(str(RNN_CELL_TYPES), cell_type))
 
-    return RNNSpec(size, direction, cell_type)
+    if fused and cell_type not in FUSED_RNN_CELL_TYPES:
+        raise ValueError("Fused RNN cells are available only for {}. {} given."
+                         .format(str(FUSED_RNN_CELL_TYPES), cell_type))
+
+    return RNNSpec(size, direction, cell_type, fused)
 
 
 def _make_rnn_cell(spec: RNNSpec) -> Callable[[], tf.nn.rnn_cell.RNNCell]:
     """Return the graph template for creating RNN cells."""
+    if spec.fused:
+        # the fused LSTM runs without a cell, see `_fused_lstm_layer`
+        return BlockGRUCell(spec.size)
     return RNN_CELL_TYPES[spec.cell_type](spec.size)
 
 
+def _fused_lstm_layer(rnn_input: tf.Tensor, lengths: tf.Tensor,
+                      rnn_spec: RNNSpec) -> Tuple[tf.Tensor, tf.Tensor]:
+    """Construct a LSTM layer running as a single op in each direction.
+
+    The variable scopes are the same as in `tf.nn.dynamic_rnn` and
+    `tf.nn.bidirectional_dynamic_rnn`, so the layer shares its checkpoints
+    with the layer of the standard LSTM cells.
+    """
+    if rnn_spec.direction == "bidirectional":
+        with tf.variable_scope("bidirectional_rnn"):
+            with tf.variable_scope("fw"):
+                fw_outputs, fw_state = fused_lstm(
+                    rnn_input, lengths, rnn_spec.size)
+            with tf.variable_scope("bw"):
+                bw_outputs, bw_state = fused_lstm(
+                    rnn_input, lengths, rnn_spec.size, reverse=True)
+
+        return (tf.concat([fw_outputs, bw_outputs], 2),
+                tf.concat([fw_state, bw_state], 1))
+
+    with tf.variable_scope("rnn"):
+        return fused_lstm(rnn_input, lengths, rnn_spec.size,
+                          reverse=rnn_spec.direction == "backward")
+
+
 def rnn_layer(rnn_input: tf.Tensor, lengths: tf.Tensor,
               rnn_spec: RNNSpec) -> Tuple[tf.Tensor, tf.Tensor]:
     """Construct a RNN layer given its inputs and specs.
@@ -66,13 +106,21 @@ def rnn_layer(rnn_input: tf.Tensor, lengths: tf.Tensor,
         lengths: Lengths of input sequences.
         rnn_spec: A valid RNNSpec tuple specifying the network architecture.
     """
+    if rnn_spec.fused and float_dtype() != tf.float32:
+        warn("The fused RNN cells support only float32, using the standard "
+             "cells instead.")
+        rnn_spec = rnn_spec._replace(fused=False)
+
+    if rnn_spec.fused and rnn_spec.cell_type == "LSTM":
+        return _fused_lstm_layer(rnn_input, lengths, rnn_spec)
+
     if rnn_spec.direction == "bidirectional":
         fw_cell = _make_rnn_cell(rnn_spec)
         bw_cell = _make_rnn_cell(rnn_spec)
 
         outputs_tup, states_tup = tf.nn.bidirectional_dynamic_rnn(
             fw_cell, bw_cell, rnn_input, sequence_length=lengths,
-            dtype=tf.float32)
+            dtype=float_dtype())
 
         outputs = tf.concat(outputs_tup, 2)
 
@@ -86,7 +134,7 @@ def rnn_layer(rnn_input: tf.Tensor, lengths: tf.Tensor,
 
         cell = _make_rnn_cell(rnn_spec)
         outputs, final_state = tf.nn.dynamic_rnn(
-            cell, rnn_input, sequence_length=lengths, dtype=tf.float32)
+            cell, rnn_input, sequence_length=lengths, dtype=float_dtype())
 
         if rnn_spec.direction == "backward":
             outputs = tf.reverse_sequence(outputs, lengths, seq_axis=1)
@@ -107,6 +155,7 @@ class RecurrentEncoder(ModelPart, TemporalStatefulWithOutput):
                  rnn_cell: str = "GRU",
                  rnn_direction: str = "bidirectional",
                  dropout_keep_prob: float = 1.0,
+                 fused_cells: bool = False,
                  save_checkpoint: str = None,
                  load_checkpoint: str = None,
                  initializers: InitializerSpecs = None) -> None:
@@ -123,6 +172,9 @@ class RecurrentEncoder(ModelPart, TemporalStatefulWithOutput):
                 "bidirectional" will double the resulting vector dimension as
                 well as the number of encoder parameters.
             dropout_keep_prob: 1 - dropout probability.
+            fused_cells: Compute the "GRU" and "LSTM" cells by the fused
+                kernels (float32 only), which is faster mainly on CPU. The
+                variables are the same as with the standard cells.
             save_checkpoint: ModelPart save checkpoint file.
             load_checkpoint: ModelPart load checkpoint file.
         """
@@ -133,7 +185,8 @@ class RecurrentEncoder(ModelPart, TemporalStatefulWithOutput):
 
         self.input_sequence = input_sequence
         self.dropout_keep_prob = dropout_keep_prob
-        self.rnn_spec = _make_rnn_spec(rnn_size, rnn_direction, rnn_cell)
+        self.rnn_spec = _make_rnn_spec(rnn_size, rnn_direction, rnn_cell,
+                                       fused_cells)
 
         if self.dropout_keep_prob <= 0.0 or self.dropout_keep_prob > 1.0:
             raise ValueError("Dropout keep prob must be inside (0,1].")
@@ -195,6 +248,7 @@ class SentenceEncoder(RecurrentEncoder):
                  rnn_direction: str = "bidirectional",
                  max_input_len: int = None,
                  dropout_keep_prob: float = 1.0,
+                 fused_cells: bool = False,
                  save_checkpoint: str = None,
                  load_checkpoint: str = None,
                  initializers: InitializerSpecs = None,
@@ -217,6 +271,9 @@ class SentenceEncoder(RecurrentEncoder):
                 "bidirectional" will double the resulting vector dimension as
                 well as the number of encoder parameters.
             dropout_keep_prob: 1 - dropout probability.
+            fused_cells: Compute the "GRU" and "LSTM" cells by the fused
+                kernels (float32 only), which is faster mainly on CPU. The
+                variables are the same as with the standard cells.
             save_checkpoint: ModelPart save checkpoint file.
             load_checkpoint: ModelPart load checkpoint file.
         """
@@ -252,6 +309,7 @@ class SentenceEncoder(RecurrentEncoder):
             rnn_cell=rnn_cell,
             rnn_direction=rnn_direction,
             dropout_keep_prob=dropout_keep_prob,
+            fused_cells=fused_cells,
             save_checkpoint=save_checkpoint,
             load_checkpoint=load_checkpoint,
             initializers=initializers)
@@ -270,6 +328,7 @@ class FactoredEncoder(RecurrentEncoder):
                  rnn_direction: str = "bidirectional",
                  max_input_len: int = None,
                  dropout_keep_prob: float = 1.0,
+                 fused_cells: bool = False,
                  save_checkpoint: str = None,
                  load_checkpoint: str = None,
                  initializers: InitializerSpecs = None,
@@ -292,6 +351,9 @@ class FactoredEncoder(RecurrentEncoder):
                 "bidirectional" will double the resulting vector dimension as
                 well as the number of encoder parameters.
             dropout_keep_prob: 1 - dropout probability.
+            fused_cells: Compute the "GRU" and "LSTM" cells by the fused
+                kernels (float32 only), which is faster mainly on CPU. The
+                variables are the same as with the standard cells.
             save_checkpoint: ModelPart save checkpoint file.
             load_checkpoint: ModelPart load checkpoint file.
         """
@@ -317,6 +379,7 @@ class FactoredEncoder(RecurrentEncoder):
             rnn_cell=rnn_cell,
             rnn_direction=rnn_direction,
             dropout_keep_prob=dropout_keep_prob,
+            fused_cells=fused_cells,
             save_checkpoint=save_checkpoint,
             load_checkpoint=load_checkpoint,
             initializers=initializers)
@@ -335,6 +398,7 @@ class DeepSentenceEncoder(SentenceEncoder):
                  rnn_cell: str = "GRU",
                  max_input_len: int = None,
                  dropout_keep_prob: float = 1.0,
+                 fused_cells: bool = False,
                  save_checkpoint: str = None,
                  load_checkpoint: str = None,
                  initializers: InitializerSpecs = None,
@@ -360,6 +424,9 @@ class DeepSentenceEncoder(SentenceEncoder):
                 "bidirectional" will double the resulting vector dimension as
                 well as the number of the parameters in the given layer.
             dropout_keep_prob: 1 - dropout probability.
+            fused_cells: Compute the "GRU" and "LSTM" cells by the fused
+                kernels (float32 only), which is faster mainly on CPU. The
+                variables are the same as with the standard cells.
             save_checkpoint: ModelPart save checkpoint file.
             load_checkpoint: ModelPart load checkpoint file.
         """
@@ -371,6 +438,7 @@ class DeepSentenceEncoder(SentenceEncoder):
         self.rnn_sizes = rnn_sizes
         self.rnn_directions = rnn_directions
         self.rnn_cell = rnn_cell
+        self.fused_cells = fused_cells
 
         SentenceEncoder.__init__(
             self,
@@ -383,6 +451,7 @@ class DeepSentenceEncoder(SentenceEncoder):
             rnn_cell=rnn_cell,
             max_input_len=max_input_len,
             dropout_keep_prob=dropout_keep_prob,
+            fused_cells=fused_cells,
             save_checkpoint=save_checkpoint,
             load_checkpoint=load_checkpoint,
             initializers=initializers,
@@ -400,7 +469,8 @@ class DeepSentenceEncoder(SentenceEncoder):
 
         for level, (rnn_size, rnn_dir) in enumerate(
                 zip(self.rnn_sizes, self.rnn_directions)):
-            rnn_spec = _make_rnn_spec(rnn_size, rnn_dir, self.rnn_cell)
+            rnn_spec = _make_rnn_spec(rnn_size, rnn_dir, self.rnn_cell,
+                                      self.fused_cells)
 
             with tf.variable_scope("layer_{}".format(level)):
                 outputs, state = rnn_layer(
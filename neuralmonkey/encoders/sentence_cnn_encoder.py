@@ -15,7 +15,7 @@ from neuralmonkey.nn.utils import dropout
 from neuralmonkey.nn.highway import highway
 from neuralmonkey.dataset import Dataset
 from neuralmonkey.decorators import tensor
-from neuralmonkey.tf_utils import get_variable
+from neuralmonkey.tf_utils import get_variable, float_dtype
 
 
 # pylint: disable=too-many-instance-attributes
@@ -173,7 +173,7 @@ class SentenceCNNEncoder(ModelPart, TemporalStatefulWithOutput):
         return tf.nn.bidirectional_dynamic_rnn(
             fw_cell, bw_cell, self.highway_layer,
             sequence_length=seq_lens,
-            dtype=tf.float32)
+            dtype=float_dtype())
 
     @tensor
     def temporal_states(self) -> tf.Tensor:
@@ -10,8 +10,9 @@ from neuralmonkey.decorators import tensor
 from neuralmonkey.model.model_part import ModelPart, FeedDict, InitializerSpecs
 from neuralmonkey.model.stateful import Stateful
 from neuralmonkey.nn.utils import dropout
+from neuralmonkey.quantization import gather
 from neuralmonkey.vocabulary import Vocabulary
-from neuralmonkey.tf_utils import get_variable
+from neuralmonkey.tf_utils import get_variable, float_dtype
 
 
 class SequenceCNNEncoder(ModelPart, Stateful):
@@ -70,7 +71,7 @@ class SequenceCNNEncoder(ModelPart, Stateful):
     @tensor
     def input_mask(self) -> tf.Tensor:
         return tf.placeholder(
-            tf.float32, shape=[None, None], name="encoder_padding")
+            float_dtype(), shape=[None, None], name="encoder_padding")
     # pylint: enable=no-self-use
 
     @tensor
@@ -81,7 +82,7 @@ class SequenceCNNEncoder(ModelPart, Stateful):
                 [len(self.vocabulary), self.embedding_size],
                 initializer=tf.glorot_uniform_initializer())
             return dropout(
-                tf.nn.embedding_lookup(embedding_matrix, self.inputs),
+                gather(embedding_matrix, self.inputs),
                 self.dropout_keep_prob,
                 self.train_mode)
 
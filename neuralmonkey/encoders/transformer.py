@@ -20,7 +20,7 @@ from neuralmonkey.model.model_part import FeedDict, ModelPart
 from neuralmonkey.model.stateful import (TemporalStateful,
                                          TemporalStatefulWithOutput)
 from neuralmonkey.nn.utils import dropout
-from neuralmonkey.tf_utils import get_variable, layer_norm
+from neuralmonkey.tf_utils import get_variable, layer_norm, float_dtype
 
 
 def position_signal(dimension: int, length: tf.Tensor) -> tf.Tensor:
@@ -45,7 +45,8 @@ def position_signal(dimension: int, length: tf.Tensor) -> tf.Tensor:
     signal = tf.pad(signal, [[0, 0], [0, tf.mod(dimension, 2)]])
     signal = tf.reshape(signal, [1, length, dimension])
 
-    return signal
+    # the signal is computed in float32 for the accuracy of the positions
+    return tf.cast(signal, float_dtype())
 
 
 class TransformerLayer(TemporalStateful):
@@ -79,6 +80,7 @@ class TransformerEncoder(ModelPart, TemporalStatefulWithOutput):
                  use_positional_encoding: bool = True,
                  input_for_cross_attention: Attendable = None,
                  n_cross_att_heads: int = None,
+                 attention_chunk_size: int = None,
                  save_checkpoint: str = None,
                  load_checkpoint: str = None) -> None:
         """Create an encoder of the Transformer model.
@@ -106,6 +108,10 @@ class TransformerEncoder(ModelPart, TemporalStatefulWithOutput):
                 attended using cross-attention on every layer of the decoder,
                 analogically to how encoder is attended in the decoder.
             n_cross_att_heads: Number of heads used in the cross-attention.
+            attention_chunk_size: If set, the attention is computed in
+                blocks of this size without building the full matrix of
+                the attention energies, which saves memory on long inputs
+                at inference time. The full attention is used in training.
 
         """
         check_argument_types()
@@ -123,6 +129,7 @@ class TransformerEncoder(ModelPart, TemporalStatefulWithOutput):
         self.use_positional_encoding = use_positional_encoding
         self.input_for_cross_attention = input_for_cross_attention
         self.n_cross_att_heads = n_cross_att_heads
+        self.attention_chunk_size = attention_chunk_size
 
         if self.depth <= 0:
             raise ValueError("Depth must be a positive integer.")
@@ -138,6 +145,10 @@ class TransformerEncoder(ModelPart, TemporalStatefulWithOutput):
                 or self.attention_dropout_keep_prob > 1.0):
             raise ValueError("Dropout keep prob for attn must be in (0,1].")
 
+        if attention_chunk_size is not None and attention_chunk_size <= 0:
+            raise ValueError("Attention chunk size must be a positive "
+                             "integer.")
+
         if self.target_space_id is not None and (self.target_space_id >= 32
                                                  or self.target_space_id < 0):
             raise ValueError(
@@ -218,7 +229,9 @@ class TransformerEncoder(ModelPart, TemporalStatefulWithOutput):
             num_heads=self.n_heads,
             dropout_callback=lambda x: dropout(
                 x, self.attention_dropout_keep_prob, self.train_mode),
-            use_bias=self.use_att_transform_bias)
+            use_bias=self.use_att_transform_bias,
+            chunk_size=self.attention_chunk_size,
+            train_mode=self.train_mode)
 
         # Apply dropout
         self_context = dropout(
@@ -247,7 +260,9 @@ class TransformerEncoder(ModelPart, TemporalStatefulWithOutput):
             num_heads=self.n_cross_att_heads,
             dropout_callback=lambda x: dropout(
                 x, self.attention_dropout_keep_prob, self.train_mode),
-            use_bias=self.use_att_transform_bias)
+            use_bias=self.use_att_transform_bias,
+            chunk_size=self.attention_chunk_size,
+            train_mode=self.train_mode)
 
         # Apply dropout
         encoder_context = dropout(
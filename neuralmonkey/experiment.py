@@ -1,6 +1,7 @@
 """Provides a high-level API for training and using a model."""
 
 from argparse import Namespace  # pylint: disable=unused-import
+from inspect import isclass
 import os
 import random
 from shutil import copyfile
@@ -15,15 +16,22 @@ from typeguard import check_argument_types
 
 from neuralmonkey.checking import (check_dataset_and_coders,
                                    CheckingException)
-from neuralmonkey.logging import Logging, log, debug
+from neuralmonkey.logging import Logging, log, debug, warn
+from neuralmonkey.config.builder import ClassSymbol
 from neuralmonkey.config.configuration import Configuration
 from neuralmonkey.learning_utils import (training_loop, evaluation,
                                          run_on_dataset,
                                          print_final_evaluation)
 from neuralmonkey.dataset import Dataset
+from neuralmonkey.decoders.word_alignment_decoder import WordAlignmentDecoder
+from neuralmonkey.distributed import ModelAveraging
 from neuralmonkey.model.sequence import EmbeddedFactorSequence
+from neuralmonkey.quantization import quantization_getter
 from neuralmonkey.runners.base_runner import ExecutionResult
+from neuralmonkey.runners.word_alignment_runner import WordAlignmentRunner
 from neuralmonkey.tf_manager import get_default_tf_manager
+from neuralmonkey.tf_utils import (PRECISIONS, precision_getter,
+                                   set_precision)
 
 
 _TRAIN_ARGS = [
@@ -31,10 +39,15 @@ _TRAIN_ARGS = [
     "test_datasets", "initial_variables", "validation_period",
     "val_preview_input_series", "val_preview_output_series",
     "val_preview_num_examples", "logging_period", "visualize_embeddings",
-    "random_seed", "overwrite_output_dir"
+    "random_seed", "overwrite_output_dir", "fused_logging",
+    "async_validation", "profiling", "chrome_trace_steps", "workers",
+    "averaging_period"
 ]
 
 
+# Classes which read the attention histories during inference
+_HISTORY_READERS = (WordAlignmentDecoder, WordAlignmentRunner)
+
 _EXPERIMENT_FILES = ["experiment.log", "experiment.ini", "original.ini",
                      "git_commit", "git_diff", "variables.data.best"]
 
@@ -71,6 +84,7 @@ class Experiment(object):
         self._model_built = False
         self._vars_loaded = False
         self._model = None  # type: Optional[Namespace]
+        self.record_attention_histories = True
 
         self.config = create_config(train_mode)
         self.config.load_file(config_path, config_changes)
@@ -112,12 +126,22 @@ class Experiment(object):
         random.seed(self.config.args.random_seed)
         np.random.seed(self.config.args.random_seed)
 
+        set_precision(self.config.args.precision)
+        self.record_attention_histories = self._needs_attention_histories()
+
         with self.graph.as_default():
             tf.set_random_seed(self.config.args.random_seed)
 
             # Enable the created model parts to find this experiment.
             type(self)._current_experiment = self  # type: ignore
-            self.config.build_model(warn_unused=self.train_mode)
+            # the variables stay in float32 with reduced precision, the
+            # quantized matrices are dequantized in the computation type
+            with tf.variable_scope(tf.get_variable_scope(),
+                                   custom_getter=precision_getter):
+                with tf.variable_scope(
+                        tf.get_variable_scope(),
+                        custom_getter=self._quantization_getter):
+                    self.config.build_model(warn_unused=self.train_mode)
             type(self)._current_experiment = None
 
             self._model = self.config.model
@@ -146,7 +170,45 @@ class Experiment(object):
 
         self._check_unused_initializers()
 
-    def train(self) -> None:
+    def _needs_attention_histories(self) -> bool:
+        """Decide whether the attention objects record their histories.
+
+        Unless set by the ``attention_histories`` option, the histories are
+        recorded in the training mode (for the attention plots) and when the
+        configuration contains a class that reads them.
+        """
+        if self.config.args.attention_histories is not None:
+            return self.config.args.attention_histories
+        if self.train_mode:
+            return True
+
+        for section in self.config.config_dict.values():
+            symbol = section.get("class")
+            if isinstance(symbol, ClassSymbol):
+                clazz = symbol.create()
+                if isclass(clazz) and issubclass(clazz, _HISTORY_READERS):
+                    return True
+        return False
+
+    @property
+    def _quantization_getter(self) -> Optional[Callable]:
+        if not self.config.args.quantized:
+            return None
+        if self.train_mode:
+            warn("Quantized models cannot be trained, the 'quantized' option "
+                 "is ignored in the training mode.")
+            return None
+
+        return quantization_getter
+
+    def train(self, averaging: ModelAveraging = None) -> None:
+        """Train the model.
+
+        Arguments:
+            averaging: When training in several worker processes, the client
+                for averaging the variables with the other workers. The
+                worker is trained on its shard of the training dataset.
+        """
         if not self.train_mode:
             raise RuntimeError("train() was called, but the experiment was "
                                "created with train_mode=False")
@@ -165,6 +227,12 @@ class Experiment(object):
 
         with self.graph.as_default():
             self.model.tf_manager.init_saving(self.get_path("variables.data"))
+            self.model.tf_manager.init_tracing(self.get_path("traces"))
+
+            train_dataset = self.model.train_dataset
+            if averaging is not None:
+                train_dataset = train_dataset.shard(
+                    averaging.worker_id, averaging.num_workers)
 
             training_loop(
                 tf_manager=self.model.tf_manager,
@@ -174,7 +242,7 @@ class Experiment(object):
                 log_directory=self.model.output,
                 evaluators=self.model.evaluation,
                 runners=self.model.runners,
-                train_dataset=self.model.train_dataset,
+                train_dataset=train_dataset,
                 val_dataset=self.model.val_dataset,
                 test_datasets=self.model.test_datasets,
                 logging_period=self.model.logging_period,
@@ -185,7 +253,12 @@ class Experiment(object):
                 postprocess=self.model.postprocess,
                 train_start_offset=self.model.train_start_offset,
                 runners_batch_size=self.model.runners_batch_size,
-                initial_variables=self.model.initial_variables)
+                initial_variables=self.model.initial_variables,
+                fused_logging=self.model.fused_logging,
+                async_validation=self.model.async_validation,
+                profiling=self.model.profiling,
+                chrome_trace_steps=self.model.chrome_trace_steps,
+                averaging=averaging)
 
             self._vars_loaded = True
 
@@ -323,6 +396,10 @@ def create_config(train_mode: bool = True) -> Configuration:
     config.add_argument("postprocess", required=False, default=None)
     config.add_argument("runners")
     config.add_argument("runners_batch_size", required=False, default=None)
+    config.add_argument("precision", required=False, default="float32",
+                        cond=lambda x: x in PRECISIONS)
+    config.add_argument("quantized", required=False, default=False)
+    config.add_argument("attention_histories", required=False, default=None)
 
     if train_mode:
         config.add_argument("epochs", cond=lambda x: x >= 0)
@@ -348,6 +425,15 @@ def create_config(train_mode: bool = True) -> Configuration:
         config.add_argument("initial_variables", required=False, default=None)
         config.add_argument("overwrite_output_dir", required=False,
                             default=False)
+        config.add_argument("fused_logging", required=False, default=False)
+        config.add_argument("async_validation", required=False,
+                            default=False)
+        config.add_argument("profiling", required=False, default=False)
+        config.add_argument("chrome_trace_steps", required=False, default=0)
+        config.add_argument("workers", required=False, default=1,
+                            cond=lambda x: x > 0)
+        config.add_argument("averaging_period", required=False, default=100,
+                            cond=lambda x: x > 0)
     else:
         config.add_argument("evaluation", required=False, default=None)
         for argument in _TRAIN_ARGS:
@@ -368,6 +454,7 @@ class _DummyExperiment(Experiment):
         # pylint: disable=super-init-not-called
         self._initializers = {}  # type: Dict[str, Callable]
         self._initialized_variables = set()  # type: Set[str]
+        self.record_attention_histories = True
         self._warned = False
 
     def update_initializers(
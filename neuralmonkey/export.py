@@ -0,0 +1,272 @@
+"""Export of trained models as frozen inference graphs.
+
+The exported graph contains only the operations needed to compute the
+outputs of the chosen runners. The variables are replaced by constants,
+the scalar placeholders (e.g. the train mode flags) are replaced by the
+values fed in the inference mode and the constant subgraphs are folded.
+
+The exported model is served by ``neuralmonkey.frozen_model.FrozenModel``
+without building the model from its configuration. The runners whose
+outputs are exported must compute them in a single step. The inputs must
+be embedded sequences of tokens; other fed placeholders cannot be
+exported.
+"""
+# pylint: disable=unused-import, wrong-import-order
+import neuralmonkey.checkpython
+# pylint: enable=unused-import, wrong-import-order
+
+import argparse
+import json
+import os
+from typing import Any, Dict, List, Set  # pylint: disable=unused-import
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.tools.graph_transforms import TransformGraph
+
+from neuralmonkey.dataset import Dataset
+from neuralmonkey.decoders.autoregressive import AutoregressiveDecoder
+from neuralmonkey.experiment import Experiment
+from neuralmonkey.frozen_model import GRAPH_FILE, SIGNATURE_FILE
+from neuralmonkey.logging import log, warn
+from neuralmonkey.model.model_part import ModelPart
+from neuralmonkey.model.sequence import EmbeddedFactorSequence
+from neuralmonkey.runners.base_runner import BaseRunner
+from neuralmonkey.runners.plain_runner import PlainRunner
+from neuralmonkey.runners.regression_runner import RegressionRunner
+from neuralmonkey.runners.runner import GreedyRunner
+from neuralmonkey.vocabulary import (
+    Vocabulary, START_TOKEN, PAD_TOKEN_INDEX, START_TOKEN_INDEX,
+    END_TOKEN_INDEX, UNK_TOKEN_INDEX)
+
+# Runners whose output are the decoded tokens and runners of raw values
+_TOKEN_RUNNERS = (GreedyRunner, PlainRunner)
+_VALUE_RUNNERS = (RegressionRunner,)
+
+_GRAPH_TRANSFORMS = ["remove_device", "fold_constants(ignore_errors=true)"]
+
+
+# pylint: disable=protected-access
+def _output_spec(runner: BaseRunner,
+                 vocabulary_files: Dict[Vocabulary, str]) -> Dict[str, Any]:
+    """Describe the exported output of a runner."""
+    if getattr(runner, "_postprocess", None) is not None:
+        warn("The postprocessing of the '{}' series is not exported."
+             .format(runner.output_series))
+
+    fetches = runner.get_executable(
+        compute_losses=False, summaries=False,
+        num_sessions=1).next_to_execute()[1]
+
+    if (isinstance(runner, _TOKEN_RUNNERS)
+            and isinstance(runner._decoder, AutoregressiveDecoder)):
+        vocabulary = runner._decoder.vocabulary
+        vocabulary_files.setdefault(
+            vocabulary, "vocabulary_{}.json".format(len(vocabulary_files)))
+        return {"series": runner.output_series,
+                "type": "tokens",
+                "tensor": fetches["decoded"].name,
+                "vocabulary": vocabulary_files[vocabulary]}
+
+    if isinstance(runner, _VALUE_RUNNERS):
+        return {"series": runner.output_series,
+                "type": "values",
+                "tensor": fetches["prediction"].name}
+
+    raise ValueError("The output of the runner of the '{}' series cannot be "
+                     "exported, only the outputs of {} can.".format(
+                         runner.output_series,
+                         ", ".join(r.__name__ for r in _TOKEN_RUNNERS
+                                   + _VALUE_RUNNERS)))
+# pylint: enable=protected-access
+
+
+def _input_specs(coders: Set[ModelPart],
+                 vocabulary_files: Dict[Vocabulary, str]) -> List[Dict]:
+    """Describe the inputs fed by the model parts in the inference mode."""
+    specs = []  # type: List[Dict[str, Any]]
+
+    for coder in coders:
+        if isinstance(coder, EmbeddedFactorSequence):
+            for vocabulary in coder.vocabularies:
+                vocabulary_files.setdefault(
+                    vocabulary,
+                    "vocabulary_{}.json".format(len(vocabulary_files)))
+
+            specs.append({
+                "type": "sequence",
+                "data_ids": coder.data_ids,
+                "factors": [factor.name for factor in coder.input_factors],
+                "vocabularies": [vocabulary_files[vocabulary]
+                                 for vocabulary in coder.vocabularies],
+                "mask": coder.mask.name,
+                "mask_dtype": coder.mask.dtype.name,
+                "max_length": coder.max_length,
+                "add_start_symbol": coder.add_start_symbol,
+                "add_end_symbol": coder.add_end_symbol})
+
+        if isinstance(coder, AutoregressiveDecoder):
+            specs.append({
+                "type": "fill",
+                "tensor": coder.go_symbols.name,
+                "value": coder.vocabulary.get_word_index(START_TOKEN),
+                "dtype": coder.go_symbols.dtype.name})
+
+    return specs
+
+
+def _constant_feeds(coders: Set[ModelPart],
+                    input_specs: List[Dict]) -> Dict[str, Any]:
+    """Find the values of the fed scalars and check the other feeds.
+
+    The model parts are fed with a probe dataset of the input series. The
+    scalars are independent of the data and become constants in the graph,
+    the other placeholders must be described by the input specifications.
+    """
+    data_ids = {data_id for spec in input_specs
+                for data_id in spec.get("data_ids", [])}
+    probe = Dataset("export_probe",
+                    {data_id: [["a"], ["a", "b"]] for data_id in data_ids},
+                    {})
+
+    described = set()  # type: Set[str]
+    for spec in input_specs:
+        described.update(spec.get("factors", []))
+        described.update(spec[key] for key in ["mask", "tensor"]
+                         if key in spec)
+
+    feeds = {}  # type: Dict[str, Any]
+    for coder in coders:
+        try:
+            feed_dict = coder.feed_dict(probe, train=False)
+        except KeyError as exc:
+            raise ValueError("Model part '{}' needs data series {} which "
+                             "cannot be exported.".format(coder.name, exc))
+
+        for placeholder, value in feed_dict.items():
+            if placeholder.name in described:
+                continue
+            if np.ndim(value) != 0:
+                raise ValueError(
+                    "Placeholder '{}' of model part '{}' cannot be exported."
+                    .format(placeholder.name, coder.name))
+            feeds[placeholder.name] = (value, placeholder.dtype)
+
+    return feeds
+
+
+def _freeze(session: tf.Session, input_names: List[str],
+            output_names: List[str],
+            constant_feeds: Dict[str, Any]) -> tf.GraphDef:
+    """Freeze the variables, fold the constant feeds and prune the graph."""
+    output_ops = [name.split(":")[0] for name in output_names]
+    graph_def = tf.graph_util.convert_variables_to_constants(
+        session, session.graph.as_graph_def(), output_ops)
+
+    with tf.Graph().as_default() as graph:
+        with tf.name_scope("export_constants"):
+            input_map = {name: tf.constant(value, dtype=dtype)
+                         for name, (value, dtype) in constant_feeds.items()}
+        tf.import_graph_def(graph_def, input_map=input_map, name="")
+        graph_def = tf.graph_util.extract_sub_graph(
+            graph.as_graph_def(), output_ops)
+
+    return TransformGraph(graph_def,
+                          [name.split(":")[0] for name in input_names],
+                          output_ops, _GRAPH_TRANSFORMS)
+
+
+def export_inference_graph(exp: Experiment, output_dir: str,
+                           output_series: List[str] = None) -> None:
+    """Export the model of an experiment as a frozen inference graph.
+
+    Arguments:
+        exp: An experiment built in the inference mode with loaded
+            variables.
+        output_dir: The directory for the exported model.
+        output_series: The output series of the exported runners. Defaults
+            to the series of all the runners.
+    """
+    if exp.train_mode:
+        raise ValueError("Only experiments in the inference mode can be "
+                         "exported.")
+
+    runners = [runner for runner in exp.model.runners
+               if output_series is None
+               or runner.output_series in output_series]
+    if not runners:
+        raise ValueError("No runners of the series {} to export."
+                         .format(output_series))
+
+    sessions = exp.model.tf_manager.sessions
+    if len(sessions) > 1:
+        warn("Only the model in the first of {} sessions is exported."
+             .format(len(sessions)))
+
+    vocabulary_files = {}  # type: Dict[Vocabulary, str]
+    with exp.graph.as_default():
+        outputs = [_output_spec(runner, vocabulary_files)
+                   for runner in runners]
+
+        coders = set.union(*[runner.all_coders for runner in runners])
+        inputs = _input_specs(coders, vocabulary_files)
+        constant_feeds = _constant_feeds(coders, inputs)
+
+        input_names = [name for spec in inputs
+                       for name in spec.get("factors", [])
+                       + [spec[key] for key in ["mask", "tensor"]
+                          if key in spec]]
+        graph_def = _freeze(sessions[0], input_names,
+                            [output["tensor"] for output in outputs],
+                            constant_feeds)
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, GRAPH_FILE), "wb") as f_graph:
+        f_graph.write(graph_def.SerializeToString())
+
+    for vocabulary, name in vocabulary_files.items():
+        with open(os.path.join(output_dir, name), "w",
+                  encoding="utf-8") as f_vocab:
+            json.dump(list(vocabulary.index_to_word), f_vocab,
+                      ensure_ascii=False)
+
+    signature = {
+        "inputs": inputs,
+        "outputs": outputs,
+        "vocabularies": list(vocabulary_files.values()),
+        "special_tokens": {
+            "pad": PAD_TOKEN_INDEX,
+            "start": START_TOKEN_INDEX,
+            "end": END_TOKEN_INDEX,
+            "unk": UNK_TOKEN_INDEX}}
+    with open(os.path.join(output_dir, SIGNATURE_FILE), "w",
+              encoding="utf-8") as f_signature:
+        json.dump(signature, f_signature, indent=2)
+
+    log("Exported the series {} with {} graph nodes to {}".format(
+        ", ".join(output["series"] for output in outputs),
+        len(graph_def.node), output_dir))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("config", metavar="INI-FILE",
+                        help="the configuration file of the experiment")
+    parser.add_argument("output", metavar="OUTPUT-DIR",
+                        help="the directory for the exported model")
+    parser.add_argument("--variables", type=str, default=None,
+                        help="the checkpoint with the trained variables, "
+                        "defaults to the variables of the experiment")
+    parser.add_argument("--series", type=str, nargs="+", default=None,
+                        help="the output series to export, defaults to the "
+                        "series of all the runners")
+    args = parser.parse_args()
+
+    exp = Experiment(config_path=args.config)
+    exp.build_model()
+    exp.load_variables([args.variables] if args.variables else None)
+
+    export_inference_graph(exp, args.output, args.series)
+
+    for session in exp.config.model.tf_manager.sessions:
+        session.close()
@@ -0,0 +1,169 @@
+"""Serving of models exported as frozen inference graphs.
+
+The model is loaded from a directory written by ``neuralmonkey-export``
+(see ``neuralmonkey.export``). It contains the frozen graph with only the
+operations the exported runners need, a signature that describes how to
+feed the graph from the data series and how to read the outputs, and the
+vocabularies.
+
+This module only needs NumPy and TensorFlow. It does not import the
+configuration and the model classes of Neural Monkey, so serving a model
+does not parse its configuration, build its graph or restore its variables.
+"""
+import json
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+import tensorflow as tf
+
+GRAPH_FILE = "graph.pb"
+SIGNATURE_FILE = "signature.json"
+
+
+class FrozenModel(object):
+    """A model loaded from an exported inference graph."""
+
+    def __init__(self,
+                 path: str,
+                 session_config: tf.ConfigProto = None) -> None:
+        """Load the exported model.
+
+        Arguments:
+            path: The directory with the exported model.
+            session_config: Optional configuration of the TensorFlow
+                session.
+        """
+        with open(os.path.join(path, SIGNATURE_FILE),
+                  encoding="utf-8") as f_signature:
+            self.signature = json.load(f_signature)
+
+        self._index_to_word = {}  # type: Dict[str, List[str]]
+        self._word_to_index = {}  # type: Dict[str, Dict[str, int]]
+        for name in self.signature["vocabularies"]:
+            with open(os.path.join(path, name), encoding="utf-8") as f_vocab:
+                words = json.load(f_vocab)
+            self._index_to_word[name] = words
+            self._word_to_index[name] = {
+                word: index for index, word in enumerate(words)}
+
+        graph_def = tf.GraphDef()
+        with open(os.path.join(path, GRAPH_FILE), "rb") as f_graph:
+            graph_def.ParseFromString(f_graph.read())
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.import_graph_def(graph_def, name="")
+        self.session = tf.Session(graph=self.graph, config=session_config)
+
+    @property
+    def output_series(self) -> List[str]:
+        return [output["series"] for output in self.signature["outputs"]]
+
+    def run(self, data: Dict[str, List[Any]],
+            output_series: List[str] = None) -> Dict[str, List[Any]]:
+        """Run the model on a batch of data.
+
+        Arguments:
+            data: The input data series, e.g. lists of tokenized sentences.
+            output_series: The output series to compute. Defaults to all
+                the exported series.
+
+        Returns:
+            A dictionary with the outputs of each output series.
+        """
+        if output_series is None:
+            output_series = self.output_series
+        outputs = [output for output in self.signature["outputs"]
+                   if output["series"] in output_series]
+
+        batch_size = len(next(iter(data.values())))
+        feed_dict = {}  # type: Dict[str, np.ndarray]
+        for spec in self.signature["inputs"]:
+            if spec["type"] == "sequence":
+                self._feed_sequence(spec, data, feed_dict)
+            elif spec["type"] == "fill":
+                feed_dict[spec["tensor"]] = np.full(
+                    [batch_size], spec["value"], dtype=spec["dtype"])
+            else:
+                raise ValueError(
+                    "Unknown input type '{}'.".format(spec["type"]))
+
+        values = self.session.run(
+            [output["tensor"] for output in outputs], feed_dict)
+
+        results = {}  # type: Dict[str, List[Any]]
+        for output, value in zip(outputs, values):
+            if output["type"] == "tokens":
+                results[output["series"]] = self._ids_to_sentences(
+                    value, output["vocabulary"])
+            else:
+                results[output["series"]] = list(value)
+
+        return results
+
+    def _feed_sequence(self, spec: Dict[str, Any], data: Dict[str, List[Any]],
+                       feed_dict: Dict[str, np.ndarray]) -> None:
+        """Feed the token ids and the mask of an embedded sequence.
+
+        The ids are computed in the same way as in
+        ``Vocabulary.sentences_to_tensor``.
+        """
+        special = self.signature["special_tokens"]
+        mask = None
+
+        for data_id, tensor, vocabulary in zip(
+                spec["data_ids"], spec["factors"], spec["vocabularies"]):
+            if data_id not in data:
+                raise ValueError(
+                    "Missing input data series '{}'.".format(data_id))
+            sentences = data[data_id]
+            word_to_index = self._word_to_index[vocabulary]
+
+            length = max(len(s) for s in sentences)
+            if spec["add_end_symbol"]:
+                length += 1
+            if spec["max_length"] is not None:
+                length = min(length, spec["max_length"])
+
+            ids = np.full([len(sentences), length], special["pad"],
+                          dtype=np.int32)
+            mask = np.zeros([len(sentences), length])
+            for i, sentence in enumerate(sentences):
+                words = sentence[:length]
+                ids[i, :len(words)] = [
+                    word_to_index.get(word, special["unk"]) for word in words]
+                mask[i, :len(words)] = 1
+
+                if spec["add_end_symbol"] and len(sentence) < length:
+                    ids[i, len(sentence)] = special["end"]
+                    mask[i, len(sentence)] = 1
+
+            if spec["add_start_symbol"]:
+                ids = np.insert(ids, 0, special["start"], axis=1)
+                mask = np.insert(mask, 0, 1, axis=1)
+
+            feed_dict[tensor] = ids
+
+        assert mask is not None
+        feed_dict[spec["mask"]] = mask.astype(spec["mask_dtype"])
+
+    def _ids_to_sentences(self, ids: np.ndarray,
+                          vocabulary: str) -> List[List[str]]:
+        """Convert time-major decoded ids to sentences ending before ``</s>``.
+
+        The conversion is the same as in ``Vocabulary.vectors_to_sentences``.
+        """
+        index_to_word = self._index_to_word[vocabulary]
+        end_index = self.signature["special_tokens"]["end"]
+
+        sentences = []
+        for sentence_ids in ids.T:
+            sentence = []  # type: List[str]
+            for index in sentence_ids:
+                if index == end_index:
+                    break
+                sentence.append(index_to_word[index])
+            sentences.append(sentence)
+
+        return sentences
@@ -6,9 +6,11 @@ from typing import (Any, Callable, Dict, List, Tuple, Optional, Union,
                     Iterable, Set)
 # pylint: enable=unused-import
 
+import os
 import time
 import collections
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import timedelta
 import numpy as np
 import tensorflow as tf
@@ -16,7 +18,9 @@ from termcolor import colored
 from typeguard import check_argument_types, check_type
 
 from neuralmonkey.logging import log, log_print, warn, notice
+from neuralmonkey.profiling import Profiler, phase
 from neuralmonkey.dataset import Dataset, LazyDataset
+from neuralmonkey.distributed import ModelAveraging
 from neuralmonkey.tf_manager import TensorFlowManager
 from neuralmonkey.runners.base_runner import BaseRunner, ExecutionResult
 from neuralmonkey.trainers.generic_trainer import GenericTrainer
@@ -50,7 +54,12 @@ def training_loop(tf_manager: TensorFlowManager,
                   train_start_offset: int = 0,
                   runners_batch_size: Optional[int] = None,
                   initial_variables: Optional[Union[str, List[str]]] = None,
-                  postprocess: Postprocess = None) -> None:
+                  postprocess: Postprocess = None,
+                  fused_logging: bool = False,
+                  async_validation: bool = False,
+                  profiling: bool = False,
+                  chrome_trace_steps: int = 0,
+                  averaging: Optional[ModelAveraging] = None) -> None:
     """Execute the training loop for given graph and data.
 
     Args:
@@ -91,6 +100,31 @@ def training_loop(tf_manager: TensorFlowManager,
             continuation of training
         postprocess: A function which takes the dataset with its output series
             and generates additional series from them.
+        fused_logging: If True, the runners are executed on the logging
+            batches in the same session run as the training step instead of
+            running them afterwards, which saves a second forward pass over
+            the batch. The logged outputs are then computed in the training
+            mode (e.g., with dropout) and may reflect the variables either
+            before or after the update.
+        async_validation: If True, the validation runs in a background
+            thread on a snapshot of the variables (see
+            ``TensorFlowManager.snapshot``) while the training continues. The
+            best models are saved from the snapshot. If the previous
+            validation has not finished yet when the next one is due, the
+            next one is skipped.
+        profiling: If True, the wall-clock and CPU time of the phases of
+            every training step (reading data, preprocessing, building feed
+            dicts, session runs, postprocessing, evaluation and
+            checkpointing) is written to ``profile.jsonl`` in the log
+            directory and averaged into TensorBoard summaries on logging.
+        chrome_trace_steps: When profiling, export the phases of this many
+            initial steps to ``profile.trace.json`` in the Chrome trace
+            format.
+        averaging: When training in several worker processes, the client
+            for averaging the variables with the other workers. The
+            variables are averaged before the training and then
+            periodically. Only the chief worker validates and evaluates the
+            model on the test datasets.
     """
     check_argument_types()
 
@@ -139,15 +173,98 @@ def training_loop(tf_manager: TensorFlowManager,
         except tf.errors.NotFoundError:
             warn("Some variables were not found in checkpoint.)")
 
+    if averaging is not None:
+        log("Synchronizing variables with the other workers.")
+        averaging.synchronize(tf_manager)
+    validating = averaging is None or averaging.is_chief
+
     if log_directory:
         log("Initializing TensorBoard summary writer.")
         tb_writer = tf.summary.FileWriter(
             log_directory, tf_manager.sessions[0].graph)
         log("TensorBoard writer initialized.")
 
+    all_coders = set.union(
+        *[rnr.all_coders for rnr in runners + [trainer]])  # type: ignore
+
+    if profiling:
+        Profiler.start(
+            os.path.join(log_directory, "profile.jsonl"),
+            os.path.join(log_directory, "profile.trace.json"),
+            chrome_trace_steps)
+
+    def validate(epoch_n: int, batch_n: int, seen_instances: int,
+                 sessions: List[tf.Session]) -> int:
+        """Evaluate the model in the given sessions on validation data.
+
+        Returns:
+            The number of validation examples.
+        """
+        val_examples = 0
+        for val_id, valset in enumerate(val_datasets):
+            val_examples += len(valset)
+
+            val_results, val_outputs = run_on_dataset(
+                tf_manager, runners, valset,
+                postprocess, write_out=False,
+                batch_size=runners_batch_size,
+                sessions=sessions)
+            # ensure val outputs are iterable more than once
+            val_outputs = {k: list(v)
+                           for k, v in val_outputs.items()}
+            with phase("evaluation"):
+                val_evaluation = evaluation(
+                    evaluators, valset, runners, val_results,
+                    val_outputs)
+
+            valheader = ("Validation (epoch {}, batch number {}):"
+                         .format(epoch_n, batch_n))
+            log(valheader, color="blue")
+            _print_examples(
+                valset, val_outputs, val_preview_input_series,
+                val_preview_output_series,
+                val_preview_num_examples)
+            log_print("")
+            log(valheader, color="blue")
+
+            # The last validation set is selected to be the main
+            if val_id == len(val_datasets) - 1:
+                this_score = val_evaluation[main_metric]
+                # store also graph parts
+                with phase("checkpointing"):
+                    tf_manager.validation_hook(this_score, epoch_n,
+                                               batch_n, sessions,
+                                               model_parts=all_coders)
+
+                if this_score == tf_manager.best_score:
+                    best_score_str = colored(
+                        "{:.4g}".format(tf_manager.best_score),
+                        attrs=["bold"])
+                else:
+                    best_score_str = "{:.4g}".format(
+                        tf_manager.best_score)
+
+                log("best {} on validation: {} (in epoch {}, "
+                    "after batch number {})"
+                    .format(main_metric, best_score_str,
+                            tf_manager.best_score_epoch,
+                            tf_manager.best_score_batch),
+                    color="blue")
+
+            v_name = valset.name if len(val_datasets) > 1 else None
+            _log_continuous_evaluation(
+                tb_writer, main_metric, val_evaluation,
+                seen_instances, epoch_n, epochs, val_results,
+                train=False, dataset_name=v_name)
+
+        return val_examples
+
+    validation_executor = ThreadPoolExecutor(max_workers=1)
+    pending_validation = None  # type: Optional[Future]
+
     log("Starting training")
-    last_log_time = time.process_time()
-    last_val_time = time.process_time()
+    last_log_time = time.monotonic()
+    last_val_time = time.monotonic()
     interrupt = None
     try:
         for epoch_n in range(1, epochs + 1):
@@ -164,126 +281,118 @@ def training_loop(tf_manager: TensorFlowManager,
                 else:
                     _skip_lines(train_start_offset, train_batched_datasets)
 
-            for batch_n, batch_dataset in enumerate(train_batched_datasets):
+            for batch_n, batch_dataset in enumerate(Profiler.iterate(
+                    "data_read", train_batched_datasets)):
                 step += 1
                 seen_instances += len(batch_dataset)
                 if _is_logging_time(step, log_period_batch,
                                     last_log_time, log_period_time):
-                    trainer_result = tf_manager.execute(
-                        batch_dataset, [trainer], train=True,
-                        summaries=True)
-                    train_results, train_outputs = run_on_dataset(
-                        tf_manager, runners, batch_dataset,
-                        postprocess, write_out=False,
-                        batch_size=runners_batch_size)
+                    if fused_logging:
+                        trainer_result, train_results, train_outputs = \
+                            _train_and_run_on_batch(
+                                tf_manager, trainer, runners, batch_dataset,
+                                postprocess)
+                    else:
+                        trainer_result = tf_manager.execute(
+                            batch_dataset, [trainer], train=True,
+                            summaries=True)
+                        train_results, train_outputs = run_on_dataset(
+                            tf_manager, runners, batch_dataset,
+                            postprocess, write_out=False,
+                            batch_size=runners_batch_size)
                     # ensure train outputs are iterable more than once
                     train_outputs = {k: list(v) for k, v
                                      in train_outputs.items()}
-                    train_evaluation = evaluation(
-                        evaluators, batch_dataset, runners,
-                        train_results, train_outputs)
+                    with phase("evaluation"):
+                        train_evaluation = evaluation(
+                            evaluators, batch_dataset, runners,
+                            train_results, train_outputs)
 
                     _log_continuous_evaluation(
                         tb_writer, main_metric, train_evaluation,
                         seen_instances, epoch_n, epochs, trainer_result,
                         train=True)
-                    last_log_time = time.process_time()
+                    if profiling and tb_writer:
+                        profile_str = tf.Summary(value=[
+                            tf.Summary.Value(tag=tag, simple_value=value)
+                            for tag, value in Profiler.summary().items()])
+                        tb_writer.add_summary(profile_str, seen_instances)
+                    last_log_time = time.monotonic()
                 else:
                     tf_manager.execute(batch_dataset, [trainer],
                                        train=True, summaries=False)
 
-                if _is_logging_time(step, val_period_batch,
-                                    last_val_time, val_period_time):
-                    log_print("")
-                    val_duration_start = time.process_time()
-                    val_examples = 0
-                    for val_id, valset in enumerate(val_datasets):
-                        val_examples += len(valset)
-
-                        val_results, val_outputs = run_on_dataset(
-                            tf_manager, runners, valset,
-                            postprocess, write_out=False,
-                            batch_size=runners_batch_size)
-                        # ensure val outputs are iterable more than once
-                        val_outputs = {k: list(v)
-                                       for k, v in val_outputs.items()}
-                        val_evaluation = evaluation(
-                            evaluators, valset, runners, val_results,
-                            val_outputs)
-
-                        valheader = ("Validation (epoch {}, batch number {}):"
-                                     .format(epoch_n, batch_n))
-                        log(valheader, color="blue")
-                        _print_examples(
-                            valset, val_outputs, val_preview_input_series,
-                            val_preview_output_series,
-                            val_preview_num_examples)
-                        log_print("")
-                        log(valheader, color="blue")
-
-                        # The last validation set is selected to be the main
-                        if val_id == len(val_datasets) - 1:
-                            this_score = val_evaluation[main_metric]
-                            tf_manager.validation_hook(this_score, epoch_n,
-                                                       batch_n)
-
-                            if this_score == tf_manager.best_score:
-                                best_score_str = colored(
-                                    "{:.4g}".format(tf_manager.best_score),
-                                    attrs=["bold"])
-
-                                # store also graph parts
-                                all_coders = set.union(
-                                    *[rnr.all_coders
-                                      for rnr in runners
-                                      + [trainer]])  # type: ignore
-                                for coder in all_coders:
-                                    for session in tf_manager.sessions:
-                                        coder.save(session)
-                            else:
-                                best_score_str = "{:.4g}".format(
-                                    tf_manager.best_score)
-
-                            log("best {} on validation: {} (in epoch {}, "
-                                "after batch number {})"
-                                .format(main_metric, best_score_str,
-                                        tf_manager.best_score_epoch,
-                                        tf_manager.best_score_batch),
-                                color="blue")
-
-                        v_name = valset.name if len(val_datasets) > 1 else None
-                        _log_continuous_evaluation(
-                            tb_writer, main_metric, val_evaluation,
-                            seen_instances, epoch_n, epochs, val_results,
-                            train=False, dataset_name=v_name)
-
-                    # how long was the training between validations
-                    training_duration = val_duration_start - last_val_time
-                    val_duration = time.process_time() - val_duration_start
-
-                    # the training should take at least twice the time of val.
-                    steptime = (training_duration
-                                / (seen_instances - last_seen_instances))
-                    valtime = val_duration / val_examples
-                    last_seen_instances = seen_instances
-                    log("Validation time: {:.2f}s, inter-validation: {:.2f}s, "
-                        "per-instance (train): {:.2f}s, per-instance (val): "
-                        "{:.2f}s".format(val_duration, training_duration,
-                                         steptime, valtime), color="blue")
-                    if training_duration < 2 * val_duration:
-                        notice("Validation period setting is inefficient.")
-
-                    log_print("")
-                    last_val_time = time.process_time()
+                Profiler.end_step(step)
+                if averaging is not None:
+                    averaging.step(tf_manager, step)
+
+                if (pending_validation is not None
+                        and pending_validation.done()):
+                    # re-raises exceptions from the validation thread
+                    pending_validation.result()
+                    pending_validation = None
+
+                if not validating or not _is_logging_time(
+                        step, val_period_batch, last_val_time,
+                        val_period_time):
+                    continue
+
+                if async_validation:
+                    if pending_validation is not None:
+                        notice("Previous validation is still running, "
+                               "skipping validation after batch {}."
+                               .format(batch_n))
+                    else:
+                        pending_validation = validation_executor.submit(
+                            validate, epoch_n, batch_n, seen_instances,
+                            tf_manager.snapshot())
+                    last_val_time = time.monotonic()
+                    continue
+
+                log_print("")
+                val_duration_start = time.monotonic()
+                val_cpu_start = time.process_time()
+                val_examples = validate(epoch_n, batch_n, seen_instances,
+                                        tf_manager.sessions)
+
+                # how long was the training between validations
+                training_duration = val_duration_start - last_val_time
+                val_duration = time.monotonic() - val_duration_start
+                val_cpu = time.process_time() - val_cpu_start
+
+                # the training should take at least twice the time of val.
+                steptime = (training_duration
+                            / (seen_instances - last_seen_instances))
+                valtime = val_duration / val_examples
+                last_seen_instances = seen_instances
+                log("Validation time: {:.2f}s (CPU {:.2f}s), "
+                    "inter-validation: {:.2f}s, per-instance (train): "
+                    "{:.2f}s, per-instance (val): {:.2f}s".format(
+                        val_duration, val_cpu, training_duration, steptime,
+                        valtime), color="blue")
+                if training_duration < 2 * val_duration:
+                    notice("Validation period setting is inefficient.")
+
+                log_print("")
+                last_val_time = time.monotonic()
 
     except KeyboardInterrupt as ex:
         interrupt = ex
 
+    if pending_validation is not None:
+        log("Waiting for the running validation to finish.")
+        pending_validation.result()
+    validation_executor.shutdown()
+    tf_manager.wait_for_saving()
+    if averaging is not None:
+        averaging.close()
+    Profiler.finish()
+
     log("Training finished. Maximum {} on validation data: {:.4g}, epoch {}"
         .format(main_metric, tf_manager.best_score,
                 tf_manager.best_score_epoch))
 
-    if test_datasets:
+    if test_datasets and validating:
         tf_manager.restore_best_vars()
 
         for dataset in test_datasets:
@@ -306,7 +415,7 @@ def _is_logging_time(step: int, logging_period_batch: int,
                      last_log_time: float, logging_period_time: int):
     if logging_period_batch is not None:
         return step % logging_period_batch == logging_period_batch - 1
-    return last_log_time + logging_period_time < time.process_time()
+    return last_log_time + logging_period_time < time.monotonic()
 
 
 def _resolve_period(period):
@@ -362,7 +471,8 @@ def run_on_dataset(tf_manager: TensorFlowManager,
                    postprocess: Postprocess,
                    write_out: bool = False,
                    batch_size: Optional[int] = None,
-                   log_progress: int = 0) -> Tuple[
+                   log_progress: int = 0,
+                   sessions: List[tf.Session] = None) -> Tuple[
                        List[ExecutionResult], Dict[str, List[Any]]]:
     """Apply the model on a dataset and optionally write outputs to files.
 
@@ -377,6 +487,8 @@ def run_on_dataset(tf_manager: TensorFlowManager,
             in the dataset object.
         batch_size: size of the minibatch
         log_progress: log progress every X seconds
+        sessions: Sessions in which the model is executed. Defaults to the
+            sessions of the TensorFlow manager.
 
         extra_fetches: Extra tensors to evaluate for each batch.
 
@@ -392,25 +504,10 @@ def run_on_dataset(tf_manager: TensorFlowManager,
     all_results = tf_manager.execute(dataset, runners,
                                      compute_losses=contains_targets,
                                      batch_size=batch_size,
-                                     log_progress=log_progress)
-
-    result_data = {runner.output_series: result.outputs
-                   for runner, result in zip(runners, all_results)}
-
-    if postprocess is not None:
-        for series_name, postprocessor in postprocess:
-            postprocessed = postprocessor(dataset, result_data)
-            if not hasattr(postprocessed, "__len__"):
-                postprocessed = list(postprocessed)
-
-            result_data[series_name] = postprocessed
+                                     log_progress=log_progress,
+                                     sessions=sessions)
 
-    # check output series lengths
-    for series_id, data in result_data.items():
-        if len(data) != len(dataset):
-            warn("Output '{}' for dataset '{}' has length {}, but "
-                 "len(dataset) == {}".format(series_id, dataset.name,
-                                             len(data), len(dataset)))
+    result_data = _collect_outputs(runners, all_results, dataset, postprocess)
 
     def _check_savable_dict(data):
         """Check if the data is of savable type."""
@@ -454,6 +551,60 @@ def run_on_dataset(tf_manager: TensorFlowManager,
     return all_results, result_data
 
 
+def _collect_outputs(runners: List[BaseRunner],
+                     all_results: List[ExecutionResult],
+                     dataset: Dataset,
+                     postprocess: Postprocess) -> Dict[str, List[Any]]:
+    """Get the output series from the runner results and postprocess them."""
+    result_data = {runner.output_series: result.outputs
+                   for runner, result in zip(runners, all_results)}
+
+    if postprocess is not None:
+        with phase("postprocess"):
+            for series_name, postprocessor in postprocess:
+                postprocessed = postprocessor(dataset, result_data)
+                if not hasattr(postprocessed, "__len__"):
+                    postprocessed = list(postprocessed)
+
+                result_data[series_name] = postprocessed
+
+    # check output series lengths
+    for series_id, data in result_data.items():
+        if len(data) != len(dataset):
+            warn("Output '{}' for dataset '{}' has length {}, but "
+                 "len(dataset) == {}".format(series_id, dataset.name,
+                                             len(data), len(dataset)))
+
+    return result_data
+
+
+def _train_and_run_on_batch(
+        tf_manager: TensorFlowManager,
+        trainer: GenericTrainer,
+        runners: List[BaseRunner],
+        batch: Dataset,
+        postprocess: Postprocess) -> Tuple[List[ExecutionResult],
+                                           List[ExecutionResult],
+                                           Dict[str, List[Any]]]:
+    """Do a training step and execute the runners in the same session run.
+
+    The runner fetches are merged with the training fetches by the
+    TensorFlow manager, so the parts of the graph shared by the trainer and
+    the runners (e.g., the encoder and the teacher-forced decoder) are
+    computed only once.
+
+    Returns:
+        A tuple of the trainer results, the runner results and the output
+        series of the runners.
+    """
+    all_results = tf_manager.execute(
+        batch, [trainer] + runners, train=True, summaries=True)  # type: ignore
+    trainer_results, runner_results = all_results[:1], all_results[1:]
+
+    outputs = _collect_outputs(runners, runner_results, batch, postprocess)
+    return trainer_results, runner_results, outputs
+
+
 def evaluation(evaluators, dataset, runners, execution_results, result_data):
     """Evaluate the model outputs.
 
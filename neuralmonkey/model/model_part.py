@@ -2,7 +2,7 @@
 
 from abc import ABCMeta
 from contextlib import contextmanager
-from typing import Any, Callable, Dict, List, Set, Tuple
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 import tensorflow as tf
 
@@ -42,6 +42,17 @@ class ModelPart(metaclass=ABCMeta):
         """Name of the model part and its variable scope."""
         return self._name
 
+    @property
+    def save_checkpoint(self) -> Optional[str]:
+        """Checkpoint to which the model part variables are saved."""
+        return self._save_checkpoint
+
+    @property
+    def variables(self) -> List[tf.Variable]:
+        """Global variables in the variable scope of the model part."""
+        return tf.get_collection(
+            tf.GraphKeys.GLOBAL_VARIABLES, scope=self._variable_scope.name)
+
     @contextmanager
     def use_scope(self):
         """Return a context manager.
@@ -94,11 +105,8 @@ class ModelPart(metaclass=ABCMeta):
 
     def _init_saver(self) -> None:
         if not self._saver:
-            parts_variables = tf.get_collection(
-                tf.GraphKeys.GLOBAL_VARIABLES, scope=self._variable_scope.name)
-
             with self.use_scope():
-                self._saver = tf.train.Saver(var_list=parts_variables)
+                self._saver = tf.train.Saver(var_list=self.variables)
 
     def save(self, session: tf.Session) -> None:
         """Save model part to a checkpoint file."""
@@ -12,7 +12,8 @@ from neuralmonkey.model.stateful import TemporalStateful
 from neuralmonkey.vocabulary import Vocabulary
 from neuralmonkey.decorators import tensor
 from neuralmonkey.dataset import Dataset
-from neuralmonkey.tf_utils import get_variable
+from neuralmonkey.quantization import gather
+from neuralmonkey.tf_utils import get_variable, float_dtype
 
 
 # pylint: disable=abstract-method
@@ -110,7 +111,7 @@ class EmbeddedFactorSequence(Sequence):
             raise ValueError("Embedding size must be a positive integer.")
 
         with self.use_scope():
-            self.mask = tf.placeholder(tf.float32, [None, None], "mask")
+            self.mask = tf.placeholder(float_dtype(), [None, None], "mask")
             self.input_factors = [
                 tf.placeholder(tf.int32, [None, None], "factor_{}".format(did))
                 for did in self.data_ids]
@@ -166,7 +167,7 @@ class EmbeddedFactorSequence(Sequence):
         embedded_factors = []
         for (factor, embedding_matrix) in zip(
                 self.input_factors, self.embedding_matrices):
-            emb_factor = tf.nn.embedding_lookup(embedding_matrix, factor)
+            emb_factor = gather(embedding_matrix, factor)
 
             # github.com/tensorflow/tensor2tensor/blob/v1.5.6/tensor2tensor/
             #            layers/modalities.py#L104
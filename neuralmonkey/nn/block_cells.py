@@ -0,0 +1,107 @@
+"""Recurrent cells computed by the fused TensorFlow block kernels.
+
+The block GRU cell computes a whole time step in a single op and the fused
+LSTM runs over the whole sequence in a single op, instead of the many small
+ops of the standard cells. This is considerably faster, mainly on CPU.
+
+The variables are created under the names of the variables of the standard
+cells (``OrthoGRUCell`` and ``LSTMCell``) they replace, so the checkpoints
+are interchangeable between the block and the standard cells. The kernels
+support only float32.
+"""
+from typing import Callable, Dict, Tuple
+
+import tensorflow as tf
+
+# GRUBlockCell variables and their names in GRUCell
+GRU_VARIABLE_NAMES = {
+    "w_ru": "gates/kernel",
+    "b_ru": "gates/bias",
+    "w_c": "candidate/kernel",
+    "b_c": "candidate/bias"}
+
+# LSTMBlockFusedCell variables (in older TensorFlow) and names in LSTMCell
+LSTM_VARIABLE_NAMES = {
+    "weights": "kernel",
+    "biases": "bias"}
+
+
+def _renaming_getter(names: Dict[str, str],
+                     kernel_initializer: Callable = None) -> Callable:
+    """Create a custom getter which renames the variables of a block cell.
+
+    Arguments:
+        names: Mapping of the block cell variable names to the names of the
+            variables of the standard cell.
+        kernel_initializer: Optional initializer of the kernels which
+            overrides the one used by the block cell.
+    """
+
+    def getter(get_variable, name, *args, **kwargs):
+        scope, _, base_name = name.rpartition("/")
+        base_name = names.get(base_name, base_name)
+        name = "{}/{}".format(scope, base_name) if scope else base_name
+
+        if (kernel_initializer is not None
+                and base_name.endswith("kernel")):
+            kwargs["initializer"] = kernel_initializer
+
+        return get_variable(name, *args, **kwargs)
+
+    return getter
+
+
+# pylint: disable=too-few-public-methods
+class BlockGRUCell(tf.contrib.rnn.GRUBlockCell):
+    """GRU cell computed by a single op with the variables of OrthoGRUCell.
+
+    Like ``OrthoGRUCell``, the kernels are initialized by random orthogonal
+    matrices.
+    """
+
+    def __call__(self, inputs, state, scope="OrthoGRUCell"):
+        with tf.variable_scope(
+                scope, custom_getter=_renaming_getter(
+                    GRU_VARIABLE_NAMES,
+                    tf.orthogonal_initializer())) as cell_scope:
+            return tf.contrib.rnn.GRUBlockCell.__call__(
+                self, inputs, state, scope=cell_scope)
+
+
+def fused_lstm(inputs: tf.Tensor,
+               lengths: tf.Tensor,
+               num_units: int,
+               reverse: bool = False) -> Tuple[tf.Tensor, tf.Tensor]:
+    """Run a LSTM over a batch of sequences as a single op.
+
+    The variables are created in the ``lstm_cell`` scope like the variables
+    of ``LSTMCell`` run by ``tf.nn.dynamic_rnn``.
+
+    Arguments:
+        inputs: Batch-major input sequences, ``[batch, time, dim]``.
+        lengths: Lengths of the input sequences.
+        num_units: The size of the LSTM state.
+        reverse: Process the sequences from their ends.
+
+    Returns:
+        The batch-major outputs, zero after the end of each sequence, and
+        the output of the last step of each sequence.
+    """
+    time_major = tf.transpose(inputs, [1, 0, 2])
+    if reverse:
+        time_major = tf.reverse_sequence(
+            time_major, lengths, seq_axis=0, batch_axis=1)
+
+    cell = tf.contrib.rnn.LSTMBlockFusedCell(num_units)
+    with tf.variable_scope(
+            "lstm_cell",
+            custom_getter=_renaming_getter(LSTM_VARIABLE_NAMES)) as scope:
+        outputs, (_, final_output) = cell(
+            time_major, dtype=inputs.dtype, sequence_length=lengths,
+            scope=scope)
+
+    if reverse:
+        outputs = tf.reverse_sequence(
+            outputs, lengths, seq_axis=0, batch_axis=1)
+
+    return tf.transpose(outputs, [1, 0, 2]), final_output
@@ -0,0 +1,282 @@
+"""Softmax cross-entropy objectives for large output vocabularies.
+
+The functions compute the cross-entropy of flat batches of positions, i.e.
+the inputs of the output projection have shape ``[positions, dim]`` and the
+labels ``[positions]``. Apart from the full softmax, the cross entropy can
+be approximated by a sampled softmax or noise-contrastive estimation, or
+computed by an adaptive softmax, which only computes the logits of the rare
+words for the positions whose targets are among them. The decoders use the
+log-probabilities of the adaptive softmax in place of the logits.
+"""
+from typing import List, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.vocabulary import Vocabulary, UNK_TOKEN_INDEX
+
+SOFTMAX_TYPES = ["full", "sampled", "nce", "adaptive"]
+
+
+def smoothed_softmax_xent(labels: tf.Tensor,
+                          logits: tf.Tensor,
+                          label_smoothing: float = None) -> tf.Tensor:
+    """Compute the cross entropy with smoothed labels.
+
+    The target distribution puts ``1 - label_smoothing`` on the label and
+    distributes ``label_smoothing`` uniformly over the whole vocabulary. The
+    loss is computed from the log-normalizer and the mean of the logits, so
+    the dense targets are never built.
+
+    Arguments:
+        labels: Integer labels of shape ``[positions]``.
+        logits: Logits of shape ``[positions, vocabulary]``.
+        label_smoothing: The smoothing weight.
+
+    Returns:
+        The cross entropy of each position.
+    """
+    xent = tf.nn.sparse_softmax_cross_entropy_with_logits(
+        labels=labels, logits=logits)
+    if not label_smoothing:
+        return xent
+
+    # cross entropy of the uniform distribution: log Z - mean(logits)
+    uniform_xent = (tf.reduce_logsumexp(logits, axis=-1)
+                    - tf.reduce_mean(logits, axis=-1))
+    return (1 - label_smoothing) * xent + label_smoothing * uniform_xent
+
+
+def word_frequencies(vocabulary: Vocabulary) -> np.ndarray:
+    """Get the counts of the words in the order of the vocabulary indices.
+
+    The special tokens get the count of the most frequent word, so they
+    are always considered frequent.
+    """
+    counts = np.array([vocabulary.word_count.get(word, 0)
+                       for word in vocabulary.index_to_word],
+                      dtype=np.int64)
+    counts[:UNK_TOKEN_INDEX + 1] = max(np.max(counts), 1)
+
+    return counts
+
+
+def sampled_softmax_xent(inputs: tf.Tensor,
+                         labels: tf.Tensor,
+                         weights: tf.Tensor,
+                         biases: tf.Tensor,
+                         vocabulary: Vocabulary,
+                         num_sampled: int,
+                         nce: bool = False) -> tf.Tensor:
+    """Approximate the cross entropy using sampled output classes.
+
+    The negative classes are sampled from the unigram distribution of the
+    vocabulary (with the exponent of 0.75), or from a log-uniform
+    distribution when the vocabulary has no word counts.
+
+    Arguments:
+        inputs: Inputs of the output projection, ``[positions, dim]``.
+        labels: Integer labels of shape ``[positions]``.
+        weights: The output projection matrix, ``[vocabulary, dim]``.
+        biases: The output biases, ``[vocabulary]``.
+        vocabulary: The output vocabulary.
+        num_sampled: Number of the sampled classes per batch.
+        nce: Use noise-contrastive estimation instead of sampled softmax.
+
+    Returns:
+        The approximate cross entropy (or the NCE loss) of each position.
+    """
+    true_classes = tf.expand_dims(tf.to_int64(labels), 1)
+
+    sampled_values = None
+    if vocabulary.correct_counts:
+        sampled_values = tf.nn.fixed_unigram_candidate_sampler(
+            true_classes=true_classes,
+            num_true=1,
+            num_sampled=num_sampled,
+            unique=True,
+            range_max=len(vocabulary),
+            distortion=0.75,
+            unigrams=word_frequencies(vocabulary).tolist())
+
+    loss_function = tf.nn.nce_loss if nce else tf.nn.sampled_softmax_loss
+    return loss_function(
+        weights=weights,
+        biases=biases,
+        labels=true_classes,
+        inputs=inputs,
+        num_sampled=num_sampled,
+        num_classes=len(vocabulary),
+        sampled_values=sampled_values)
+
+
+def frequency_clusters(vocabulary: Vocabulary,
+                       cutoffs: List[int]) -> Tuple[List[int], np.ndarray,
+                                                    np.ndarray]:
+    """Split the vocabulary to the clusters of the adaptive softmax.
+
+    Arguments:
+        vocabulary: The output vocabulary.
+        cutoffs: Increasing sizes of the head and of the head with the
+            following clusters, e.g. ``[2000, 10000]`` for a head of 2000
+            words, one cluster of 8000 words and one with the rest.
+
+    Returns:
+        A tuple of the cluster boundaries (the cutoffs smaller than the
+        vocabulary and its size), the vocabulary indices sorted by the
+        frequency and the frequency ranks of the vocabulary indices.
+    """
+    vocabulary_size = len(vocabulary)
+    cutoffs = [c for c in cutoffs if c < vocabulary_size] + [vocabulary_size]
+    if len(cutoffs) < 2:
+        raise ValueError("The adaptive softmax needs at least one cutoff "
+                         "smaller than the vocabulary size.")
+
+    order = np.argsort(-word_frequencies(vocabulary), kind="mergesort")
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(vocabulary_size)
+
+    return cutoffs, order, ranks
+
+
+def _head_logits(inputs: tf.Tensor,
+                 weights: tf.Tensor,
+                 biases: tf.Tensor,
+                 cluster_weights: tf.Tensor,
+                 cluster_biases: tf.Tensor,
+                 head_words: np.ndarray) -> tf.Tensor:
+    """Compute the logits of the frequent words and the cluster classes."""
+    head_words = tf.constant(head_words, dtype=tf.int32)
+    return tf.concat([
+        tf.matmul(inputs, tf.gather(weights, head_words), transpose_b=True)
+        + tf.gather(biases, head_words),
+        tf.matmul(inputs, cluster_weights, transpose_b=True)
+        + cluster_biases], axis=1)
+
+
+def _cluster_logits(inputs: tf.Tensor,
+                    weights: tf.Tensor,
+                    biases: tf.Tensor,
+                    cluster_words: np.ndarray) -> tf.Tensor:
+    """Compute the logits of the words of a tail cluster."""
+    cluster_words = tf.constant(cluster_words, dtype=tf.int32)
+    return (tf.matmul(inputs, tf.gather(weights, cluster_words),
+                      transpose_b=True)
+            + tf.gather(biases, cluster_words))
+
+
+def adaptive_softmax_xent(inputs: tf.Tensor,
+                          labels: tf.Tensor,
+                          weights: tf.Tensor,
+                          biases: tf.Tensor,
+                          cluster_weights: tf.Tensor,
+                          cluster_biases: tf.Tensor,
+                          vocabulary: Vocabulary,
+                          cutoffs: List[int]) -> tf.Tensor:
+    """Compute the cross entropy of a frequency-clustered softmax.
+
+    The words are sorted by their frequency and split by the cutoffs into
+    the head and the tail clusters (see ``frequency_clusters``). The head
+    softmax is computed over the frequent words and one class for each tail
+    cluster, the tail softmaxes only for the positions whose label is in
+    the cluster. The word projections are shared with the full softmax.
+
+    Arguments:
+        inputs: Inputs of the output projection, ``[positions, dim]``.
+        labels: Integer labels of shape ``[positions]``.
+        weights: The output projection matrix, ``[vocabulary, dim]``.
+        biases: The output biases, ``[vocabulary]``.
+        cluster_weights: The projection of the cluster classes,
+            ``[clusters, dim]``.
+        cluster_biases: The biases of the cluster classes, ``[clusters]``.
+        vocabulary: The output vocabulary.
+        cutoffs: Increasing sizes of the head and of the head with the
+            following clusters.
+
+    Returns:
+        The cross entropy of each position.
+    """
+    cutoffs, order, ranks = frequency_clusters(vocabulary, cutoffs)
+    label_ranks = tf.gather(tf.constant(ranks, dtype=tf.int32), labels)
+    num_clusters = len(cutoffs) - 1
+
+    head_logits = _head_logits(inputs, weights, biases, cluster_weights,
+                               cluster_biases, order[:cutoffs[0]])
+
+    # the head class is the label for the frequent words, the cluster
+    # class otherwise
+    cluster_ids = tf.zeros_like(label_ranks)
+    for cutoff in cutoffs[:-1]:
+        cluster_ids += tf.to_int32(label_ranks >= cutoff)
+    head_labels = tf.where(cluster_ids > 0,
+                           cutoffs[0] + cluster_ids - 1, label_ranks)
+
+    xent = tf.nn.sparse_softmax_cross_entropy_with_logits(
+        labels=head_labels, logits=head_logits)
+
+    for cluster in range(1, num_clusters + 1):
+        start, end = cutoffs[cluster - 1], cutoffs[cluster]
+        positions = tf.where(tf.equal(cluster_ids, cluster))[:, 0]
+        positions = tf.to_int32(positions)
+
+        cluster_logits = _cluster_logits(tf.gather(inputs, positions),
+                                         weights, biases, order[start:end])
+        cluster_xent = tf.nn.sparse_softmax_cross_entropy_with_logits(
+            labels=tf.gather(label_ranks, positions) - start,
+            logits=cluster_logits)
+
+        xent += tf.scatter_nd(tf.expand_dims(positions, 1), cluster_xent,
+                              tf.shape(xent))
+
+    return xent
+
+
+def adaptive_softmax_logprobs(inputs: tf.Tensor,
+                              weights: tf.Tensor,
+                              biases: tf.Tensor,
+                              cluster_weights: tf.Tensor,
+                              cluster_biases: tf.Tensor,
+                              vocabulary: Vocabulary,
+                              cutoffs: List[int]) -> tf.Tensor:
+    """Compute the log-probabilities of a frequency-clustered softmax.
+
+    The distribution is the one trained by ``adaptive_softmax_xent``, the
+    log-probability of a word in a tail cluster is the log-probability of
+    the cluster class in the head plus the log-probability of the word in
+    the cluster. Unlike the cross entropy, all the tail softmaxes are
+    computed for all the positions.
+
+    Arguments:
+        inputs: Inputs of the output projection, ``[positions, dim]``.
+        weights: The output projection matrix, ``[vocabulary, dim]``.
+        biases: The output biases, ``[vocabulary]``.
+        cluster_weights: The projection of the cluster classes,
+            ``[clusters, dim]``.
+        cluster_biases: The biases of the cluster classes, ``[clusters]``.
+        vocabulary: The output vocabulary.
+        cutoffs: Increasing sizes of the head and of the head with the
+            following clusters.
+
+    Returns:
+        The log-probabilities of shape ``[positions, vocabulary]``.
+    """
+    cutoffs, order, ranks = frequency_clusters(vocabulary, cutoffs)
+
+    head_logprobs = tf.nn.log_softmax(_head_logits(
+        inputs, weights, biases, cluster_weights, cluster_biases,
+        order[:cutoffs[0]]))
+
+    # the log-probabilities of the words sorted by the frequency
+    sorted_logprobs = [head_logprobs[:, :cutoffs[0]]]
+    for cluster in range(1, len(cutoffs)):
+        start, end = cutoffs[cluster - 1], cutoffs[cluster]
+        cluster_class = cutoffs[0] + cluster - 1
+
+        cluster_logits = _cluster_logits(inputs, weights, biases,
+                                         order[start:end])
+        sorted_logprobs.append(
+            head_logprobs[:, cluster_class:cluster_class + 1]
+            + tf.nn.log_softmax(cluster_logits))
+
+    return tf.gather(tf.concat(sorted_logprobs, axis=1),
+                     tf.constant(ranks, dtype=tf.int32), axis=1)
@@ -35,3 +35,20 @@ def pipeline(processors: List[Callable]) -> Callable:
         return data
 
     return process
+
+
+def column_selector(column: int) -> Callable[[List[List[str]]], List[str]]:
+    """Select a column from the rows of a table series.
+
+    Args:
+        column: number of column to be selected. It starts with 1 for the
+            first column. Rows where the column is missing yield an empty
+            list.
+    """
+
+    def select(row: List[List[str]]) -> List[str]:
+        if len(row) < column:
+            return []
+        return row[column - 1]
+
+    return select
@@ -1,9 +1,14 @@
-from typing import Callable
+from typing import Any, Callable, Dict, List
+from functools import partial
+from multiprocessing import Pool
 
 import numpy as np
 from python_speech_features import mfcc, fbank, logfbank, ssc, delta
 
-from neuralmonkey.readers.audio_reader import Audio
+from neuralmonkey.logging import log
+from neuralmonkey.readers.audio_reader import (
+    Audio, audio_paths, get_audio_loader)
+from neuralmonkey.readers.numpy_reader import RaggedArrayWriter
 
 
 # pylint: disable=invalid-name
@@ -37,16 +42,75 @@ def SpeechFeaturesPreprocessor(feature_type: str = "mfcc",
         raise ValueError(
             "Unknown speech feature type '{}'".format(feature_type))
 
-    def preprocess(audio: Audio) -> np.ndarray:
-        features = [FEATURE_TYPES[feature_type](
-            audio.data, samplerate=audio.rate, **kwargs)]
+    # A partial application of a module-level function (as opposed to
+    # a closure) can be sent to worker processes.
+    return partial(_compute_features, feature_type=feature_type,
+                   delta_order=delta_order, delta_window=delta_window,
+                   kwargs=kwargs)
+# pylint: enable=invalid-name
+
+
+def extract_features(list_files: List[str],
+                     output: str,
+                     prefix: str = "",
+                     audio_format: str = "wav",
+                     num_workers: int = 1,
+                     feature_type: str = "mfcc",
+                     delta_order: int = 0,
+                     delta_window: int = 2,
+                     **kwargs) -> None:
+    """Compute speech features for a list of recordings and store them.
+
+    The audio files are loaded and the features computed in a pool of worker
+    processes. The features are written as float32 arrays into a ragged array
+    store (see :py:class:`neuralmonkey.readers.numpy_reader.RaggedArrayWriter`)
+    which can be read during training without touching the audio again using
+    :py:func:`neuralmonkey.readers.numpy_reader.ragged_array_reader`.
 
-        for _ in range(delta_order):
-            features.append(delta(features[-1], delta_window))
+    Arguments:
+        list_files: Files with lists of the audio files.
+        output: Path to the data file of the feature store.
+        prefix: Prefix of the paths to the audio files.
+        audio_format: Format of the audio files (wav or sph).
+        num_workers: Number of worker processes.
+        feature_type: mfcc, fbank, logfbank or ssc (default is mfcc)
+        delta_order: maximum order of the delta features (default is 0)
+        delta_window: window size for delta features (default is 2)
+        **kwargs: keyword arguments for the appropriate function from
+            python_speech_features
+    """
+    preprocess = SpeechFeaturesPreprocessor(
+        feature_type, delta_order, delta_window, **kwargs)
+    process_file = partial(_process_file, load_file=get_audio_loader(
+        audio_format), preprocess=preprocess)
+    paths = audio_paths(list_files, prefix)
+
+    with RaggedArrayWriter(output, dtype=np.float32) as writer:
+        if num_workers <= 1:
+            for features in map(process_file, paths):
+                writer.write(features)
+        else:
+            with Pool(num_workers) as pool:
+                for features in pool.imap(process_file, paths, chunksize=8):
+                    writer.write(features)
+
+    log("Speech features written to {}".format(output))
+
+
+def _process_file(path: str, load_file: Callable[[str], Audio],
+                  preprocess: Callable[[Audio], np.ndarray]) -> np.ndarray:
+    return preprocess(load_file(path)).astype(np.float32)
+
+
+def _compute_features(audio: Audio, feature_type: str, delta_order: int,
+                      delta_window: int, kwargs: Dict[str, Any]) -> np.ndarray:
+    features = [FEATURE_TYPES[feature_type](
+        audio.data, samplerate=audio.rate, **kwargs)]
 
-        return np.concatenate(features, axis=1)
+    for _ in range(delta_order):
+        features.append(delta(features[-1], delta_window))
 
-    return preprocess
+    return np.concatenate(features, axis=1)
 
 
 def _fbank(*args, **kwargs) -> np.ndarray:
@@ -0,0 +1,192 @@
+"""Measuring of the time spent in the phases of the training.
+
+The profiler measures the wall-clock time and the CPU time of the process
+(which includes TensorFlow threads) spent in named phases of the training
+steps, e.g., reading the data, building feed dicts or running the session.
+The phases can be nested; the time of an inner phase is not counted to the
+outer one.
+
+The times are written as one JSON object per training step to a trace file
+and averaged over the steps into TensorBoard summaries. Optionally, the phases
+of the first steps are exported as a trace viewable in Chrome
+(``chrome://tracing``).
+"""
+# pylint: disable=unused-import
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+# pylint: enable=unused-import
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+# pylint: disable=invalid-name
+T = TypeVar("T")
+# pylint: enable=invalid-name
+
+
+class Profiler(object):
+
+    enabled = False
+    trace_file = None  # type: Any
+    chrome_trace_path = None  # type: Optional[str]
+    chrome_trace_steps = 0
+
+    _lock = threading.Lock()
+    _local = threading.local()
+    _step = 0
+    # phase name -> [wall-clock time, CPU time]
+    _step_times = {}  # type: Dict[str, List[float]]
+    _period_times = {}  # type: Dict[str, List[float]]
+    _period_steps = 0
+    _chrome_events = []  # type: List[Dict[str, Any]]
+    _start_time = 0.
+
+    @staticmethod
+    def start(trace_path: str, chrome_trace_path: str = None,
+              chrome_trace_steps: int = 0) -> None:
+        """Start profiling.
+
+        Arguments:
+            trace_path: The file to which the times of the phases are
+                written, one JSON line per step.
+            chrome_trace_path: The file for the Chrome trace.
+            chrome_trace_steps: Number of the initial steps in the Chrome
+                trace. Zero disables the Chrome trace.
+        """
+        Profiler.finish()
+        Profiler.trace_file = open(trace_path, "w", encoding="utf-8")
+        Profiler.chrome_trace_path = chrome_trace_path
+        Profiler.chrome_trace_steps = chrome_trace_steps
+        Profiler._step = 0
+        Profiler._step_times = {}
+        Profiler._period_times = {}
+        Profiler._period_steps = 0
+        Profiler._chrome_events = []
+        Profiler._start_time = time.perf_counter()
+        Profiler.enabled = True
+
+    @staticmethod
+    def finish() -> None:
+        """Stop profiling and write the Chrome trace if requested."""
+        if not Profiler.enabled:
+            return
+
+        Profiler.enabled = False
+        Profiler.trace_file.close()
+        if Profiler.chrome_trace_path and Profiler._chrome_events:
+            with open(Profiler.chrome_trace_path, "w",
+                      encoding="utf-8") as f_trace:
+                json.dump({"traceEvents": Profiler._chrome_events}, f_trace)
+
+    @staticmethod
+    @contextmanager
+    def phase(name: str):
+        """Return a context manager measuring the time spent in a phase."""
+        if not Profiler.enabled:
+            yield
+            return
+
+        stack = getattr(Profiler._local, "stack", None)
+        if stack is None:
+            stack = Profiler._local.stack = []
+
+        # [start wall-clock time, start CPU time, wall and CPU time of
+        # the nested phases]
+        frame = [time.perf_counter(), time.process_time(), 0., 0.]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - frame[0]
+            cpu = time.process_time() - frame[1]
+            stack.pop()
+            if stack:
+                stack[-1][2] += wall
+                stack[-1][3] += cpu
+            Profiler._record(name, frame[0], wall, cpu,
+                             wall - frame[2], cpu - frame[3])
+
+    @staticmethod
+    def wrap(name: str, function: Callable) -> Callable:
+        """Wrap a function so its calls are measured as a phase."""
+        if not Profiler.enabled:
+            return function
+
+        def wrapped(*args, **kwargs):
+            with Profiler.phase(name):
+                return function(*args, **kwargs)
+
+        return wrapped
+
+    @staticmethod
+    def iterate(name: str, iterable: Iterable[T]) -> Iterable[T]:
+        """Iterate over an iterable measuring the retrieval of the items."""
+        iterator = iter(iterable)
+        while True:
+            with Profiler.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    @staticmethod
+    def _record(name: str, start: float, wall: float, cpu: float,
+                own_wall: float, own_cpu: float) -> None:
+        with Profiler._lock:
+            for times in [Profiler._step_times, Profiler._period_times]:
+                phase_times = times.setdefault(name, [0., 0.])
+                phase_times[0] += own_wall
+                phase_times[1] += own_cpu
+
+            if Profiler._step < Profiler.chrome_trace_steps:
+                Profiler._chrome_events.append({
+                    "name": name, "ph": "X", "pid": os.getpid(),
+                    "tid": threading.current_thread().name,
+                    "ts": (start - Profiler._start_time) * 1e6,
+                    "dur": wall * 1e6, "args": {"cpu": cpu}})
+
+    @staticmethod
+    def end_step(step: int) -> None:
+        """Write the times of the phases of the finished step to the trace."""
+        if not Profiler.enabled:
+            return
+
+        with Profiler._lock:
+            step_times = Profiler._step_times
+            Profiler._step_times = {}
+            Profiler._period_steps += 1
+            Profiler._step += 1
+
+        Profiler.trace_file.write(json.dumps({
+            "step": step, "time": time.time(),
+            "phases": {name: {"wall": times[0], "cpu": times[1]}
+                       for name, times in sorted(step_times.items())}}))
+        Profiler.trace_file.write("\n")
+
+    @staticmethod
+    def summary() -> Dict[str, float]:
+        """Average the times of the phases per step since the last call.
+
+        Returns:
+            A dictionary from TensorBoard tags to the average times.
+        """
+        with Profiler._lock:
+            period_times = Profiler._period_times
+            period_steps = max(Profiler._period_steps, 1)
+            Profiler._period_times = {}
+            Profiler._period_steps = 0
+
+        values = {}  # type: Dict[str, float]
+        for name, (wall, cpu) in period_times.items():
+            values["profile/{}/wall".format(name)] = wall / period_steps
+            values["profile/{}/cpu".format(name)] = cpu / period_steps
+
+        return values
+
+
+# pylint: disable=invalid-name
+# we want these helper functions to have this exact name
+phase = Profiler.phase
@@ -0,0 +1,197 @@
+"""Post-training quantization of the model weights to 8-bit integers.
+
+The embedding matrices and the output projections of a trained model are
+stored in a quantized checkpoint as int8 matrices with a float32 scale for
+each word, i.e. for each row of an embedding matrix and for each column of
+an output projection. The remaining variables are copied unchanged.
+
+A model built with the ``quantization_getter`` (the ``quantized`` option of
+the main section in the inference mode) creates the int8 matrices and the
+scales instead of the float variables, so the quantized checkpoint can be
+loaded directly. The int8 matrices stay in the graph; the embeddings
+looked up by ``gather`` are dequantized only for the gathered words.
+"""
+# pylint: disable=unused-import
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+# pylint: enable=unused-import
+
+import os
+import re
+from weakref import WeakKeyDictionary
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.tf_utils import outside_control_flow
+
+QUANTIZED_SUFFIX = "_int8"
+SCALE_SUFFIX = "_scale"
+
+# The last parts of the names of the quantized variables
+EMBEDDING_NAMES = re.compile(r"embedding_matrix_\d+|word_embeddings")
+PROJECTION_NAMES = re.compile(r"state_to_word_W")
+
+_INT8_MAX = 127
+
+# The int8 matrices, the scales and the word axes of the dequantized
+# matrices returned by the quantization getter
+_QUANTIZED_MATRICES = WeakKeyDictionary()  # type: WeakKeyDictionary
+
+
+def word_axis(name: str, shape: Sequence[int],
+              dtype: tf.DType) -> Optional[int]:
+    """Decide whether a variable is quantized.
+
+    The floating point embedding matrices and output projections are
+    quantized. Both the quantization and the model building use this
+    function, so the variables of the model match the checkpoint.
+
+    Returns:
+        The axis of the words (0 for the embeddings, 1 for the output
+        projections) along which the variable is scaled, or ``None`` if the
+        variable is not quantized.
+    """
+    dtype = tf.as_dtype(dtype).base_dtype
+    if not dtype.is_floating or len(shape) != 2:
+        return None
+
+    base_name = name.rpartition("/")[2]
+    if EMBEDDING_NAMES.fullmatch(base_name):
+        return 0
+    if PROJECTION_NAMES.fullmatch(base_name):
+        return 1
+    return None
+
+
+def quantize(matrix: np.ndarray,
+             axis: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize a matrix symmetrically with a scale for each word.
+
+    Arguments:
+        matrix: The matrix to quantize.
+        axis: The axis of the words, 0 for rows and 1 for columns.
+
+    Returns:
+        A tuple of the int8 matrix and the float32 scales of the words.
+    """
+    max_values = np.max(np.abs(matrix), axis=1 - axis)
+    scales = np.where(max_values > 0, max_values / _INT8_MAX, 1.)
+    scales = scales.astype(np.float32)
+
+    quantized = np.clip(np.round(matrix / np.expand_dims(scales, 1 - axis)),
+                        -_INT8_MAX, _INT8_MAX)
+    return quantized.astype(np.int8), scales
+
+
+def dequantize(quantized: np.ndarray, scales: np.ndarray,
+               axis: int = 0) -> np.ndarray:
+    return quantized.astype(np.float32) * np.expand_dims(scales, 1 - axis)
+
+
+def quantization_getter(getter: Callable, name: str, *args,
+                        **kwargs) -> tf.Tensor:
+    """Replace the quantized variables with their dequantized values.
+
+    A custom getter for ``tf.variable_scope``. For a variable for which
+    ``word_axis`` gives an axis, it creates a non-trainable int8 variable
+    with the ``QUANTIZED_SUFFIX`` and the scales of its words with the
+    ``SCALE_SUFFIX``. It returns the dequantized matrix, which is computed
+    only if the whole matrix is used (e.g. in a projection); ``gather``
+    dequantizes only the gathered words.
+    """
+    shape = kwargs.get("shape")
+    dtype = kwargs.get("dtype")
+    if shape is None or dtype is None:
+        return getter(name, *args, **kwargs)
+
+    shape = tf.TensorShape(shape).as_list()
+    axis = word_axis(name, shape, dtype)
+    if axis is None:
+        return getter(name, *args, **kwargs)
+
+    quantized_kwargs = dict(kwargs, shape=shape, dtype=tf.int8,
+                            initializer=tf.zeros_initializer(),
+                            regularizer=None, trainable=False)
+    quantized = getter(name + QUANTIZED_SUFFIX, *args, **quantized_kwargs)
+
+    scale_kwargs = dict(kwargs, shape=shape[axis:axis + 1],
+                        initializer=tf.ones_initializer(),
+                        regularizer=None, trainable=False)
+    scales = getter(name + SCALE_SUFFIX, *args, **scale_kwargs)
+
+    with outside_control_flow(), tf.name_scope("dequantize"):
+        matrix = (tf.cast(quantized, scales.dtype)
+                  * tf.expand_dims(scales, 1 - axis))
+    _QUANTIZED_MATRICES[matrix] = (quantized, scales, axis)
+    return matrix
+
+
+def gather(params: tf.Tensor, indices: tf.Tensor,
+           axis: int = 0) -> tf.Tensor:
+    """Gather the words of an embedding matrix or an output projection.
+
+    Works as ``tf.gather`` (or ``tf.nn.embedding_lookup`` with a single
+    matrix), but if ``params`` is a matrix returned by the quantization
+    getter and the words are on the gathered axis, only the gathered words
+    are dequantized.
+    """
+    if params not in _QUANTIZED_MATRICES:
+        return tf.gather(params, indices, axis=axis)
+
+    quantized, scales, quantized_axis = _QUANTIZED_MATRICES[params]
+    if axis != quantized_axis:
+        return tf.gather(params, indices, axis=axis)
+
+    gathered_scales = tf.gather(scales, indices)
+    if axis == 0:
+        gathered_scales = tf.expand_dims(gathered_scales, -1)
+    return (tf.cast(tf.gather(quantized, indices, axis=axis), scales.dtype)
+            * gathered_scales)
+
+
+def quantize_checkpoint(checkpoint: str, output_path: str) -> List[str]:
+    """Write a quantized copy of a checkpoint.
+
+    Arguments:
+        checkpoint: The checkpoint of a trained model.
+        output_path: The prefix of the quantized checkpoint.
+
+    Returns:
+        The names of the quantized variables.
+    """
+    if not os.path.exists("{}.index".format(checkpoint)):
+        raise ValueError("Checkpoint '{}' does not exist.".format(checkpoint))
+
+    reader = tf.contrib.framework.load_checkpoint(checkpoint)
+    var_values = {}  # type: Dict[str, np.ndarray]
+    quantized_names = []  # type: List[str]
+    for name, shape in tf.contrib.framework.list_variables(checkpoint):
+        value = reader.get_tensor(name)
+        axis = word_axis(name, shape, value.dtype)
+        if axis is not None:
+            quantized, scales = quantize(value, axis)
+            var_values[name + QUANTIZED_SUFFIX] = quantized
+            var_values[name + SCALE_SUFFIX] = scales
+            quantized_names.append(name)
+        else:
+            var_values[name] = value
+
+    # Build a graph only with the variables and set them to the values.
+    with tf.Graph().as_default():
+        tf_vars = [
+            tf.get_variable(name, shape=value.shape,
+                            dtype=tf.as_dtype(value.dtype))
+            for name, value in var_values.items()]
+        placeholders = [tf.placeholder(v.dtype.base_dtype, shape=v.shape)
+                        for v in tf_vars]
+        assign_ops = [tf.assign(v, p) for v, p in zip(tf_vars, placeholders)]
+        saver = tf.train.Saver()
+
+        with tf.Session() as sess:
+            for placeholder, assign_op, value in zip(
+                    placeholders, assign_ops, var_values.values()):
+                sess.run(assign_op, {placeholder: value})
+            saver.save(sess, os.path.abspath(output_path),
+                       write_meta_graph=False)
+
+    return quantized_names
@@ -9,39 +9,52 @@ import numpy as np
 
 from scipy.io import wavfile
 
+from neuralmonkey.readers.helpers import parallel_map
+
 
 # pylint: disable=invalid-name
 Audio = NamedTuple("Audio", [("rate", int), ("data", np.ndarray)])
 
 
 def audio_reader(prefix: str = "",
-                 audio_format: str = "wav") -> Callable:
+                 audio_format: str = "wav",
+                 num_workers: int = 1) -> Callable:
     """Get a reader of audio files loading them from a list of pahts.
 
     Args:
         prefix: Prefix of the paths to the audio files.
+        audio_format: Format of the audio files (wav or sph).
+        num_workers: Number of files loaded concurrently. This is mostly
+            useful for the sph format where every file is converted by a
+            separate sph2pipe process.
 
     Returns:
         The reader function that takes a list of audio file paths (relative to
         provided prefix) and returns a list of numpy arrays.
     """
+    load_file = get_audio_loader(audio_format)
+
+    def load(list_files: List[str]) -> Iterable[Audio]:
+        yield from parallel_map(
+            load_file, audio_paths(list_files, prefix), num_workers)
+
+    return load
 
-    if audio_format == "wav":
-        load_file = _load_wav
-    elif audio_format == "sph":
-        load_file = _load_sph
-    else:
+
+def get_audio_loader(audio_format: str) -> Callable[[str], Audio]:
+    """Get a function loading a single audio file of the given format."""
+    if audio_format not in AUDIO_LOADERS:
         raise ValueError(
             "Unsupported audio format: {}".format(audio_format))
+    return AUDIO_LOADERS[audio_format]
 
-    def load(list_files: List[str]) -> Iterable[Audio]:
-        for list_file in list_files:
-            with open(list_file) as f_list:
-                for audio_file in f_list:
-                    path = os.path.join(prefix, audio_file.rstrip())
-                    yield load_file(path)
 
-    return load
+def audio_paths(list_files: List[str], prefix: str = "") -> Iterable[str]:
+    """Yield the paths of the audio files listed in the given files."""
+    for list_file in list_files:
+        with open(list_file) as f_list:
+            for audio_file in f_list:
+                yield os.path.join(prefix, audio_file.rstrip())
 
 
 def _load_wav(path: str) -> Audio:
@@ -62,3 +75,7 @@ def _load_sph(path: str) -> Audio:
                            "processing {}".format(error_code, path))
 
     return Audio(*wavfile.read(data))
+
+
+AUDIO_LOADERS = {"wav": _load_wav,
+                 "sph": _load_sph}
@@ -0,0 +1,42 @@
+"""Helper functions shared by the readers."""
+from typing import Callable, Iterable, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+import collections
+
+# pylint: disable=invalid-name
+T = TypeVar("T")
+U = TypeVar("U")
+# pylint: enable=invalid-name
+
+
+def parallel_map(function: Callable[[T], U], items: Iterable[T],
+                 num_workers: int) -> Iterable[U]:
+    """Apply the function on the items using a pool of threads.
+
+    The results are yielded in the original order. At most twice as many
+    items as there are workers are being processed or waiting to be consumed
+    at the same time. This is useful for loading work which releases the GIL,
+    such as decoding images with PIL or waiting for external processes.
+
+    Arguments:
+        function: The function to apply.
+        items: The items to process.
+        num_workers: Number of threads. With one worker, the function is
+            applied in the calling thread.
+
+    Returns:
+        Generator yielding the results of the function.
+    """
+    if num_workers <= 1:
+        yield from map(function, items)
+        return
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        pending = collections.deque()  # type: collections.deque
+        for item in items:
+            if len(pending) >= 2 * num_workers:
+                yield pending.popleft().result()
+            pending.append(executor.submit(function, item))
+
+        while pending:
+            yield pending.popleft().result()
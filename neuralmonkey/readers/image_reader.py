@@ -1,8 +1,13 @@
-from typing import Callable, Iterable, List
+from typing import Any, Callable, Iterable, List, Tuple
+import hashlib
 import os
 from typeguard import check_argument_types
 import numpy as np
 from PIL import Image, ImageFile
+
+from neuralmonkey.logging import log
+from neuralmonkey.readers.helpers import parallel_map
+
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 
@@ -12,7 +17,9 @@ def image_reader(pad_w: int,
                  rescale_w: bool = False,
                  rescale_h: bool = False,
                  keep_aspect_ratio: bool = False,
-                 mode: str = "RGB") -> Callable:
+                 mode: str = "RGB",
+                 num_workers: int = 1,
+                 cache_dir: str = None) -> Callable:
     """Get a reader of images loading them from a list of pahts.
 
     Args:
@@ -27,6 +34,9 @@ def image_reader(pad_w: int,
             rescaling. Can only be used if both width and height are rescaled.
         mode: Scipy image loading mode, see scipy documentation for more
             details.
+        num_workers: Number of threads used for decoding the images.
+        cache_dir: Optional directory where the preprocessed images are stored
+            as memory-mapped arrays, so they are decoded only once.
 
     Returns:
         The reader function that takes a list of image paths (relative to
@@ -43,39 +53,45 @@ def image_reader(pad_w: int,
             "While rescaling only one side, aspect ratio must be kept, "
             "was set to false.")
 
+    empty_image = np.array(Image.new(mode, (1, 1)))
+    channels = empty_image.shape[2] if len(empty_image.shape) == 3 else 1
+
+    def load_image(path: str) -> np.ndarray:
+        try:
+            image = Image.open(path).convert(mode)
+        except IOError:
+            image = Image.new(mode, (pad_w, pad_h))
+
+        image = _rescale_or_crop(image, pad_w, pad_h,
+                                 rescale_w, rescale_h,
+                                 keep_aspect_ratio)
+        image_np = np.array(image)
+
+        if len(image_np.shape) == 2:
+            image_np = np.expand_dims(image_np, 2)
+        elif len(image_np.shape) != 3:
+            raise ValueError(
+                ("Image should have either 2 (black and white) "
+                 "or three dimensions (color channels), has {} "
+                 "dimension.").format(len(image_np.shape)))
+
+        return _pad(image_np, pad_w, pad_h, channels)
+
     def load(list_files: List[str]) -> Iterable[np.ndarray]:
-        for list_file in list_files:
-            with open(list_file) as f_list:
-                for i, image_file in enumerate(f_list):
-                    path = os.path.join(prefix, image_file.rstrip())
-
-                    if not os.path.exists(path):
-                        raise Exception(
-                            ("Image file '{}' no."
-                             "{}  does not exist.").format(path, i + 1))
-
-                    try:
-                        image = Image.open(path).convert(mode)
-                    except IOError:
-                        image = Image.new(mode, (pad_w, pad_h))
-
-                    image = _rescale_or_crop(image, pad_w, pad_h,
-                                             rescale_w, rescale_h,
-                                             keep_aspect_ratio)
-                    image_np = np.array(image)
-
-                    if len(image_np.shape) == 2:
-                        channels = 1
-                        image_np = np.expand_dims(image_np, 2)
-                    elif len(image_np.shape) == 3:
-                        channels = image_np.shape[2]
-                    else:
-                        raise ValueError(
-                            ("Image should have either 2 (black and white) "
-                             "or three dimensions (color channels), has {} "
-                             "dimension.").format(len(image_np.shape)))
-
-                    yield _pad(image_np, pad_w, pad_h, channels)
+        paths = _image_paths(list_files, prefix)
+
+        if cache_dir is None:
+            images = parallel_map(load_image, paths, num_workers)
+        else:
+            key = _cache_key(
+                paths, "image_reader", pad_w, pad_h, rescale_w, rescale_h,
+                keep_aspect_ratio, mode)
+            images = _cached_map(load_image, paths, num_workers,
+                                 (pad_h, pad_w, channels), empty_image.dtype,
+                                 cache_dir, key)
+
+        for image in images:
+            yield image.astype(np.float32)
 
     return load
 
@@ -88,7 +104,9 @@ def imagenet_reader(prefix: str,
                     target_width: int = 227,
                     target_height: int = 227,
                     vgg_normalization: bool = False,
-                    zero_one_normalization: bool = False) -> Callable:
+                    zero_one_normalization: bool = False,
+                    num_workers: int = 1,
+                    cache_dir: str = None) -> Callable:
     """Load and prepare image the same way as Caffe scripts.
 
     The image preprocessing first rescales the image such that smaller edge has
@@ -103,6 +121,10 @@ def imagenet_reader(prefix: str,
             from all pixels. This is used for VGG nets.
         zero_one_normalization: If true, all pixel values are divided by 255
             such that they are in [0, 1] range. This is used for ResNet.
+        num_workers: Number of threads used for decoding the images.
+        cache_dir: Optional directory where the cropped images are stored
+            as memory-mapped arrays, so they are decoded only once. The
+            normalization is applied after reading from the cache.
 
     Yield:
         An numpy array with the resized and cropped image for every image file
@@ -110,28 +132,37 @@ def imagenet_reader(prefix: str,
     """
     check_argument_types()
 
-    def load(list_files: List[str]) -> Iterable[np.ndarray]:
-        for list_file in list_files:
-            with open(list_file) as f_list:
-                for i, image_file in enumerate(f_list):
-                    path = os.path.join(prefix, image_file.rstrip())
-
-                    if not os.path.exists(path):
-                        raise Exception(
-                            "Image file '{}' no. {} does not exist."
-                            .format(path, i + 1))
-
-                    res = single_image_for_imagenet(
-                        path, target_height, target_width,
-                        vgg_normalization, zero_one_normalization)
+    def load_image(path: str) -> np.ndarray:
+        return _crop_for_imagenet(path, target_height, target_width)
 
-                    yield res
+    def load(list_files: List[str]) -> Iterable[np.ndarray]:
+        paths = _image_paths(list_files, prefix)
+
+        if cache_dir is None:
+            images = parallel_map(load_image, paths, num_workers)
+        else:
+            key = _cache_key(
+                paths, "imagenet_reader", target_width, target_height)
+            images = _cached_map(load_image, paths, num_workers,
+                                 (target_height, target_width, 3),
+                                 np.uint8, cache_dir, key)
+
+        for image in images:
+            yield _normalize_for_imagenet(
+                image, vgg_normalization, zero_one_normalization)
     return load
 
 
 def single_image_for_imagenet(
         path: str, target_height: int, target_width: int,
         vgg_normalization: bool, zero_one_normalization: bool) -> np.ndarray:
+    return _normalize_for_imagenet(
+        _crop_for_imagenet(path, target_height, target_width),
+        vgg_normalization, zero_one_normalization)
+
+
+def _crop_for_imagenet(path: str, target_height: int,
+                       target_width: int) -> np.ndarray:
     image = Image.open(path).convert("RGB")
 
     width, height = image.size
@@ -154,6 +185,13 @@ def single_image_for_imagenet(
                target_width, target_height, 3)
     assert res.shape == (target_width, target_height, 3)
 
+    return res
+
+
+def _normalize_for_imagenet(image: np.ndarray, vgg_normalization: bool,
+                            zero_one_normalization: bool) -> np.ndarray:
+    res = image.astype(np.float32)
+
     if vgg_normalization:
         res -= VGG_RGB_MEANS
     if zero_one_normalization:
@@ -162,6 +200,76 @@ def single_image_for_imagenet(
     return res
 
 
+def _image_paths(list_files: List[str], prefix: str) -> List[str]:
+    """Read the image lists and check that all the images exist."""
+    paths = []
+    for list_file in list_files:
+        with open(list_file) as f_list:
+            for i, image_file in enumerate(f_list):
+                path = os.path.join(prefix, image_file.rstrip())
+
+                if not os.path.exists(path):
+                    raise Exception(
+                        "Image file '{}' no. {} does not exist."
+                        .format(path, i + 1))
+
+                paths.append(path)
+    return paths
+
+
+def _cache_key(paths: List[str], *params: Any) -> str:
+    """Hash the preprocessing parameters and the image files.
+
+    The modification times and the sizes of the files are included, so the
+    images changed on disk get a new cache.
+    """
+    hasher = hashlib.sha1()
+    hasher.update(repr(params).encode("utf-8"))
+    for path in paths:
+        stat = os.stat(path)
+        hasher.update(os.path.abspath(path).encode("utf-8"))
+        hasher.update("\0{}\0{}\0".format(
+            stat.st_mtime_ns, stat.st_size).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def _cached_map(function: Callable[[str], np.ndarray], paths: List[str],
+                num_workers: int, shape: Tuple[int, int, int],
+                dtype: Any, cache_dir: str, key: str) -> Iterable[np.ndarray]:
+    """Load the preprocessed images from a cache or fill the cache.
+
+    The images are stored as a single tensor file which is
+    memory-mapped when read. The file is written under a temporary name and
+    renamed only after all images have been processed, so an interrupted
+    run never leaves an incomplete cache behind.
+    """
+    cache_file = os.path.join(cache_dir, "{}.npy".format(key))
+
+    if os.path.exists(cache_file):
+        yield from np.load(cache_file, mmap_mode="r")
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+    cache = np.lib.format.open_memmap(
+        tmp_file, mode="w+", dtype=dtype, shape=(len(paths),) + shape)
+
+    try:
+        images = parallel_map(function, paths, num_workers)
+        for i, image in enumerate(images):
+            cache[i] = image
+            yield image
+
+        cache.flush()
+        del cache
+        os.replace(tmp_file, cache_file)
+        log("Cached {} preprocessed images in {}".format(
+            len(paths), cache_file))
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
 def _rescale_or_crop(image: Image.Image, pad_w: int, pad_h: int,
                      rescale_w: bool, rescale_h: bool,
                      keep_aspect_ratio: bool) -> Image.Image:
@@ -205,7 +313,7 @@ def _pad(image: np.ndarray, pad_w: int, pad_h: int,
          channels: int) -> np.ndarray:
     img_h, img_w = image.shape[:2]
 
-    image_padded = np.zeros((pad_h, pad_w, channels))
+    image_padded = np.zeros((pad_h, pad_w, channels), dtype=image.dtype)
     image_padded[:img_h, :img_w, :] = image
 
     return image_padded
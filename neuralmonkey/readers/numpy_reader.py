@@ -1,4 +1,4 @@
-from typing import List, Callable, Iterable
+from typing import Callable, Iterable, List, Optional, Tuple, Type
 import os
 
 from typeguard import check_argument_types
@@ -40,3 +40,92 @@ def from_file_list(prefix: str,
 
 # pylint: disable=invalid-name
 numpy_file_list_reader = from_file_list(prefix="")
+
+
+RAGGED_INDEX_SUFFIX = ".index.npz"
+
+
+class RaggedArrayWriter(object):
+    """Writer of a store of arrays with variable first dimension.
+
+    The store consists of two files. The data file, which is located at the
+    given path, contains the flat concatenation of all arrays in the raw
+    binary form. The index file (with the ``.index.npz`` suffix) contains the
+    offsets of the arrays in the data file, their dtype, and the shape of the
+    remaining dimensions. The store can be read with the
+    :py:func:`ragged_array_reader` without copying the data into memory.
+
+    Both files are written under temporary names and renamed when the writer
+    is closed, so an interrupted writing never leaves an incomplete store.
+    """
+
+    def __init__(self, path: str, dtype: Type = np.float32) -> None:
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        self._data_file = open(self._tmp_path, "wb")
+        self._offsets = [0]
+        self._shape = None  # type: Optional[Tuple[int, ...]]
+
+    def write(self, array: np.ndarray) -> None:
+        """Append an array to the store."""
+        if self._shape is None:
+            self._shape = array.shape[1:]
+        elif array.shape[1:] != self._shape:
+            raise ValueError(
+                "Array of shape {} cannot be stored with arrays of shape "
+                "(?, {}).".format(
+                    array.shape, ", ".join(str(d) for d in self._shape)))
+
+        self._data_file.write(
+            np.ascontiguousarray(array, dtype=self.dtype).tobytes())
+        self._offsets.append(self._offsets[-1] + array.shape[0])
+
+    def close(self) -> None:
+        """Write the index and move the files to their final location."""
+        self._data_file.close()
+        tmp_index = "{}.{}.tmp.npz".format(self.path, os.getpid())
+        np.savez(tmp_index,
+                 offsets=np.array(self._offsets, dtype=np.int64),
+                 shape=np.array(self._shape or (), dtype=np.int64),
+                 dtype=np.array(self.dtype.str))
+
+        os.replace(self._tmp_path, self.path)
+        os.replace(tmp_index, self.path + RAGGED_INDEX_SUFFIX)
+
+    def abort(self) -> None:
+        """Close the writer and remove the incomplete store."""
+        self._data_file.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self) -> "RaggedArrayWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def ragged_array_reader(files: List[str]) -> Iterable[np.ndarray]:
+    """Read arrays from stores written by :py:class:`RaggedArrayWriter`.
+
+    The data files are memory-mapped and the yielded arrays are read-only
+    views into them, i.e., nothing is read from the disk until the arrays
+    are used.
+    """
+    for path in files:
+        with np.load(path + RAGGED_INDEX_SUFFIX) as index:
+            offsets = index["offsets"]
+            shape = tuple(int(d) for d in index["shape"])
+            dtype = np.dtype(str(index["dtype"]))
+
+        if offsets[-1] > 0:
+            data = np.memmap(path, dtype=dtype, mode="r",
+                             shape=(int(offsets[-1]),) + shape)
+        else:
+            data = np.zeros((0,) + shape, dtype=dtype)
+
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield data[start:end]
@@ -1,7 +1,6 @@
-from typing import List, Iterable, Callable
+from typing import List, Iterable, Callable, Optional
 import gzip
 import csv
-import io
 import sys
 import unicodedata
 
@@ -88,6 +87,64 @@ def t2t_tokenized_text_reader(encoding: str = "utf-8") -> PlainTextFileReader:
     return reader
 
 
+def _column_separated_rows(
+        files: List[str], delimiter: str, quotechar: Optional[str],
+        encoding: str) -> Iterable[List[str]]:
+    """Stream the files through a single parser and yield lists of fields.
+
+    When ``quotechar`` is None, no CSV quoting rules apply and the lines are
+    simply split on the delimiter, which is much faster than going through the
+    ``csv`` module. Otherwise, one ``csv.reader`` is used for all the lines.
+    """
+    text_reader = string_reader(encoding)
+    lines = (line.strip() for line in text_reader(files))
+
+    if quotechar is None:
+        for line in lines:
+            yield line.split(delimiter) if line else []
+    else:
+        yield from csv.reader(lines, delimiter=delimiter, quotechar=quotechar,
+                              skipinitialspace=True)
+
+
+def column_separated_table_reader(
+        delimiter: str = "\t", quotechar: str = None,
+        encoding: str = "utf-8") -> Callable[[List[str]],
+                                             Iterable[List[List[str]]]]:
+    """Get reader for all columns of a delimiter-separated text.
+
+    The reader yields a list of tokenized columns for every line. It can be
+    used to load multiple series from a single pass over a file, e.g., by
+    reading a table series and selecting its columns using the
+    :py:func:`neuralmonkey.processors.helpers.column_selector` preprocessors.
+
+    Inconsistent numbers of columns are not reported line by line, a single
+    summary warning is logged after the whole input has been read.
+    """
+    def reader(files: List[str]) -> Iterable[List[List[str]]]:
+        column_count = None  # type: Optional[int]
+        mismatches = 0
+        first_mismatch = 0
+
+        rows = _column_separated_rows(files, delimiter, quotechar, encoding)
+        for i, row in enumerate(rows):
+            if column_count is None:
+                column_count = len(row)
+            elif len(row) != column_count:
+                if mismatches == 0:
+                    first_mismatch = i + 1
+                mismatches += 1
+
+            yield [field.split() for field in row]
+
+        if mismatches:
+            warn("A mismatch in number of columns on {} lines (first on line "
+                 "{}). Expected {} columns.".format(
+                     mismatches, first_mismatch, column_count))
+
+    return reader
+
+
 def column_separated_reader(
         column: int, delimiter: str = "\t", quotechar: str = None,
         encoding: str = "utf-8") -> PlainTextFileReader:
@@ -97,30 +154,30 @@ def column_separated_reader(
         column: number of column to be returned. It starts with 1 for the first
     """
     def reader(files: List[str]) -> Iterable[List[str]]:
-        column_count = None
-        text_reader = string_reader(encoding)
-        for line in text_reader(files):
-            io_line = io.StringIO(line.strip())
-            if quotechar is not None:
-                parsed_csv = list(csv.reader(io_line, delimiter=delimiter,
-                                             quotechar=quotechar,
-                                             skipinitialspace=True))
-            else:
-                parsed_csv = list(csv.reader(io_line, delimiter=delimiter,
-                                             quoting=csv.QUOTE_NONE,
-                                             skipinitialspace=True))
-            columns = len(parsed_csv[0])
+        column_count = None  # type: Optional[int]
+        mismatches = 0
+        missing = 0
+
+        rows = _column_separated_rows(files, delimiter, quotechar, encoding)
+        for row in rows:
+            columns = len(row)
             if column_count is None:
                 column_count = columns
             elif column_count != columns:
-                warn("A mismatch in number of columns. Expected {} got {}"
-                     .format(column_count, columns))
+                mismatches += 1
+
             if columns < column:
-                warn("There is a missing column number {} in the dataset."
-                     .format(column))
+                missing += 1
                 yield []
             else:
-                yield parsed_csv[0][column - 1].split()
+                yield row[column - 1].split()
+
+        if mismatches:
+            warn("A mismatch in number of columns on {} lines. Expected {}."
+                 .format(mismatches, column_count))
+        if missing:
+            warn("The column number {} is missing on {} lines in the dataset."
+                 .format(column, missing))
 
     return reader
 
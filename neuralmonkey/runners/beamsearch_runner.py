@@ -32,6 +32,10 @@ class BeamSearchExecutable(Executable):
         # Length of the currently sequence decoded so far
         self._step = 0
 
+        # Values of the encoder states in each session, fetched in the first
+        # step of ensembling and fed to the following steps
+        self._encoder_feeds = None  # type: Optional[List[FeedDict]]
+
         self._next_feed = [{} for _ in range(self._num_sessions)] \
             # type: List[FeedDict]
 
@@ -46,12 +50,20 @@ class BeamSearchExecutable(Executable):
         self.result = None  # type: Optional[ExecutionResult]
 
     def next_to_execute(self) -> NextExecute:
-        return (self._all_coders,
-                {"bs_outputs": self._decoder.outputs},
-                self._next_feed)
+        fetches = {"bs_outputs": self._decoder.outputs}
+        if self._num_sessions > 1 and self._encoder_feeds is None:
+            fetches["encoder_states"] = self._decoder.encoder_states
+
+        return self._all_coders, fetches, self._next_feed
 
     # pylint: disable=too-many-locals
     def collect_results(self, results: List[Dict]) -> None:
+        if "encoder_states" in results[0]:
+            self._encoder_feeds = [
+                dict(zip(self._decoder.encoder_states,
+                         res["encoder_states"]))
+                for res in results]
+
         # Recompute logits
         # Only necessary when ensembling models
         prev_logprobs = [res["bs_outputs"].last_search_state.prev_logprobs
@@ -106,7 +118,7 @@ class BeamSearchExecutable(Executable):
 
         # Prepare the next feed_dict (required for ensembles)
         self._next_feed = []
-        for result in results:
+        for i, result in enumerate(results):
             bs_outputs = result["bs_outputs"]
 
             input_beam_size = len(bs_outputs.last_search_state.prev_logprobs)
@@ -137,6 +149,10 @@ class BeamSearchExecutable(Executable):
                 else:
                     fd.update({tensor: value})
 
+            # the encoders are not run again
+            if self._encoder_feeds is not None:
+                fd.update(self._encoder_feeds[i])
+
             self._next_feed.append(fd)
 
         if self._step == 0:
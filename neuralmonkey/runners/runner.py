@@ -38,17 +38,23 @@ class GreedyRunExecutable(Executable):
     def collect_results(self, results: List[Dict]) -> None:
         train_loss = 0.
         runtime_loss = 0.
-        summed_logprobs = [-np.inf for _ in range(
-            results[0]["decoded_logprobs"].shape[0])]
-
         for sess_result in results:
             train_loss += sess_result["train_xent"]
             runtime_loss += sess_result["runtime_xent"]
 
-            for i, logprob in enumerate(sess_result["decoded_logprobs"]):
-                summed_logprobs[i] = np.logaddexp(summed_logprobs[i], logprob)
+        if "decoded" in results[0]:
+            argmaxes = list(results[0]["decoded"])
+        else:
+            # ensemble of the sessions
+            summed_logprobs = [-np.inf for _ in range(
+                results[0]["decoded_logprobs"].shape[0])]
+
+            for sess_result in results:
+                for i, logprob in enumerate(sess_result["decoded_logprobs"]):
+                    summed_logprobs[i] = np.logaddexp(
+                        summed_logprobs[i], logprob)
 
-        argmaxes = [np.argmax(l, axis=1) for l in summed_logprobs]
+            argmaxes = [np.argmax(l, axis=1) for l in summed_logprobs]
 
         decoded_tokens = self._vocabulary.vectors_to_sentences(argmaxes)
 
@@ -87,10 +93,16 @@ class GreedyRunner(BaseRunner[SupportedDecoder]):
                        compute_losses: bool,
                        summaries: bool,
                        num_sessions: int) -> GreedyRunExecutable:
-        fetches = {"decoded_logprobs": self._decoder.runtime_logprobs,
-                   "train_xent": tf.zeros([]),
+        fetches = {"train_xent": tf.zeros([]),
                    "runtime_xent": tf.zeros([])}
 
+        # The full distributions are fetched only to ensemble the sessions,
+        # a single session decodes the symbols in the graph.
+        if num_sessions > 1:
+            fetches["decoded_logprobs"] = self._decoder.runtime_logprobs
+        else:
+            fetches["decoded"] = self._decoder.decoded
+
         if compute_losses:
             fetches["train_xent"] = self._decoder.train_loss
             fetches["runtime_xent"] = self._decoder.runtime_loss
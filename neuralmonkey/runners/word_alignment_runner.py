@@ -54,7 +54,8 @@ class WordAlignmentRunner(BaseRunner[BaseAttention]):
                        num_sessions: int = 1) -> WordAlignmentRunnerExecutable:
         if self._key not in self._decoder.histories:
             raise KeyError("Attention has no recorded histories under "
-                           "key '{}'".format(self._key))
+                           "key '{}', check the 'attention_histories' option "
+                           "of the main section".format(self._key))
 
         att_histories = self._decoder.histories[self._key]
         alignment = tf.transpose(att_histories, perm=[1, 2, 0])
@@ -12,12 +12,12 @@ from flask import Flask, request, Response, render_template
 import numpy as np
 
 from neuralmonkey.dataset import Dataset
-from neuralmonkey.experiment import Experiment
 
 
 APP = Flask(__name__)
 APP.config.from_object(__name__)
 APP.config["experiment"] = None
+APP.config["frozen_model"] = None
 
 
 def root_dir():  # pragma: no cover
@@ -30,6 +30,9 @@ def get_file(filename):  # pragma: no cover
 
 
 def run(data):  # pragma: no cover
+    if APP.config["frozen_model"] is not None:
+        return APP.config["frozen_model"].run(data)
+
     exp = APP.config["experiment"]
     dataset = Dataset("request", data, {})
 
@@ -94,12 +97,22 @@ def main() -> None:
         description="Runs Neural Monkey as a web server.")
     parser.add_argument("--port", type=int, default=5000)
     parser.add_argument("--host", type=str, default="127.0.0.1")
-    parser.add_argument("--configuration", type=str, required=True)
+    model_group = parser.add_mutually_exclusive_group(required=True)
+    model_group.add_argument("--configuration", type=str)
+    model_group.add_argument("--frozen-model", type=str,
+                             help="directory with a model exported by "
+                             "neuralmonkey-export")
     args = parser.parse_args()
 
     print("")
 
-    exp = Experiment(config_path=args.configuration)
-    exp.build_model()
-    APP.config["experiment"] = exp
+    # the configuration machinery is not needed for the exported models
+    if args.frozen_model is not None:
+        from neuralmonkey.frozen_model import FrozenModel
+        APP.config["frozen_model"] = FrozenModel(args.frozen_model)
+    else:
+        from neuralmonkey.experiment import Experiment
+        exp = Experiment(config_path=args.configuration)
+        exp.build_model()
+        APP.config["experiment"] = exp
     APP.run(port=args.port, host=args.host)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3.5
+"""Unit tests for the feed-forward and scaled dot-product attentions."""
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.attention.feed_forward import Attention, masked_softmax
+from neuralmonkey.attention.scaled_dot_product import attention
+from neuralmonkey.model.stateful import TemporalStateful
+
+# a bucketed batch with the last position padded in all the sequences,
+# a mask that is not a prefix and a sequence with all positions masked out
+STATES = np.random.RandomState(0).normal(size=[4, 6, 5])
+MASK = np.array([[1., 1., 1., 1., 1., 0.],
+                 [1., 1., 0., 0., 0., 0.],
+                 [1., 0., 1., 1., 0., 0.],
+                 [0., 0., 0., 0., 0., 0.]])
+
+
+class ConstantEncoder(TemporalStateful):
+
+    @property
+    def temporal_states(self) -> tf.Tensor:
+        return tf.constant(STATES, tf.float32)
+
+    @property
+    def temporal_mask(self) -> tf.Tensor:
+        return tf.constant(MASK, tf.float32)
+
+
+def softmax(energies):
+    exp = np.exp(energies - energies.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class TestFeedForwardAttention(unittest.TestCase):
+
+    def test_masked_softmax(self):
+        energies = np.random.RandomState(1).normal(size=MASK.shape)
+        with tf.Session(graph=tf.Graph()) as sess:
+            weights, unmasked = sess.run([
+                masked_softmax(tf.constant(energies), tf.constant(MASK)),
+                masked_softmax(tf.constant(energies), None)])
+
+        self.assertTrue(np.allclose(unmasked, softmax(energies)))
+        self.assertTrue(np.allclose(weights[MASK == 0], 0.))
+        self.assertTrue(np.allclose(weights[:3].sum(axis=1), 1.))
+        self.assertTrue(np.allclose(weights[3], 0.))
+
+    def test_same_as_renormalized(self):
+        with tf.Graph().as_default():
+            tf.set_random_seed(1234)
+            att = Attention("attention", ConstantEncoder())
+            query = tf.constant(
+                np.random.RandomState(1).normal(size=[4, 3]), tf.float32)
+            context, loop_state = att.attention(
+                query, None, None, att.initial_loop_state(), 0)
+            history = loop_state.weights.stack()[0]
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                (num_keys, context_value, history_value, query_matrix,
+                 query_bias, key_matrix, vector, bias) = sess.run([
+                     att.num_keys, context, history,
+                     att.query_projection_matrix, att.projection_bias_vector,
+                     att.key_projection_matrix, att.similarity_bias_vector,
+                     att.bias_term])
+
+        # the weights computed on all the positions and renormalized after
+        # the softmax, as before the keys were cropped
+        hidden = np.tensordot(STATES, key_matrix, axes=1)
+        projected_query = np.matmul(
+            np.random.RandomState(1).normal(size=[4, 3]),
+            query_matrix) + query_bias
+        energies = np.tensordot(
+            np.tanh(hidden + projected_query[:, None]), vector,
+            axes=1) + bias
+        weights = softmax(energies) * MASK
+        weights /= weights.sum(axis=1, keepdims=True) + 1e-8
+
+        self.assertEqual(num_keys, 5)
+        self.assertEqual(history_value.shape, MASK.shape)
+        self.assertTrue(np.allclose(history_value, weights, atol=1e-6))
+        self.assertTrue(np.allclose(
+            context_value, np.sum(weights[:, :, None] * STATES, axis=1),
+            atol=1e-5))
+
+
+class TestChunkedAttention(unittest.TestCase):
+
+    def _contexts(self, inputs, masked, chunk_size, train_mode=None):
+        queries, keys = inputs
+        mask = tf.constant([[1.] * 7, [1.] * 4 + [0.] * 3])
+        if train_mode is not None:
+            train_mode = tf.constant(train_mode)
+
+        with tf.variable_scope("attention", reuse=tf.AUTO_REUSE):
+            context, _ = attention(
+                queries, keys, keys, mask, num_heads=2,
+                dropout_callback=lambda x: x, masked=masked,
+                chunk_size=chunk_size, train_mode=train_mode)
+        return context
+
+    def _compare(self, masked, get_values, train_mode=None):
+        random = np.random.RandomState(0)
+        with tf.Graph().as_default():
+            tf.set_random_seed(1234)
+            inputs = [
+                tf.constant(random.normal(size=[2, 7, 8]), tf.float32),
+                tf.constant(random.normal(size=[2, 7, 8]), tf.float32)]
+            full = get_values(inputs, self._contexts(inputs, masked, None))
+            chunked = [
+                get_values(inputs, self._contexts(inputs, masked, size,
+                                                  train_mode))
+                for size in [1, 3, 7]]
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                full_values, *chunked_values = sess.run([full] + chunked)
+
+        for values in chunked_values:
+            for full_value, value in zip(full_values, values):
+                self.assertTrue(np.allclose(full_value, value, atol=1e-5))
+
+    def test_same_as_full(self):
+        for masked in [False, True]:
+            self._compare(masked, lambda _, context: [context])
+
+    def test_same_gradients_as_full(self):
+        output_weights = np.random.RandomState(1).normal(
+            size=[2, 7, 8]).astype(np.float32)
+
+        def gradients(inputs, context):
+            loss = tf.reduce_sum(context * output_weights)
+            return tf.gradients(loss, inputs + tf.trainable_variables())
+
+        for masked in [False, True]:
+            self._compare(masked, gradients)
+
+    def test_full_in_training(self):
+        def gradients(inputs, context):
+            return [context] + tf.gradients(tf.reduce_sum(context), inputs)
+
+        # the full attention is computed in training, the chunked otherwise
+        for train_mode in [True, False]:
+            self._compare(True, gradients, train_mode)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3.5
+"""Unit tests for the ensembled beam search."""
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.attention.feed_forward import Attention
+from neuralmonkey.dataset import Dataset
+from neuralmonkey.decoders.beam_search_decoder import BeamSearchDecoder
+from neuralmonkey.decoders.decoder import Decoder
+from neuralmonkey.decorators import tensor
+from neuralmonkey.model.model_part import ModelPart
+from neuralmonkey.model.stateful import TemporalStatefulWithOutput
+from neuralmonkey.runners.beamsearch_runner import (BeamSearchExecutable,
+                                                    BeamSearchRunner)
+from neuralmonkey.tf_manager import TensorFlowManager
+from neuralmonkey.vocabulary import Vocabulary
+
+VOCABULARY = Vocabulary("the dog cat barks meows".split())
+DATASET = Dataset("data", {"source": [[0.5, -1., 2., 0.3]]}, {})
+
+
+class CountingEncoder(ModelPart, TemporalStatefulWithOutput):
+    """Encoder that counts how many times its states are computed.
+
+    The encoder does not implement its output.
+    """
+
+    def __init__(self, name: str) -> None:
+        ModelPart.__init__(self, name)
+        self.runs = 0
+        with self.use_scope():
+            self.inputs = tf.placeholder(tf.float32, [None, None], "inputs")
+
+    def _count_run(self, states: np.ndarray) -> np.ndarray:
+        self.runs += 1
+        return states
+
+    @tensor
+    def temporal_states(self) -> tf.Tensor:
+        weights = tf.get_variable("weights", [1, 1, 8])
+        states = tf.tanh(tf.expand_dims(self.inputs, 2) * weights)
+
+        counted = tf.py_func(self._count_run, [states], tf.float32,
+                             stateful=True)
+        counted.set_shape(states.get_shape())
+        return counted
+
+    @tensor
+    def temporal_mask(self) -> tf.Tensor:
+        return tf.ones_like(self.inputs)
+
+    @property
+    def output(self) -> tf.Tensor:
+        raise NotImplementedError("The encoder has no output")
+
+    def feed_dict(self, dataset, train=False):
+        return {self.inputs: list(dataset.get_series("source"))}
+
+
+class UncachedExecutable(BeamSearchExecutable):
+    """Beam search which runs the encoders in every ensembled step."""
+
+    def collect_results(self, results):
+        for result in results:
+            result.pop("encoder_states", None)
+        BeamSearchExecutable.collect_results(self, results)
+
+
+class UncachedRunner(BeamSearchRunner):
+
+    # pylint: disable=protected-access
+    def get_executable(self, compute_losses=False, summaries=True,
+                       num_sessions=1):
+        return UncachedExecutable(self._rank, self.all_coders, num_sessions,
+                                  self._decoder, self._postprocess)
+    # pylint: enable=protected-access
+
+
+class TestEnsembledBeamSearch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.graph = tf.Graph()
+        with cls.graph.as_default():
+            tf.set_random_seed(1234)
+            cls.encoder = CountingEncoder("encoder")
+            decoder = Decoder(
+                encoders=[], attentions=[Attention("attention", cls.encoder)],
+                vocabulary=VOCABULARY, data_id="target", name="decoder",
+                max_output_len=5, embedding_size=8, rnn_size=8)
+            cls.beam_search = BeamSearchDecoder(
+                "beam_search", decoder, beam_size=3, length_normalization=1.0)
+
+            # both sessions initialize the same variables from the seed
+            cls.manager = TensorFlowManager(num_sessions=2, num_threads=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        for session in cls.manager.sessions:
+            session.close()
+
+    def _decode(self, runner_class):
+        self.encoder.runs = 0
+        with self.graph.as_default():
+            runner = runner_class("output", self.beam_search)
+            result, = self.manager.execute(DATASET, [runner],
+                                           compute_losses=False)
+        return result.outputs
+
+    def test_encoder_states(self):
+        states = self.beam_search.encoder_states
+        self.assertIn(self.encoder.temporal_states, states)
+        self.assertIn(self.encoder.temporal_mask, states)
+
+    def test_same_hypotheses(self):
+        self.assertEqual(self._decode(BeamSearchRunner),
+                         self._decode(UncachedRunner))
+
+    def test_encoders_pruned(self):
+        self._decode(UncachedRunner)
+        uncached_runs = self.encoder.runs
+
+        # the encoder only runs in the first step in each session
+        self._decode(BeamSearchRunner)
+        self.assertEqual(self.encoder.runs, 2)
+        self.assertGreater(uncached_runs, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3.5
+"""Unit tests for the recurrent layers of the fused block cells."""
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.encoders.recurrent import _make_rnn_spec, rnn_layer
+
+
+class TestBlockCells(unittest.TestCase):
+
+    def _compare(self, cell_type, direction):
+        with tf.Graph().as_default():
+            inputs = tf.constant(
+                np.random.RandomState(0).normal(size=[3, 6, 5]), tf.float32)
+            lengths = tf.constant([6, 4, 1])
+
+            with tf.variable_scope("encoder"):
+                standard = rnn_layer(
+                    inputs, lengths, _make_rnn_spec(4, direction, cell_type))
+            num_variables = len(tf.global_variables())
+
+            # the fused layer must reuse the variables of the standard one
+            with tf.variable_scope("encoder", reuse=True):
+                fused = rnn_layer(
+                    inputs, lengths,
+                    _make_rnn_spec(4, direction, cell_type, fused=True))
+            self.assertEqual(len(tf.global_variables()), num_variables)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                standard_values, fused_values = sess.run([standard, fused])
+
+        for standard_value, fused_value in zip(standard_values,
+                                               fused_values):
+            self.assertTrue(
+                np.allclose(standard_value, fused_value, atol=1e-5))
+
+    def test_same_as_standard(self):
+        for cell_type in ["GRU", "LSTM"]:
+            for direction in ["forward", "backward", "bidirectional"]:
+                self._compare(cell_type, direction)
+
+    def test_nematus_gru_not_fused(self):
+        with self.assertRaises(ValueError):
+            _make_rnn_spec(4, "forward", "NematusGRU", fused=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,7 @@ import os
 import tempfile
 import unittest
 
-from neuralmonkey.dataset import LazyDataset, from_files
+from neuralmonkey.dataset import Dataset, LazyDataset, from_files
 from neuralmonkey.readers.plain_text_reader import UtfPlainTextReader
 
 
@@ -54,6 +54,29 @@ class TestDataset(unittest.TestCase):
 
             self.assertEqual(dataset.get_series("data"), [["a"], ["b"], ["d"]])
 
+    def test_shard(self):
+        def reader(files: List[str]) -> Iterable[List[str]]:
+            del files
+            for i in range(10):
+                yield [str(i)]
+
+        lazy_dataset = LazyDataset(
+            name="data",
+            series_paths_and_readers={"source": ([], reader)},
+            series_outputs={},
+            preprocessors=[("source", "source_prep", lambda x: x * 2)])
+        lazy_shard = lazy_dataset.shard(1, 3)
+        self.assertEqual(list(lazy_shard.get_series("source")),
+                         [["1"], ["4"], ["7"]])
+        self.assertEqual(list(lazy_shard.get_series("source_prep")),
+                         [["1", "1"], ["4", "4"], ["7", "7"]])
+        self.assertEqual(len(list(lazy_dataset.get_series("source"))), 10)
+
+        dataset = Dataset("data", {"source": list(reader([]))}, {})
+        shards = [dataset.shard(i, 3) for i in range(3)]
+        self.assertEqual([len(shard) for shard in shards], [4, 4, 2])
+        self.assertEqual(shards[2].get_series("source"), [["8"], ["9"]])
+
 
 if __name__ == "__main__":
     unittest.main()
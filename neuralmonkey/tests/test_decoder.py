@@ -5,8 +5,13 @@
 import unittest
 import copy
 
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.dataset import Dataset
 from neuralmonkey.decoders.decoder import Decoder
-from neuralmonkey.vocabulary import Vocabulary
+from neuralmonkey.vocabulary import (
+    Vocabulary, PAD_TOKEN_INDEX, END_TOKEN_INDEX)
 
 DECODER_PARAMS = dict(
     encoders=[],
@@ -76,6 +81,36 @@ class TestDecoder(unittest.TestCase):
             dparams["name"] = "test-decoder-{}".format(cell_type)
             Decoder(**dparams)
 
+    def test_runtime_top_k(self):
+        dparams = copy.deepcopy(DECODER_PARAMS)
+        dparams["vocabulary"] = Vocabulary("the the dog cat".split())
+        dparams["runtime_top_k"] = 3
+        dataset = Dataset("data", {"source": [["a"], ["b"], ["c"]]}, {})
+
+        with tf.Graph().as_default():
+            tf.set_random_seed(0)
+            decoder = Decoder(**dparams)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                logits, (logprobs, ids), decoded = sess.run(
+                    [decoder.runtime_logits, decoder.runtime_top_k_logprobs,
+                     decoder.decoded], decoder.feed_dict(dataset))
+
+        expected = logits - np.log(
+            np.sum(np.exp(logits), axis=2, keepdims=True))
+        expected_ids = np.argsort(-expected, axis=2)[:, :, :3]
+        self.assertTrue(np.array_equal(ids, expected_ids))
+        self.assertTrue(np.allclose(
+            logprobs, -np.sort(-expected, axis=2)[:, :, :3], atol=1e-5))
+
+        # <pad> only follows the end of the sentence
+        self.assertEqual(decoded.dtype, np.int64)
+        for sentence in decoded.T:
+            ends = np.flatnonzero(sentence == END_TOKEN_INDEX)
+            length = ends[0] if ends.size else len(sentence)
+            self.assertTrue(np.all(sentence[:length] != PAD_TOKEN_INDEX))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3.5
+"""Unit tests for the training with model averaging."""
+
+from multiprocessing.connection import Listener
+import multiprocessing
+import os
+import threading
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.distributed import ModelAveraging, averaging_server
+from neuralmonkey.tf_manager import TensorFlowManager
+
+
+def _worker(address, authkey, worker_id, num_workers, results):
+    with tf.Graph().as_default():
+        weights = tf.get_variable(
+            "weights", initializer=tf.constant([1., 2.]) * (worker_id + 1))
+        step = tf.get_variable("step", initializer=tf.constant(worker_id))
+        manager = TensorFlowManager(num_sessions=1, num_threads=1)
+
+        averaging = ModelAveraging(address, authkey, worker_id,
+                                   num_workers, period=1)
+        averaging.step(manager, 1)
+        averaging.close()
+
+        results.put((worker_id, manager.sessions[0].run([weights, step])))
+
+
+class TestModelAveraging(unittest.TestCase):
+
+    def test_synchronize(self):
+        num_workers = 2
+        authkey = os.urandom(16)
+        listener = Listener(("localhost", 0), authkey=authkey)
+        server = threading.Thread(target=averaging_server,
+                                  args=(listener, num_workers), daemon=True)
+        server.start()
+
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        workers = [context.Process(
+            target=_worker, args=(listener.address, authkey, worker_id,
+                                  num_workers, results))
+                   for worker_id in range(num_workers)]
+        for worker in workers:
+            worker.start()
+
+        values = dict(results.get(timeout=120) for _ in workers)
+        for worker in workers:
+            worker.join()
+        server.join(timeout=10)
+        listener.close()
+
+        self.assertFalse(server.is_alive())
+        for worker_id in range(num_workers):
+            weights, step = values[worker_id]
+            self.assertTrue(np.allclose(weights, [1.5, 3.]))
+            # integer variables are not averaged
+            self.assertEqual(step, worker_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
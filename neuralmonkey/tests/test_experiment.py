@@ -0,0 +1,68 @@
+#!/usr/bin/env python3.5
+"""Unit tests for the experiment setup."""
+# pylint: disable=protected-access
+
+import os
+import tempfile
+import unittest
+
+from neuralmonkey.experiment import Experiment
+
+CONFIG = """
+[main]
+output="{output}"
+batch_size=1
+runners=[<runner>]
+{main}
+
+[runner]
+class={runner}
+output_series="target"
+decoder=<decoder>
+
+[decoder]
+class={decoder}
+"""
+
+RUNNER = "runners.GreedyRunner"
+ALIGNMENT_RUNNER = "runners.word_alignment_runner.WordAlignmentRunner"
+DECODER = "decoders.decoder.Decoder"
+ALIGNMENT_DECODER = "decoders.word_alignment_decoder.WordAlignmentDecoder"
+
+
+class TestAttentionHistories(unittest.TestCase):
+
+    def _needs_histories(self, runner=RUNNER, decoder=DECODER, main="",
+                         train_mode=False):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = CONFIG.format(output=os.path.join(tmp_dir, "output"),
+                                   runner=runner, decoder=decoder, main=main)
+
+            path = os.path.join(tmp_dir, "experiment.ini")
+            with open(path, "w", encoding="utf-8") as f_config:
+                f_config.write(config)
+
+            experiment = Experiment(path, train_mode=train_mode)
+            return experiment._needs_attention_histories()
+
+    def test_readers(self):
+        self.assertFalse(self._needs_histories())
+        # the histories are read by the word alignment runner and decoder
+        self.assertTrue(self._needs_histories(runner=ALIGNMENT_RUNNER))
+        self.assertTrue(self._needs_histories(decoder=ALIGNMENT_DECODER))
+
+    def test_train_mode(self):
+        self.assertTrue(self._needs_histories(train_mode=True))
+
+    def test_override(self):
+        self.assertFalse(self._needs_histories(
+            runner=ALIGNMENT_RUNNER, decoder=ALIGNMENT_DECODER,
+            main="attention_histories=False"))
+        self.assertTrue(self._needs_histories(
+            main="attention_histories=True"))
+        self.assertFalse(self._needs_histories(
+            train_mode=True, main="attention_histories=False"))
+
+
+if __name__ == "__main__":
+    unittest.main()
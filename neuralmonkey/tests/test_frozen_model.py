@@ -0,0 +1,72 @@
+#!/usr/bin/env python3.5
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.frozen_model import FrozenModel, GRAPH_FILE, SIGNATURE_FILE
+from neuralmonkey.vocabulary import (
+    Vocabulary, PAD_TOKEN_INDEX, START_TOKEN_INDEX, END_TOKEN_INDEX,
+    UNK_TOKEN_INDEX)
+
+
+class TestFrozenModel(unittest.TestCase):
+
+    def test_run(self):
+        """Feed the sentences and read back the tokens and the lengths."""
+        vocabulary = Vocabulary("the the dog cat".split())
+
+        with tf.Graph().as_default() as graph:
+            factor = tf.placeholder(tf.int32, [None, None], "factor")
+            mask = tf.placeholder(tf.float32, [None, None], "mask")
+            decoded = tf.transpose(factor, name="decoded")
+            lengths = tf.reduce_sum(mask, 1, name="lengths")
+
+        signature = {
+            "inputs": [{"type": "sequence",
+                        "data_ids": ["source"],
+                        "factors": [factor.name],
+                        "vocabularies": ["vocabulary_0.json"],
+                        "mask": mask.name,
+                        "mask_dtype": "float32",
+                        "max_length": None,
+                        "add_start_symbol": False,
+                        "add_end_symbol": True}],
+            "outputs": [{"series": "target",
+                         "type": "tokens",
+                         "tensor": decoded.name,
+                         "vocabulary": "vocabulary_0.json"},
+                        {"series": "lengths",
+                         "type": "values",
+                         "tensor": lengths.name}],
+            "vocabularies": ["vocabulary_0.json"],
+            "special_tokens": {"pad": PAD_TOKEN_INDEX,
+                               "start": START_TOKEN_INDEX,
+                               "end": END_TOKEN_INDEX,
+                               "unk": UNK_TOKEN_INDEX}}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, GRAPH_FILE), "wb") as f_graph:
+                f_graph.write(graph.as_graph_def().SerializeToString())
+            with open(os.path.join(tmp_dir, SIGNATURE_FILE), "w") as f_sig:
+                json.dump(signature, f_sig)
+            with open(os.path.join(tmp_dir, "vocabulary_0.json"),
+                      "w") as f_vocab:
+                json.dump(list(vocabulary.index_to_word), f_vocab)
+
+            model = FrozenModel(tmp_dir)
+
+        results = model.run({"source": [["the", "dog"],
+                                        ["a", "cat", "the"]]})
+
+        self.assertEqual(results["target"],
+                         [["the", "dog"], ["<unk>", "cat", "the"]])
+        self.assertTrue(np.allclose(results["lengths"], [3, 4]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3.5
+
+import json
+import os
+import tempfile
+import unittest
+
+from neuralmonkey.profiling import Profiler, phase
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_disabled(self):
+        with phase("nothing"):
+            pass
+        self.assertEqual(Profiler.summary(), {})
+
+    def test_trace(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            trace_path = os.path.join(tmp_dir, "profile.jsonl")
+            chrome_path = os.path.join(tmp_dir, "profile.trace.json")
+            Profiler.start(trace_path, chrome_path, chrome_trace_steps=1)
+
+            for step in range(1, 3):
+                for _ in Profiler.iterate("data_read", [1, 2]):
+                    with phase("session_run"):
+                        Profiler.wrap("preprocess", len)("abc")
+                Profiler.end_step(step)
+            summary = Profiler.summary()
+            Profiler.finish()
+
+            with open(trace_path, encoding="utf-8") as f_trace:
+                steps = [json.loads(line) for line in f_trace]
+            with open(chrome_path, encoding="utf-8") as f_chrome:
+                events = json.load(f_chrome)["traceEvents"]
+
+        self.assertEqual([s["step"] for s in steps], [1, 2])
+        self.assertEqual(set(steps[0]["phases"]),
+                         {"data_read", "session_run", "preprocess"})
+        self.assertIn("profile/session_run/wall", summary)
+        self.assertIn("profile/preprocess/cpu", summary)
+        # two session runs with a nested preprocessing, three item reads
+        self.assertEqual(len(events), 7)
+        self.assertFalse(Profiler.enabled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3.5
+"""Unit tests for quantization.py."""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.quantization import (
+    QUANTIZED_SUFFIX, SCALE_SUFFIX, dequantize, gather, quantize,
+    quantization_getter, quantize_checkpoint, word_axis)
+
+
+def _ancestors(tensor):
+    ops = set()
+    stack = [tensor.op]
+    while stack:
+        op = stack.pop()
+        if op not in ops:
+            ops.add(op)
+            stack.extend(inp.op for inp in op.inputs)
+    return ops
+
+
+class TestQuantization(unittest.TestCase):
+
+    def test_word_axis(self):
+        self.assertEqual(
+            word_axis("encoder/embedding_matrix_0", [100, 64], tf.float32), 0)
+        self.assertEqual(
+            word_axis("decoder/word_embeddings", [100, 64], tf.float32), 0)
+        self.assertEqual(
+            word_axis("decoder/state_to_word_W", [64, 100], tf.float32), 1)
+        self.assertIsNone(
+            word_axis("decoder/attention/kernel", [100, 64], tf.float32))
+        self.assertIsNone(word_axis(
+            "decoder/state_to_word_W/Adam", [64, 100], tf.float32))
+        self.assertIsNone(
+            word_axis("decoder/word_embeddings", [100, 64], tf.int32))
+
+    def test_quantize(self):
+        matrix = np.random.RandomState(0).normal(
+            size=[50, 20]).astype(np.float32)
+        matrix[3] = 0.
+        matrix[5] *= 100.
+
+        for axis in [0, 1]:
+            words = matrix if axis == 0 else matrix.T
+            quantized, scales = quantize(words, axis)
+            self.assertEqual(quantized.dtype, np.int8)
+            self.assertEqual(scales.shape, (50,))
+
+            # the error is at most a half of the quantization step of each
+            # word, the large values of a word do not affect the others
+            error = np.abs(dequantize(quantized, scales, axis) - words)
+            if axis == 1:
+                error = error.T
+            self.assertTrue(np.all(error <= scales[:, None] / 2 + 1e-6))
+
+    def test_quantized_checkpoint(self):
+        random = np.random.RandomState(0)
+        embeddings = random.uniform(-1, 1, [100, 64]).astype(np.float32)
+        projection = random.uniform(-1, 1, [64, 100]).astype(np.float32)
+        kernel = random.uniform(-1, 1, [100, 64]).astype(np.float32)
+        ids = np.array([[3, 0], [99, 3]], dtype=np.int32)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = os.path.join(tmp_dir, "variables.data")
+            quantized_checkpoint = os.path.join(tmp_dir, "variables.int8")
+
+            with tf.Graph().as_default():
+                tf.get_variable("embedding_matrix_0", initializer=embeddings)
+                tf.get_variable("state_to_word_W", initializer=projection)
+                tf.get_variable("kernel", initializer=kernel)
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    tf.train.Saver().save(sess, checkpoint)
+
+            self.assertEqual(
+                sorted(quantize_checkpoint(checkpoint, quantized_checkpoint)),
+                ["embedding_matrix_0", "state_to_word_W"])
+
+            with tf.Graph().as_default():
+                with tf.variable_scope(tf.get_variable_scope(),
+                                       custom_getter=quantization_getter):
+                    embeddings_var = tf.get_variable(
+                        "embedding_matrix_0", shape=[100, 64])
+                    projection_var = tf.get_variable(
+                        "state_to_word_W", shape=[64, 100])
+                    tf.get_variable("kernel", shape=[100, 64])
+
+                embedded = gather(embeddings_var, ids)
+                projected = gather(projection_var, ids[0], axis=1)
+
+                names = {var.op.name for var in tf.global_variables()}
+                with tf.Session() as sess:
+                    tf.train.Saver().restore(sess, quantized_checkpoint)
+                    values = sess.run(
+                        [embeddings_var, projection_var, embedded, projected])
+
+        self.assertEqual(names, {
+            "embedding_matrix_0" + QUANTIZED_SUFFIX,
+            "embedding_matrix_0" + SCALE_SUFFIX,
+            "state_to_word_W" + QUANTIZED_SUFFIX,
+            "state_to_word_W" + SCALE_SUFFIX, "kernel"})
+
+        # only the gathered words are dequantized
+        self.assertNotIn(embeddings_var.op, _ancestors(embedded))
+        self.assertNotIn(projection_var.op, _ancestors(projected))
+
+        embeddings_value, projection_value, embedded_value, projected_value = (
+            values)
+        self.assertTrue(np.allclose(embeddings_value, embeddings,
+                                    atol=1 / 127))
+        self.assertTrue(np.allclose(projection_value, projection,
+                                    atol=1 / 127))
+        self.assertTrue(np.allclose(embedded_value, embeddings_value[ids]))
+        self.assertTrue(np.allclose(projected_value,
+                                    projection_value[:, ids[0]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,20 @@
 #!/usr/bin/env python3.5
 """Unit tests for readers"""
 
+import os
 import unittest
 import tempfile
 import numpy as np
 
+from PIL import Image
+
+from neuralmonkey.readers.image_reader import image_reader, _cached_map
+from neuralmonkey.readers.numpy_reader import (
+    RaggedArrayWriter, ragged_array_reader)
 from neuralmonkey.readers.string_vector_reader import get_string_vector_reader
-from neuralmonkey.readers.plain_text_reader import T2TReader
+from neuralmonkey.readers.plain_text_reader import (
+    T2TReader, column_separated_reader, column_separated_table_reader)
+from neuralmonkey.processors.helpers import column_selector
 
 STRING_INTS = """
 1   2 3
@@ -119,5 +127,166 @@ class TestT2TReader(unittest.TestCase):
         self.assertSequenceEqual(read[0], gold_tokens)
 
 
+STRING_TSV = """a b\tc d\te
+f\tg h\ti
+j\tk
+"""
+
+STRING_CSV = """"a, b",c,d
+e,"f ""g"" h",i
+"""
+
+
+class TestColumnSeparatedReader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpfile_tsv = _make_file(STRING_TSV)
+        self.tmpfile_csv = _make_file(STRING_CSV)
+
+    def test_single_column(self):
+        reader = column_separated_reader(2)
+        self.assertEqual(list(reader([self.tmpfile_tsv.name])),
+                         [["c", "d"], ["g", "h"], ["k"]])
+
+        reader = column_separated_reader(3)
+        self.assertEqual(list(reader([self.tmpfile_tsv.name])),
+                         [["e"], ["i"], []])
+
+    def test_quoted(self):
+        reader = column_separated_reader(1, delimiter=",", quotechar='"')
+        self.assertEqual(list(reader([self.tmpfile_csv.name])),
+                         [["a,", "b"], ["e"]])
+
+        reader = column_separated_reader(2, delimiter=",", quotechar='"')
+        self.assertEqual(list(reader([self.tmpfile_csv.name])),
+                         [["c"], ["f", '"g"', "h"]])
+
+    def test_table(self):
+        reader = column_separated_table_reader()
+        table = list(reader([self.tmpfile_tsv.name]))
+        self.assertEqual(len(table), 3)
+
+        for column in range(1, 4):
+            single = column_separated_reader(column)
+            selector = column_selector(column)
+            self.assertEqual([selector(row) for row in table],
+                             list(single([self.tmpfile_tsv.name])))
+
+    def tearDown(self):
+        self.tmpfile_tsv.close()
+        self.tmpfile_csv.close()
+
+
+class TestRaggedArrays(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "store")
+
+    def test_roundtrip(self):
+        arrays = [np.random.rand(length, 3).astype(np.float32)
+                  for length in [5, 0, 1, 7]]
+
+        with RaggedArrayWriter(self.path) as writer:
+            for array in arrays:
+                writer.write(array)
+
+        loaded = list(ragged_array_reader([self.path, self.path]))
+        self.assertEqual(len(loaded), 2 * len(arrays))
+        for orig, read in zip(arrays + arrays, loaded):
+            self.assertEqual(read.dtype, np.float32)
+            self.assertTrue(np.array_equal(orig, read))
+
+    def test_shape_mismatch(self):
+        with self.assertRaisesRegex(ValueError, "cannot be stored"):
+            with RaggedArrayWriter(self.path) as writer:
+                writer.write(np.zeros((2, 3)))
+                writer.write(np.zeros((2, 4)))
+
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+class TestImageReader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpdir.name, "cache")
+        self.list_file = os.path.join(self.tmpdir.name, "images.txt")
+
+        with open(self.list_file, "w") as f_list:
+            for i in range(10):
+                self._write_image(i, (10 * i, 0, 0))
+                print("image{}.png".format(i), file=f_list)
+
+    def _write_image(self, index, color):
+        Image.new("RGB", (4, 3), color).save(
+            os.path.join(self.tmpdir.name, "image{}.png".format(index)))
+
+    def _read(self, **kwargs):
+        reader = image_reader(4, 3, prefix=self.tmpdir.name, **kwargs)
+        return list(reader([self.list_file]))
+
+    def test_parallel_order(self):
+        images = self._read(num_workers=4)
+        self.assertEqual([image[0, 0, 0] for image in images],
+                         [10. * i for i in range(10)])
+
+        for single, parallel in zip(self._read(), images):
+            self.assertTrue(np.array_equal(single, parallel))
+
+    def test_cache_hit(self):
+        paths = [os.path.join(self.tmpdir.name, "image{}.png".format(i))
+                 for i in range(10)]
+        loaded = []
+
+        def load(path):
+            loaded.append(path)
+            return np.array(Image.open(path))
+
+        first = list(_cached_map(load, paths, 2, (3, 4, 3), np.uint8,
+                                 self.cache_dir, "key"))
+        self.assertEqual(len(loaded), 10)
+
+        second = list(_cached_map(load, paths, 2, (3, 4, 3), np.uint8,
+                                  self.cache_dir, "key"))
+        self.assertEqual(len(loaded), 10)
+
+        for orig, cached in zip(first, second):
+            self.assertTrue(np.array_equal(orig, cached))
+
+    def test_interrupted_fill(self):
+        images = self._read(num_workers=2, cache_dir=self.cache_dir)
+
+        reader = image_reader(4, 3, prefix=self.tmpdir.name,
+                              cache_dir=os.path.join(self.tmpdir.name, "new"))
+        generator = reader([self.list_file])
+        next(generator)
+        generator.close()
+        self.assertEqual(
+            os.listdir(os.path.join(self.tmpdir.name, "new")), [])
+
+        cached = self._read(num_workers=2, cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        for orig, read in zip(images, cached):
+            self.assertTrue(np.array_equal(orig, read))
+
+    def test_changed_image(self):
+        self._read(cache_dir=self.cache_dir)
+
+        path = os.path.join(self.tmpdir.name, "image3.png")
+        stat = os.stat(path)
+        self._write_image(3, (0, 255, 0))
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        images = self._read(cache_dir=self.cache_dir)
+        self.assertEqual(images[3][0, 0, 1], 255.)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
 if __name__ == "__main__":
     unittest.main()
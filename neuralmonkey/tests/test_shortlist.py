@@ -0,0 +1,80 @@
+#!/usr/bin/env python3.5
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.dataset import Dataset
+from neuralmonkey.decoders.decoder import Decoder
+from neuralmonkey.decoders.shortlist import LexicalShortlist
+from neuralmonkey.vocabulary import Vocabulary
+
+VOCABULARY = Vocabulary("the the the a a house dog cat tree".split())
+DATASET = Dataset("data", {"source": [["das", "Haus"], ["Hund"]]}, {})
+
+
+def load_shortlist():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "lex.txt")
+        with open(path, "w", encoding="utf-8") as f_lex:
+            f_lex.write("Haus house 0.9\n"
+                        "Haus tree 0.05\n"
+                        "Haus building 0.05\n"
+                        "Hund dog 0.8\n"
+                        "Katze cat 1.0\n")
+
+        return LexicalShortlist(path, "source", VOCABULARY,
+                                translations_per_word=1, frequent_words=2)
+
+
+class TestLexicalShortlist(unittest.TestCase):
+
+    def test_candidates(self):
+        candidates = [VOCABULARY.index_to_word[i]
+                      for i in load_shortlist().candidates(DATASET)]
+
+        self.assertEqual(
+            sorted(candidates),
+            sorted(["<pad>", "<s>", "</s>", "<unk>", "the", "a",
+                    "house", "dog"]))
+
+    def test_decoding(self):
+        shortlist = load_shortlist()
+        candidates = shortlist.candidates(DATASET)
+        others = np.setdiff1d(np.arange(len(VOCABULARY)), candidates)
+
+        with tf.Graph().as_default():
+            tf.set_random_seed(0)
+            decoder = Decoder(
+                encoders=[], vocabulary=VOCABULARY, data_id="target",
+                name="decoder", max_output_len=4, dropout_keep_prob=1.0,
+                embedding_size=6, rnn_size=6, shortlist=shortlist,
+                runtime_top_k=2)
+            fetches = [decoder.runtime_logits, decoder.decoded,
+                       decoder.runtime_top_k_logprobs[1]]
+
+            feed_dict = decoder.feed_dict(DATASET)
+            full_feed_dict = dict(feed_dict)
+            full_feed_dict[decoder.shortlist_ids] = np.arange(
+                len(VOCABULARY))
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                logits, decoded, top_k_ids = sess.run(fetches, feed_dict)
+                full_logits = sess.run(decoder.runtime_logits,
+                                       full_feed_dict)
+
+        # the ids are mapped back from the shortlist to the vocabulary
+        self.assertTrue(np.all(np.isin(decoded, candidates)))
+        self.assertTrue(np.all(np.isin(top_k_ids, candidates)))
+        self.assertEqual(logits.shape[2], len(VOCABULARY))
+        self.assertTrue(np.allclose(logits[0][:, candidates],
+                                    full_logits[0][:, candidates]))
+        self.assertTrue(np.all(logits[:, :, others] < -1e3))
+
+
+if __name__ == "__main__":
+    unittest.main()
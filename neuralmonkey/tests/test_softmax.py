@@ -0,0 +1,70 @@
+#!/usr/bin/env python3.5
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.nn.softmax import (adaptive_softmax_logprobs,
+                                     adaptive_softmax_xent,
+                                     smoothed_softmax_xent)
+from neuralmonkey.vocabulary import Vocabulary
+
+
+class TestSoftmax(unittest.TestCase):
+
+    def test_label_smoothing(self):
+        """Compare with the cross entropy of dense smoothed targets."""
+        logits = tf.constant(
+            np.random.RandomState(0).normal(size=[6, 10]), dtype=tf.float32)
+        labels = tf.constant([0, 3, 9, 2, 2, 5])
+
+        smoothed = smoothed_softmax_xent(labels, logits, 0.1)
+        dense = tf.losses.softmax_cross_entropy(
+            tf.one_hot(labels, 10), logits, label_smoothing=0.1,
+            reduction=tf.losses.Reduction.NONE)
+
+        with tf.Session() as sess:
+            smoothed_value, dense_value = sess.run([smoothed, dense])
+
+        self.assertTrue(np.allclose(smoothed_value, dense_value, atol=1e-5))
+
+    def test_adaptive_softmax(self):
+        """The adaptive softmax defines a distribution over the words."""
+        vocabulary = Vocabulary(["a", "b", "b", "c", "c", "c", "d", "e"])
+        size = len(vocabulary)
+        random = np.random.RandomState(1)
+
+        inputs = tf.constant(random.normal(size=[size, 4]), dtype=tf.float32)
+        weights = tf.constant(random.normal(size=[size, 4]),
+                              dtype=tf.float32)
+        biases = tf.zeros([size])
+        cluster_weights = tf.constant(random.normal(size=[2, 4]),
+                                      dtype=tf.float32)
+        cluster_biases = tf.constant([0.5, -0.5])
+
+        # every position is evaluated for all the words of the vocabulary
+        tiled_inputs = tf.tile(inputs, [size, 1])
+        labels = tf.reshape(tf.tile(tf.expand_dims(tf.range(size), 1),
+                                    [1, size]), [-1])
+
+        xents = adaptive_softmax_xent(
+            tiled_inputs, labels, weights, biases, cluster_weights,
+            cluster_biases, vocabulary, [5, 7])
+        logprobs = adaptive_softmax_logprobs(
+            inputs, weights, biases, cluster_weights, cluster_biases,
+            vocabulary, [5, 7])
+
+        with tf.Session() as sess:
+            xents_value, logprobs_value = sess.run([xents, logprobs])
+
+        probs = np.exp(-xents_value).reshape([size, size])
+        self.assertTrue(np.allclose(probs.sum(axis=0), 1., atol=1e-5))
+
+        # decoding uses the same distribution as the training
+        self.assertTrue(np.allclose(logprobs_value, np.log(probs).T,
+                                    atol=1e-5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3.5
+"""Unit tests for the precision handling in tf_utils.py."""
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.attention.feed_forward import Attention
+from neuralmonkey.dataset import Dataset
+from neuralmonkey.decoders.decoder import Decoder
+from neuralmonkey.decoders.transformer import TransformerDecoder
+from neuralmonkey.model.stateful import TemporalStateful
+from neuralmonkey.tf_utils import (float_dtype, precision_getter,
+                                   set_precision)
+from neuralmonkey.vocabulary import Vocabulary
+
+VOCABULARY = Vocabulary("the dog cat barks meows".split())
+DATASET = Dataset("data", {"target": [["the", "dog", "barks"],
+                                      ["the", "cat", "meows"],
+                                      ["cat"]]}, {})
+STATES = np.random.RandomState(0).uniform(-1, 1, [3, 4, 8])
+MASK = np.array([[1, 1, 1, 1], [1, 1, 0, 0], [1, 0, 0, 0]])
+
+
+class ConstantEncoder(TemporalStateful):
+
+    @property
+    def temporal_states(self) -> tf.Tensor:
+        return tf.constant(STATES, float_dtype())
+
+    @property
+    def temporal_mask(self) -> tf.Tensor:
+        return tf.constant(MASK, float_dtype())
+
+
+def _dense_output(precision, inputs):
+    set_precision(precision)
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.set_random_seed(1234)
+        with tf.variable_scope("model", custom_getter=precision_getter):
+            x = tf.placeholder(float_dtype(), [None, 4])
+            y = tf.layers.dense(x, 3, activation=tf.tanh)
+
+        variables = tf.global_variables()
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            output = sess.run(y, {x: inputs})
+
+    return output, [var.dtype.base_dtype for var in variables]
+
+
+def _rnn_decoder():
+    attention = Attention("attention", ConstantEncoder())
+    return Decoder(
+        encoders=[], attentions=[attention], vocabulary=VOCABULARY,
+        data_id="target", name="decoder", max_output_len=4,
+        embedding_size=8, rnn_size=8)
+
+
+def _transformer_decoder():
+    return TransformerDecoder(
+        name="decoder", encoder=ConstantEncoder(), vocabulary=VOCABULARY,
+        data_id="target", ff_hidden_size=16, n_heads_self=2, n_heads_enc=2,
+        depth=2, max_output_len=4, embedding_size=8)
+
+
+def _decoder_outputs(precision, build_decoder):
+    set_precision(precision)
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.set_random_seed(1234)
+        with tf.variable_scope("model", custom_getter=precision_getter):
+            decoder = build_decoder()
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            train_logits, train_loss = sess.run(
+                [decoder.train_logits, decoder.train_loss],
+                decoder.feed_dict(DATASET, train=True))
+            runtime_logits, decoded = sess.run(
+                [decoder.runtime_logits, decoder.decoded],
+                decoder.feed_dict(DATASET))
+
+    return train_logits, train_loss, runtime_logits, decoded
+
+
+class TestPrecision(unittest.TestCase):
+
+    def tearDown(self):
+        set_precision("float32")
+
+    def test_unknown_precision(self):
+        with self.assertRaises(ValueError):
+            set_precision("float8")
+
+    def test_float16_close_to_float32(self):
+        inputs = np.random.RandomState(0).uniform(
+            -1, 1, [5, 4]).astype(np.float32)
+
+        output_32, _ = _dense_output("float32", inputs)
+        output_16, var_dtypes = _dense_output("float16", inputs)
+
+        self.assertEqual(output_16.dtype, np.float16)
+        self.assertTrue(all(dtype == tf.float32 for dtype in var_dtypes))
+        self.assertTrue(np.allclose(output_32, output_16, atol=1e-2))
+
+    def _assert_decoder_close(self, build_decoder):
+        outputs_32 = _decoder_outputs("float32", build_decoder)
+        outputs_16 = _decoder_outputs("float16", build_decoder)
+        train_logits, train_loss, runtime_logits, decoded = outputs_16
+
+        self.assertEqual(train_logits.dtype, np.float16)
+        self.assertEqual(runtime_logits.dtype, np.float16)
+        self.assertTrue(np.array_equal(outputs_32[3], decoded))
+        for output_32, output_16 in zip(
+                outputs_32[:3], [train_logits, train_loss, runtime_logits]):
+            self.assertTrue(np.allclose(output_32, output_16, atol=5e-2))
+
+    def test_rnn_decoder(self):
+        self._assert_decoder_close(_rnn_decoder)
+
+    def test_transformer_decoder(self):
+        self._assert_decoder_close(_transformer_decoder)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3.5
+"""Unit tests for the training steps of the generic trainer."""
+
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from neuralmonkey.dataset import Dataset
+from neuralmonkey.decorators import tensor
+from neuralmonkey.model.model_part import ModelPart
+from neuralmonkey.tf_manager import TensorFlowManager
+from neuralmonkey.trainers.cross_entropy_trainer import CrossEntropyTrainer
+
+INPUTS = np.random.RandomState(0).normal(size=[4, 3]).tolist()
+TARGETS = [1., -2., 0.5, 3.]
+
+
+class LinearRegression(ModelPart):
+    """Linear model with the mean squared error as the cost."""
+
+    def __init__(self, name: str) -> None:
+        ModelPart.__init__(self, name)
+        with self.use_scope():
+            self.inputs = tf.placeholder(tf.float32, [None, 3], "inputs")
+            self.targets = tf.placeholder(tf.float32, [None], "targets")
+
+    @tensor
+    def cost(self) -> tf.Tensor:
+        weights = tf.get_variable(
+            "weights", [3], initializer=tf.constant_initializer(
+                [0.5, -1., 2.]))
+        predictions = tf.reduce_sum(self.inputs * weights, 1)
+        return tf.reduce_mean(tf.square(predictions - self.targets))
+
+    def feed_dict(self, dataset, train=False):
+        return {self.inputs: list(dataset.get_series("inputs")),
+                self.targets: list(dataset.get_series("targets"))}
+
+
+class ScaledLinearRegression(LinearRegression):
+    """Linear regression with a tensor of the inputs built eagerly."""
+
+    def __init__(self, name: str) -> None:
+        LinearRegression.__init__(self, name)
+        self.scaled_inputs = 2 * self.inputs
+
+
+def train_step(optimizer, batch_size, summaries=False,
+               model_class=LinearRegression, **trainer_kwargs):
+    """Train on the whole dataset in batches.
+
+    Returns:
+        The trained weights and the result of the trainer.
+    """
+    dataset = Dataset("data", {"inputs": INPUTS, "targets": TARGETS}, {})
+
+    with tf.Graph().as_default():
+        model = model_class("model")
+        trainer = CrossEntropyTrainer(
+            [model], optimizer=optimizer(), **trainer_kwargs)
+        manager = TensorFlowManager(
+            num_sessions=1, num_threads=2,
+            num_cpu_devices=trainer_kwargs.get("num_shards", 1))
+        result, = manager.execute(dataset, [trainer], train=True,
+                                  summaries=summaries, batch_size=batch_size)
+        return manager.sessions[0].run(tf.trainable_variables()), result
+
+
+class TestTrainers(unittest.TestCase):
+
+    def test_accumulation(self):
+        # with a large epsilon, the first Adam update is almost linear in
+        # the gradient
+        for optimizer in [lambda: tf.train.AdamOptimizer(0.1),
+                          lambda: tf.train.AdamOptimizer(0.1, epsilon=10.)]:
+            full_batch, _ = train_step(optimizer, 4)
+            accumulated, _ = train_step(optimizer, 2, accumulation_steps=2)
+            # the first batch only accumulates the gradients
+            not_applied, _ = train_step(optimizer, 2, accumulation_steps=4)
+
+            self.assertTrue(np.allclose(accumulated[0], full_batch[0]))
+            self.assertTrue(np.allclose(not_applied[0], [0.5, -1., 2.]))
+
+    def test_data_parallel(self):
+        def optimizer():
+            return tf.train.AdamOptimizer(0.1, epsilon=10.)
+
+        full_batch, _ = train_step(optimizer, 4)
+        sharded, result = train_step(optimizer, 4, summaries=True,
+                                     num_shards=2, tower_devices=["/cpu:1"])
+        # the last tower gets no shard of the batch
+        more_towers, _ = train_step(optimizer, 4, num_shards=3,
+                                    tower_devices=["/cpu:1", "/cpu:2"])
+
+        self.assertEqual(len(sharded), 1)
+        self.assertTrue(np.allclose(sharded[0], full_batch[0]))
+        self.assertTrue(np.allclose(more_towers[0], full_batch[0]))
+
+        measures = {value.tag: value.simple_value
+                    for value in result.scalar_summaries.value
+                    if value.tag.startswith("data_parallel_")}
+        self.assertEqual(set(measures), {"data_parallel_examples_per_second",
+                                         "data_parallel_efficiency"})
+        self.assertTrue(all(value > 0 for value in measures.values()))
+
+    def test_data_parallel_eager_tensors(self):
+        # the towers would share the tensor of the first shard
+        with self.assertRaisesRegex(ValueError, "scaled_inputs"):
+            train_step(lambda: tf.train.AdamOptimizer(0.1), 4, num_shards=2,
+                       model_class=ScaledLinearRegression)
+
+
+if __name__ == "__main__":
+    unittest.main()
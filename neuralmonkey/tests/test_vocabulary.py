@@ -1,8 +1,14 @@
 #!/usr/bin/env python3.5
 
+import os
+import tempfile
 import unittest
 
-from neuralmonkey.vocabulary import Vocabulary
+import numpy as np
+
+from neuralmonkey.dataset import Dataset
+from neuralmonkey.vocabulary import (
+    Vocabulary, from_binary, from_dataset, _ApproximateCounter)
 
 CORPUS = [
     "the colorless ideas slept furiously",
@@ -69,6 +75,60 @@ class TestVocabulary(unittest.TestCase):
         with self.assertRaises(ValueError):
             vocabulary.truncate_by_min_freq(2)
 
+    def test_from_dataset(self):
+        dataset = Dataset("corpus", {"text": TOKENIZED_CORPUS}, {})
+
+        for kwargs in [{}, {"num_workers": 2, "chunk_size": 2},
+                       {"max_tracked_words": 10}]:
+            vocabulary = from_dataset([dataset], ["text"], 9, **kwargs)
+
+            self.assertEqual(len(vocabulary), 9)
+            for word in ["the", "slept", "working", "class", "walrus"]:
+                self.assertTrue(word in vocabulary)
+            self.assertEqual(vocabulary.word_count["walrus"], 2)
+
+            # the alphabet has the characters of the dropped words, too
+            self.assertTrue("y" in vocabulary.alphabet)
+            self.assertFalse("furiously" in vocabulary)
+
+    def test_sketch_rows_independent(self):
+        counter = _ApproximateCounter(10, width=64)
+        hashes = [counter._hashes("word{}".format(i)) for i in range(1000)]
+
+        # pairs of words colliding in the first row rarely collide in others
+        collisions = [(h_1[1:] == h_2[1:]).mean()
+                      for i, h_1 in enumerate(hashes)
+                      for h_2 in hashes[i + 1:] if h_1[0] == h_2[0]]
+        self.assertTrue(collisions)
+        self.assertLess(np.mean(collisions), 0.1)
+
+    def test_binary(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "vocab.bin")
+            VOCABULARY.save_binary(path)
+            vocabulary = from_binary(path)
+
+            self.assertEqual(len(vocabulary), len(VOCABULARY))
+            self.assertEqual(vocabulary.alphabet, VOCABULARY.alphabet)
+            self.assertFalse("jindrisek" in vocabulary)
+            for word in VOCABULARY.index_to_word:
+                self.assertEqual(vocabulary.get_word_index(word),
+                                 VOCABULARY.get_word_index(word))
+                self.assertEqual(vocabulary.word_count[word],
+                                 VOCABULARY.word_count[word])
+
+            vocabulary.add_word("jindrisek")
+            self.assertEqual(vocabulary.get_word_index("jindrisek"),
+                             len(VOCABULARY))
+
+    def test_binary_unk_sample_prob(self):
+        vocabulary = Vocabulary(["walrus"], unk_sample_prob=0.25)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "vocab.bin")
+            vocabulary.save_binary(path)
+            self.assertEqual(from_binary(path).unk_sample_prob, 0.25)
+
 
 if __name__ == "__main__":
     unittest.main()
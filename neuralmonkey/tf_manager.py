@@ -6,9 +6,15 @@ variables.
 
 """
 # pylint: disable=unused-import
-from typing import Any, List, Union, Optional, Set
+from typing import (Any, Callable, Dict, Iterable, List, Union, Optional,
+                    Set)
 # pylint: enable=unused-import
 
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+import glob
+import json
 import os
 import time
 
@@ -16,16 +22,20 @@ import numpy as np
 import tensorflow as tf
 # pylint: disable=no-name-in-module
 from tensorflow.python import debug as tf_debug
+from tensorflow.python.client import timeline
 # pylint: enable=no-name-in-module
 from typeguard import check_argument_types
 
-from neuralmonkey.logging import log
+from neuralmonkey.logging import log, debug
+from neuralmonkey.profiling import Profiler, phase
 from neuralmonkey.dataset import Dataset
+from neuralmonkey.model.model_part import ModelPart
 # pylint: disable=unused-import
 from neuralmonkey.runners.base_runner import FeedDict
 # pylint: enable=unused-import
 from neuralmonkey.runners.base_runner import (ExecutionResult,
                                               reduce_execution_results)
+from neuralmonkey.trainers.generic_trainer import DataParallelTrainExecutable
 
 
 class TensorFlowManager(object):
@@ -44,7 +54,11 @@ class TensorFlowManager(object):
                  variable_files: Optional[List[str]] = None,
                  gpu_allow_growth: bool = True,
                  per_process_gpu_memory_fraction: float = 1.0,
-                 enable_tf_debug: bool = False) -> None:
+                 num_cpu_devices: int = 1,
+                 enable_tf_debug: bool = False,
+                 background_saving: bool = False,
+                 trace_period: int = 0,
+                 trace_top_ops: int = 10) -> None:
         """Initialize a TensorflowManager.
 
         At this moment the graph must already exist. This method initializes
@@ -60,6 +74,18 @@ class TensorFlowManager(object):
             variable_files: List of variable files.
             gpu_allow_growth: TF to allocate incrementally, not all at once.
             per_process_gpu_memory_fraction: Limit TF memory use.
+            num_cpu_devices: Number of CPU devices of the sessions, e.g. for
+                the towers of data-parallel training.
+            background_saving: If True, the variables saved after validation
+                are copied to the host memory and written to the checkpoint
+                files in a background thread, together with the checkpoints
+                of the model parts.
+            trace_period: If positive, every training session run with this
+                period is fully traced. The Chrome timeline and the memory
+                statistics of the operations are saved to the directory set
+                by ``init_tracing`` and the slowest operations are logged.
+            trace_top_ops: How many of the slowest operations of a traced
+                run are logged.
         """
         check_argument_types()
 
@@ -67,6 +93,7 @@ class TensorFlowManager(object):
         session_cfg.inter_op_parallelism_threads = num_threads
         session_cfg.intra_op_parallelism_threads = num_threads
         session_cfg.allow_soft_placement = True  # needed for multiple GPUs
+        session_cfg.device_count["CPU"] = num_cpu_devices
         # pylint: disable=no-member
         session_cfg.gpu_options.allow_growth = gpu_allow_growth
         session_cfg.gpu_options.per_process_gpu_memory_fraction = \
@@ -77,8 +104,14 @@ class TensorFlowManager(object):
         self.saver_max_to_keep = save_n_best
         self.minimize_metric = minimize_metric
 
+        self._session_cfg = session_cfg
+        self.trace_period = trace_period
+        self.trace_top_ops = trace_top_ops
+        self._trace_dir = None  # type: Optional[str]
+        self._train_runs = 0
         self.sessions = [tf.Session(config=session_cfg)
                          for _ in range(num_sessions)]
+        self._snapshot_sessions = None  # type: Optional[List[tf.Session]]
 
         if enable_tf_debug:
             self.sessions = [tf_debug.LocalCLIDebugWrapperSession(sess)
@@ -87,9 +120,15 @@ class TensorFlowManager(object):
         init_op = tf.global_variables_initializer()
         for sess in self.sessions:
             sess.run(init_op)
+        saved_variables = [g for g in tf.global_variables()
+                           if "reward_" not in g.name]
         self.saver = tf.train.Saver(max_to_keep=self.saver_max_to_keep,
-                                    var_list=[g for g in tf.global_variables()
-                                              if "reward_" not in g.name])
+                                    var_list=saved_variables)
+
+        self._checkpoint_writer = None  # type: Optional[_CheckpointWriter]
+        if background_saving:
+            self._checkpoint_writer = _CheckpointWriter(
+                tf.global_variables(), saved_variables)
 
         if variable_files:
             if len(variable_files) != num_sessions:
@@ -145,7 +184,29 @@ class TensorFlowManager(object):
         self._best_vars_file = "{}.best".format(vars_prefix)
         self._update_best_vars(var_index=0)
 
-    def validation_hook(self, score: float, epoch: int, batch: int) -> None:
+    def init_tracing(self, trace_dir: str) -> None:
+        """Set the directory for the traces of the session runs."""
+        if self.trace_period > 0:
+            os.makedirs(trace_dir, exist_ok=True)
+            self._trace_dir = trace_dir
+
+    def validation_hook(self, score: float, epoch: int, batch: int,
+                        sessions: List[tf.Session] = None,
+                        model_parts: Iterable[ModelPart] = None) -> None:
+        """Update the best scores and save the variables if needed.
+
+        Arguments:
+            score: The validation score.
+            epoch: The epoch in which the validation was done.
+            batch: The batch after which the validation was done.
+            sessions: The sessions with the validated variables. Defaults to
+                the training sessions.
+            model_parts: Model parts whose checkpoints are saved when the
+                score is the best one so far.
+        """
+        if sessions is None:
+            sessions = self.sessions
+
         if self._is_better(score, self.best_score):
             self.best_score = score
             self.best_score_epoch = epoch
@@ -154,64 +215,195 @@ class TensorFlowManager(object):
         worst_index = self._argworst(self.saved_scores)
         worst_score = self.saved_scores[worst_index]
 
+        variable_files = []  # type: List[str]
+        update_best = None  # type: Optional[Callable[[], None]]
         if self._is_better(score, worst_score):
             # we need to save this score instead the worst score
-            worst_var_file = self.variables_files[worst_index]
-            self.save(worst_var_file)
+            variable_files = _session_files(
+                self.variables_files[worst_index], len(sessions))
             self.saved_scores[worst_index] = score
-            log("Variable file saved in {}".format(worst_var_file))
 
             # update symlink and best score index
             if self.best_score == score:
-                self._update_best_vars(worst_index)
                 self.best_score_index = worst_index
+                update_best = partial(self._update_best_vars, worst_index)
+
+        if model_parts is None or score != self.best_score:
+            model_parts = []
+
+        if self._checkpoint_writer is not None:
+            self._checkpoint_writer.write(
+                sessions, variable_files, model_parts, callback=update_best)
+        else:
+            for sess, file_name in zip(sessions, variable_files):
+                self.saver.save(sess, file_name)
+                log("Variable file saved in {}".format(file_name))
+            if update_best is not None:
+                update_best()
+            for part in model_parts:
+                for session in sessions:
+                    part.save(session)
 
+        if variable_files:
             log("Best scores saved so far: {}".format(
                 self.saved_scores))
 
+    def wait_for_saving(self) -> None:
+        """Wait until all checkpoints are written to the disk."""
+        if self._checkpoint_writer is not None:
+            self._checkpoint_writer.wait()
+
     # pylint: disable=too-many-locals
     def _run_executables(self,
                          batch,
                          executables,
-                         train) -> None:
+                         train,
+                         sessions) -> None:
         all_feedables = set()  # type: Set[Any]
         all_tensors_to_execute = {}
 
         # We might want to feed different values to each session
         # E.g. when executing only step at a time during ensembling
-        feed_dicts = [{} for _ in range(len(self.sessions))] \
+        feed_dicts = [{} for _ in range(len(sessions))] \
             # type: List[FeedDict]
 
         tensor_list_lengths = []  # type: List[int]
 
-        for executable in executables:
-            if executable.result is None:
-                (feedables,
-                 tensors_to_execute,
-                 add_feed_dicts) = executable.next_to_execute()
-                all_feedables = all_feedables.union(feedables)
-                all_tensors_to_execute[executable] = tensors_to_execute
-                if add_feed_dicts:
-                    for fdict, add_fd in zip(feed_dicts, add_feed_dicts):
-                        fdict.update(add_fd)
-                tensor_list_lengths.append(len(tensors_to_execute))
-            else:
-                tensor_list_lengths.append(0)
-
-        feed_dict = _feed_dicts(batch, all_feedables, train=train)
-
-        for fdict in feed_dicts:
-            fdict.update(feed_dict)
-
-        session_results = [sess.run(all_tensors_to_execute,
-                                    feed_dict=fd)
-                           for sess, fd in zip(self.sessions, feed_dicts)]
+        with phase("feed_dict"):
+            for executable in executables:
+                if executable.result is None:
+                    (feedables,
+                     tensors_to_execute,
+                     add_feed_dicts) = executable.next_to_execute()
+                    all_feedables = all_feedables.union(feedables)
+                    all_tensors_to_execute[executable] = tensors_to_execute
+                    if add_feed_dicts:
+                        for fdict, add_fd in zip(feed_dicts, add_feed_dicts):
+                            fdict.update(add_fd)
+                    tensor_list_lengths.append(len(tensors_to_execute))
+                else:
+                    tensor_list_lengths.append(0)
+
+            feed_dict = _feed_dicts(batch, all_feedables, train=train)
+
+            for fdict in feed_dicts:
+                fdict.update(feed_dict)
+
+        run_options = None
+        run_metadata = [None for _ in sessions]  # type: List[Any]
+        if train:
+            self._train_runs += 1
+            if (self._trace_dir is not None
+                    and self._train_runs % self.trace_period == 0):
+                run_options = tf.RunOptions(
+                    trace_level=tf.RunOptions.FULL_TRACE)
+                run_metadata = [tf.RunMetadata() for _ in sessions]
+
+        with phase("session_run"):
+            session_results = [sess.run(all_tensors_to_execute,
+                                        feed_dict=fd, options=run_options,
+                                        run_metadata=metadata)
+                               for sess, fd, metadata
+                               in zip(sessions, feed_dicts, run_metadata)]
+
+        if run_options is not None:
+            for i, metadata in enumerate(run_metadata):
+                self._save_trace(metadata, "{}.{}".format(
+                    self._train_runs, i))
 
         for executable in executables:
             if executable.result is None:
                 executable.collect_results(
                     [res[executable] for res in session_results])
 
+    def _run_data_parallel(self, batch: Dataset,
+                           executable: DataParallelTrainExecutable,
+                           sessions: List[tf.Session]) -> None:
+        """Run a training step with the batch split into shards.
+
+        Each shard is fed to one tower of the model together with its
+        relative size. The gradients of the towers are averaged and applied
+        in a single session run.
+
+        The throughput of every step is logged as debug information. When
+        the summaries are computed, the gradients of the first shard are
+        also computed in a single tower. The data-parallel efficiency of the
+        step (the time of the single tower divided by the time of the step)
+        is logged and added to the summaries with the throughput.
+        """
+        num_shards = min(executable.num_shards, len(batch))
+        shard_size = -(-len(batch) // num_shards)
+        shards = [batch.subset(start, shard_size)
+                  for start in range(0, len(batch), shard_size)]
+
+        with phase("feed_dict"):
+            feed_dict = {}  # type: FeedDict
+            for i, (coders, weight) in enumerate(
+                    zip(executable.towers, executable.weights)):
+                if i < len(shards):
+                    feed_dict.update(
+                        _feed_dicts(shards[i], coders, train=True))
+                    feed_dict[weight] = len(shards[i]) / len(batch)
+                else:
+                    # the towers left without a shard of a small batch
+                    # compute the first one and do not contribute
+                    feed_dict.update(
+                        _feed_dicts(shards[0], coders, train=True))
+                    feed_dict[weight] = 0.
+
+        _, fetches, _ = executable.next_to_execute()
+        session_results = []
+        for sess in sessions:
+            with phase("session_run"):
+                start_time = time.perf_counter()
+                result = sess.run(fetches, feed_dict=feed_dict)
+                step_time = time.perf_counter() - start_time
+            result["examples_per_second"] = len(batch) / step_time
+            message = "Data-parallel step with {} shards, {:.1f} examples/s"
+
+            if "scalar_summaries" in fetches:
+                with phase("session_run"):
+                    start_time = time.perf_counter()
+                    sess.run(executable.reference_op, feed_dict=_feed_dicts(
+                        shards[0], executable.towers[0], train=True))
+                    reference_time = time.perf_counter() - start_time
+                result["efficiency"] = reference_time / step_time
+                message += ", efficiency {:.2f}".format(result["efficiency"])
+
+            debug(message.format(len(shards), result["examples_per_second"]),
+                  label="data_parallel")
+            session_results.append(result)
+
+        executable.collect_results(session_results)
+
+    def _save_trace(self, run_metadata: tf.RunMetadata, name: str) -> None:
+        """Save the timeline and memory statistics of a traced run."""
+        assert self._trace_dir is not None
+        timeline_file = os.path.join(
+            self._trace_dir, "timeline.{}.json".format(name))
+        with open(timeline_file, "w", encoding="utf-8") as f_timeline:
+            f_timeline.write(timeline.Timeline(
+                run_metadata.step_stats).generate_chrome_trace_format(
+                    show_memory=True))
+
+        op_stats = _op_statistics(run_metadata.step_stats)
+        memory_file = os.path.join(
+            self._trace_dir, "memory.{}.json".format(name))
+        with open(memory_file, "w", encoding="utf-8") as f_memory:
+            json.dump(op_stats, f_memory, indent=1)
+
+        op_times = defaultdict(int)  # type: Dict[str, int]
+        for stats in op_stats:
+            op_times[stats["op"]] += stats["micros"]
+        total_time = max(sum(op_times.values()), 1)
+        top_ops = sorted(op_times.items(), key=lambda x: -x[1])
+
+        log("Traced session run saved to {}, slowest operations:".format(
+            timeline_file))
+        for op_name, micros in top_ops[:self.trace_top_ops]:
+            log("{:8.2f}ms {:5.1f}%  {}".format(
+                micros / 1000, 100 * micros / total_time, op_name))
+
     # pylint: disable=too-many-locals
     def execute(self,
                 dataset: Dataset,
@@ -220,26 +412,34 @@ class TensorFlowManager(object):
                 compute_losses=True,
                 summaries=True,
                 batch_size=None,
-                log_progress: int = 0) -> List[ExecutionResult]:
+                log_progress: int = 0,
+                sessions: List[tf.Session] = None) -> List[ExecutionResult]:
+        if sessions is None:
+            sessions = self.sessions
         if batch_size is None:
             batch_size = len(dataset)
         batched_dataset = dataset.batch_dataset(batch_size)
-        last_log_time = time.process_time()
+        last_log_time = time.monotonic()
 
         batch_results = [
             [] for _ in execution_scripts]  # type: List[List[ExecutionResult]]
-        for batch_id, batch in enumerate(batched_dataset):
-            if (time.process_time() - last_log_time > log_progress
+        for batch_id, batch in enumerate(
+                Profiler.iterate("data_read", batched_dataset)):
+            if (time.monotonic() - last_log_time > log_progress
                     and log_progress > 0):
                 log("Processed {} examples.".format(batch_id * batch_size))
-                last_log_time = time.process_time()
+                last_log_time = time.monotonic()
             executables = [s.get_executable(compute_losses=compute_losses,
                                             summaries=summaries,
-                                            num_sessions=len(self.sessions))
+                                            num_sessions=len(sessions))
                            for s in execution_scripts]
 
+            for executable in executables:
+                if isinstance(executable, DataParallelTrainExecutable):
+                    self._run_data_parallel(batch, executable, sessions)
+
             while not all(ex.result is not None for ex in executables):
-                self._run_executables(batch, executables, train)
+                self._run_executables(batch, executables, train, sessions)
 
             for script_list, executable in zip(batch_results, executables):
                 script_list.append(executable.result)
@@ -250,24 +450,64 @@ class TensorFlowManager(object):
 
         return collected_results
 
-    def save(self, variable_files: Union[str, List[str]]) -> None:
-        if isinstance(variable_files, str) and len(self.sessions) == 1:
-            self.saver.save(self.sessions[0], variable_files)
-            return
+    def save(self, variable_files: Union[str, List[str]],
+             sessions: List[tf.Session] = None) -> None:
+        if sessions is None:
+            sessions = self.sessions
 
-        if isinstance(variable_files, str):
-            variable_files = ["{}.{}".format(
-                variable_files, i) for i in range(len(self.sessions))]
+        variable_files = _session_files(variable_files, len(sessions))
+        for sess, file_name in zip(sessions, variable_files):
+            self.saver.save(sess, file_name)
 
-        if len(variable_files) != len(self.sessions):
-            raise Exception(
-                "Provided {} files for saving {} sessions.".format(
-                    len(variable_files), len(self.sessions)))
+    def snapshot(self) -> List[tf.Session]:
+        """Copy the current values of the variables to snapshot sessions.
 
-        for sess, file_name in zip(self.sessions, variable_files):
-            self.saver.save(sess, file_name)
+        The snapshot sessions share the graph with the training sessions, but
+        hold their own copy of the variables. They are created on the first
+        call and reused afterwards, so the returned sessions are only valid
+        until the next call of this method.
+
+        Returns:
+            List of sessions with the copy of the variables, one for each
+            training session.
+        """
+        if self._snapshot_sessions is None:
+            self._snapshot_sessions = [
+                tf.Session(config=self._session_cfg, graph=sess.graph)
+                for sess in self.sessions]
+
+        variables = tf.global_variables()
+        self.assign_variables(
+            variables, [sess.run(variables) for sess in self.sessions],
+            self._snapshot_sessions)
+
+        return self._snapshot_sessions
+
+    def assign_variables(self, variables: List[tf.Variable],
+                         values: List[List[np.ndarray]],
+                         sessions: List[tf.Session] = None) -> None:
+        """Set the values of variables in the sessions.
+
+        The values are fed to the initializers of the variables, so no
+        assign operations are added to the graph.
+
+        Arguments:
+            variables: The variables to set.
+            values: For each session, the values of the variables.
+            sessions: The sessions in which the variables are set. Defaults
+                to the training sessions.
+        """
+        if sessions is None:
+            sessions = self.sessions
+
+        initializers = [var.initializer for var in variables]
+        for sess, session_values in zip(sessions, values):
+            sess.run(initializers, feed_dict={
+                var.initial_value: value
+                for var, value in zip(variables, session_values)})
 
     def restore(self, variable_files: Union[str, List[str]]) -> None:
+        self.wait_for_saving()
         if isinstance(variable_files, str):
             variable_files = [variable_files]
         if len(variable_files) != len(self.sessions):
@@ -295,6 +535,162 @@ class TensorFlowManager(object):
             self.save(self.variables_files[0])
 
 
+def _session_files(variable_files: Union[str, List[str]],
+                   num_sessions: int) -> List[str]:
+    if isinstance(variable_files, str) and num_sessions == 1:
+        return [variable_files]
+
+    if isinstance(variable_files, str):
+        variable_files = ["{}.{}".format(
+            variable_files, i) for i in range(num_sessions)]
+
+    if len(variable_files) != num_sessions:
+        raise Exception(
+            "Provided {} files for saving {} sessions.".format(
+                len(variable_files), num_sessions))
+
+    return variable_files
+
+
+class _CheckpointWriter(object):
+    """Write checkpoints from copies of the variables in the host memory.
+
+    The values of the variables are fetched from the sessions in the calling
+    thread, the checkpoint files are written in a background thread. For
+    that, the writer keeps a copy of the variables in its own graph and
+    session placed on the CPU. At most one write is in progress at a time;
+    a new write waits for the previous one to finish.
+
+    Every checkpoint is first written under a temporary name and then moved
+    to its place, index file last, so an interrupted write never leaves
+    behind a checkpoint that looks complete.
+    """
+
+    def __init__(self, variables: List[tf.Variable],
+                 saved_variables: List[tf.Variable]) -> None:
+        self._variables = variables
+        self._graph = tf.Graph()
+
+        with self._graph.as_default(), tf.device("/cpu:0"):
+            self._copies = {
+                var.op.name: tf.get_variable(
+                    var.op.name, shape=var.get_shape(),
+                    dtype=var.dtype.base_dtype,
+                    initializer=tf.zeros_initializer(), trainable=False)
+                for var in variables}
+            self._placeholders = [
+                tf.placeholder(var.dtype.base_dtype, var.get_shape())
+                for var in variables]
+            self._assign_op = tf.group(*[
+                tf.assign(self._copies[var.op.name], placeholder)
+                for var, placeholder in zip(variables, self._placeholders)])
+            self._saver = tf.train.Saver(
+                var_list=[self._copies[var.op.name]
+                          for var in saved_variables])
+
+        self._session = tf.Session(
+            graph=self._graph, config=tf.ConfigProto(device_count={"GPU": 0}))
+        self._part_savers = {}  # type: Dict[str, tf.train.Saver]
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = None  # type: Optional[Future]
+
+    def write(self, sessions: List[tf.Session], variable_files: List[str],
+              model_parts: Iterable[ModelPart],
+              callback: Callable[[], None] = None) -> None:
+        """Copy the variables and write them in the background.
+
+        Arguments:
+            sessions: The sessions from which the variables are saved.
+            variable_files: Checkpoint files, one for each session. Can be
+                empty if only the model parts are saved.
+            model_parts: Model parts whose variables are saved to their own
+                checkpoints. They are saved from the last session.
+            callback: Function called after all the files are written.
+        """
+        parts = [(part.save_checkpoint,
+                  [var.op.name for var in part.variables])
+                 for part in model_parts if part.save_checkpoint]
+        if not variable_files and not parts:
+            return
+
+        self.wait()
+        if not variable_files:
+            sessions = sessions[-1:]
+        values = [sess.run(self._variables) for sess in sessions]
+
+        self._pending = self._executor.submit(
+            self._write, values, variable_files, parts, callback)
+
+    def wait(self) -> None:
+        """Wait for the running write and re-raise its exceptions."""
+        if self._pending is not None:
+            pending = self._pending
+            self._pending = None
+            pending.result()
+
+    def _assign(self, values: List[np.ndarray]) -> None:
+        self._session.run(self._assign_op, feed_dict=dict(
+            zip(self._placeholders, values)))
+
+    def _write(self, values: List[List[np.ndarray]],
+               variable_files: List[str], parts: List[Any],
+               callback: Optional[Callable[[], None]]) -> None:
+        for session_values, file_name in zip(values, variable_files):
+            self._assign(session_values)
+            _save_atomically(self._saver, self._session, file_name)
+            log("Variable file saved in {}".format(file_name))
+
+        if not variable_files:
+            self._assign(values[-1])
+
+        for checkpoint, var_names in parts:
+            if checkpoint not in self._part_savers:
+                with self._graph.as_default():
+                    self._part_savers[checkpoint] = tf.train.Saver(
+                        var_list=[self._copies[name] for name in var_names])
+            _save_atomically(
+                self._part_savers[checkpoint], self._session, checkpoint)
+            log("Variables saved to '{}'".format(checkpoint))
+
+        if callback is not None:
+            callback()
+
+
+def _save_atomically(saver: tf.train.Saver, session: tf.Session,
+                     checkpoint: str) -> None:
+    tmp_checkpoint = "{}.tmp".format(checkpoint)
+    saver.save(session, tmp_checkpoint, write_meta_graph=False,
+               write_state=False)
+
+    # without the index file, the old checkpoint is never mixed with new data
+    if os.path.exists(checkpoint + ".index"):
+        os.remove(checkpoint + ".index")
+
+    tmp_files = glob.glob(glob.escape(tmp_checkpoint) + ".*")
+    for tmp_file in sorted(tmp_files, key=lambda f: f.endswith(".index")):
+        os.replace(tmp_file, checkpoint + tmp_file[len(tmp_checkpoint):])
+
+
+def _op_statistics(step_stats) -> List[Dict[str, Any]]:
+    """Collect time and memory used by the operations of a traced run."""
+    op_stats = []
+    for dev_stats in step_stats.dev_stats:
+        for node_stats in dev_stats.node_stats:
+            op_stats.append({
+                "device": dev_stats.device,
+                "op": node_stats.node_name,
+                "micros": node_stats.all_end_rel_micros,
+                "peak_bytes": sum(mem.peak_bytes
+                                  for mem in node_stats.memory),
+                "total_bytes": sum(mem.total_bytes
+                                   for mem in node_stats.memory),
+                "output_bytes": sum(
+                    out.tensor_description.allocation_description
+                    .requested_bytes for out in node_stats.output)})
+
+    return op_stats
+
+
 def _feed_dicts(dataset, coders, train=False):
     """Feed the coders with data from dataset.
 
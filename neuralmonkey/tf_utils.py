@@ -1,4 +1,5 @@
 """A set of helper functions for TensorFlow."""
+from contextlib import contextmanager
 from typing import Callable, Iterable, List, Optional, Tuple
 import numpy as np
 import tensorflow as tf
@@ -9,6 +10,13 @@ from neuralmonkey.logging import debug, debug_enabled
 ShapeSpec = List[int]
 # pylint: enable=invalid-name
 
+PRECISIONS = {"float32": tf.float32,
+              "float16": tf.float16}
+
+# The floating point type of the model computation. Use ``set_precision`` to
+# change it before the model is built.
+_FLOAT_DTYPE = tf.float32
+
 
 def _get_current_experiment():
     # This is needed to avoid circular imports.
@@ -32,6 +40,14 @@ def get_initializer(var_name: str,
     return _get_current_experiment().get_initializer(full_name, default)
 
 
+def records_attention_histories() -> bool:
+    """Return whether the attention objects should record their histories.
+
+    This should only be called during model building.
+    """
+    return _get_current_experiment().record_attention_histories
+
+
 def get_variable(name: str,
                  shape: ShapeSpec = None,
                  dtype: tf.DType = None,
@@ -51,6 +67,72 @@ def get_variable(name: str,
         **kwargs)
 
 
+def set_precision(precision: str) -> None:
+    """Set the floating point type of the model computation.
+
+    This should only be called before model building.
+
+    Arguments:
+        precision: One of the keys of ``PRECISIONS``.
+    """
+    global _FLOAT_DTYPE  # pylint: disable=global-statement
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision '{}', use one of {}".format(
+            precision, ", ".join(sorted(PRECISIONS))))
+    _FLOAT_DTYPE = PRECISIONS[precision]
+
+
+def float_dtype() -> tf.DType:
+    """Return the floating point type of the model computation.
+
+    Use it instead of ``tf.float32`` for placeholders and other tensors that
+    enter the computation of the model.
+    """
+    return _FLOAT_DTYPE
+
+
+def precision_getter(getter: Callable, name: str, *args,
+                     **kwargs) -> tf.Tensor:
+    """Keep float32 variables and cast them to the computation type.
+
+    A custom getter for ``tf.variable_scope``. Floating point variables are
+    always created (and saved) in float32. When the model is computed in
+    a reduced precision, the getter returns their value cast to the
+    computation type, so the gradients are still applied to the float32
+    variables.
+    """
+    dtype = kwargs.get("dtype")
+    if (_FLOAT_DTYPE == tf.float32
+            or dtype is None or not dtype.is_floating):
+        return getter(name, *args, **kwargs)
+
+    kwargs["dtype"] = tf.float32
+    variable = getter(name, *args, **kwargs)
+    with outside_control_flow():
+        return tf.cast(variable, _FLOAT_DTYPE)
+
+
+@contextmanager
+def outside_control_flow():
+    """Create the operations outside of the current while loop or condition.
+
+    Custom getters use it for the tensors they return instead of variables.
+    Such tensors are often cached (e.g., in a ``tensor`` property) and used
+    in other loops of the model, which is only possible for tensors from
+    outside of any loop.
+    """
+    graph = tf.get_default_graph()
+    # pylint: disable=protected-access
+    context = graph._get_control_flow_context()
+    graph._set_control_flow_context(None)
+    try:
+        with tf.control_dependencies(None):
+            yield
+    finally:
+        graph._set_control_flow_context(context)
+    # pylint: enable=protected-access
+
+
 def tf_print(tensor: tf.Tensor,
              message: str = None,
              debug_label: str = None) -> tf.Tensor:
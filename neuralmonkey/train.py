@@ -5,13 +5,18 @@ import neuralmonkey.checkpython
 # pylint: enable=unused-import, wrong-import-order
 
 import argparse
+import multiprocessing
+from multiprocessing.connection import Listener
 import os
 import shlex
 from shutil import copyfile
 import sys
+import threading
 import traceback
+from typing import List
 
 from neuralmonkey.logging import log, debug
+from neuralmonkey.distributed import Address, ModelAveraging, averaging_server
 from neuralmonkey.experiment import Experiment
 
 
@@ -63,7 +68,10 @@ def _main() -> None:
         exit(0)
 
     try:
-        exp.train()
+        if exp.config.args.workers > 1:
+            _train_distributed(exp, args.config, args.config_changes)
+        else:
+            exp.train()
     except KeyboardInterrupt:
         raise
     except Exception:  # pylint: disable=broad-except
@@ -71,6 +79,64 @@ def _main() -> None:
         exit(1)
 
 
+def _train_distributed(exp: Experiment, config_path: str,
+                       config_changes: List[str]) -> None:
+    """Train the experiment in worker processes with model averaging.
+
+    The worker 0 writes to the experiment directory, the other workers to
+    its subdirectories ``worker.N``.
+    """
+    num_workers = exp.config.args.workers
+    output = exp.config.args.output
+
+    authkey = os.urandom(16)
+    listener = Listener(("localhost", 0), authkey=authkey)
+    server = threading.Thread(target=averaging_server,
+                              args=(listener, num_workers), daemon=True)
+    server.start()
+
+    log("Starting {} training workers.".format(num_workers))
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for worker_id in range(num_workers):
+        worker_output = output
+        if worker_id > 0:
+            worker_output = os.path.join(output, "worker.{}".format(worker_id))
+        # the output directory may contain variables like {TIME}
+        worker_changes = config_changes + [
+            "main.output=\"{}\"".format(worker_output)]
+
+        worker = context.Process(
+            target=_train_worker,
+            args=(config_path, worker_changes, worker_id, num_workers,
+                  exp.config.args.averaging_period, listener.address,
+                  authkey))
+        worker.start()
+        workers.append(worker)
+
+    for worker in workers:
+        worker.join()
+
+    failed = [i for i, worker in enumerate(workers) if worker.exitcode != 0]
+    if failed:
+        raise RuntimeError("Training workers {} failed.".format(failed))
+
+    server.join()
+    listener.close()
+
+
+def _train_worker(config_path: str, config_changes: List[str],
+                  worker_id: int, num_workers: int, averaging_period: int,
+                  address: Address, authkey: bytes) -> None:
+    exp = Experiment(config_path=config_path,
+                     config_changes=config_changes,
+                     train_mode=True,
+                     overwrite_output_dir=True)
+    averaging = ModelAveraging(address, authkey, worker_id, num_workers,
+                               averaging_period)
+    exp.train(averaging=averaging)
+
+
 def main() -> None:
     try:
         _main()
@@ -30,7 +30,11 @@ class CrossEntropyTrainer(GenericTrainer):
                  clip_norm: float = None,
                  optimizer: tf.train.Optimizer = None,
                  var_scopes: List[str] = None,
-                 var_collection: str = None) -> None:
+                 var_collection: str = None,
+                 accumulation_steps: int = 1,
+                 num_shards: int = 1,
+                 tower_devices: List[str] = None,
+                 loss_scale: float = 1.0) -> None:
         check_argument_types()
 
         if decoder_weights is None:
@@ -52,4 +56,8 @@ class CrossEntropyTrainer(GenericTrainer):
             clip_norm=clip_norm,
             optimizer=optimizer,
             var_scopes=var_scopes,
-            var_collection=var_collection)
+            var_collection=var_collection,
+            accumulation_steps=accumulation_steps,
+            num_shards=num_shards,
+            tower_devices=tower_devices,
+            loss_scale=loss_scale)
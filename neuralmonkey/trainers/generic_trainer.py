@@ -1,4 +1,5 @@
-from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+import copy
 import re
 
 import tensorflow as tf
@@ -6,6 +7,7 @@ import tensorflow as tf
 from neuralmonkey.model.model_part import ModelPart
 from neuralmonkey.runners.base_runner import (
     Executable, ExecutionResult, NextExecute)
+from neuralmonkey.tf_utils import outside_control_flow
 
 # pylint: disable=invalid-name
 Gradients = List[Tuple[tf.Tensor, tf.Variable]]
@@ -19,6 +21,12 @@ Objective = NamedTuple("Objective",
 
 BIAS_REGEX = re.compile(r"[Bb]ias")
 
+# suffix of the attributes caching the values of the tensor properties,
+# see neuralmonkey.decorators.tensor
+_CACHE_SUFFIX = "_cached_placeholder"
+
+_PLACEHOLDER_TYPES = ["Placeholder", "PlaceholderWithDefault"]
+
 
 # pylint: disable=too-few-public-methods,too-many-locals,too-many-arguments
 class GenericTrainer(object):
@@ -30,7 +38,31 @@ class GenericTrainer(object):
                  clip_norm: float = None,
                  optimizer: tf.train.Optimizer = None,
                  var_scopes: List[str] = None,
-                 var_collection: str = None) -> None:
+                 var_collection: str = None,
+                 accumulation_steps: int = 1,
+                 num_shards: int = 1,
+                 tower_devices: List[str] = None,
+                 loss_scale: float = 1.0) -> None:
+
+        if accumulation_steps < 1:
+            raise ValueError("accumulation_steps must be positive")
+        if num_shards < 1:
+            raise ValueError("num_shards must be positive")
+        if loss_scale <= 0:
+            raise ValueError("loss_scale must be positive")
+        if accumulation_steps > 1 and num_shards > 1:
+            raise ValueError("Gradient accumulation cannot be combined with "
+                             "data-parallel training")
+        if num_shards > 1 and any(o.gradients is not None
+                                  for o in objectives):
+            raise ValueError("Objectives with explicit gradients cannot be "
+                             "trained data-parallel")
+        if tower_devices is None:
+            tower_devices = [None for _ in range(num_shards - 1)]
+        if num_shards > 1 and len(tower_devices) != num_shards - 1:
+            raise ValueError("There must be num_shards - 1 tower_devices")
+
+        self.num_shards = num_shards
 
         if var_collection is None:
             var_collection = tf.GraphKeys.TRAINABLE_VARIABLES
@@ -74,8 +106,18 @@ class GenericTrainer(object):
                 l2_value = sum(tf.reduce_sum(v ** 2) for v in regularizable)
                 l2_cost = l2_weight * l2_value if l2_weight > 0 else 0.0
 
+            if num_shards > 1:
+                tower_losses = self._build_towers(objectives, tower_devices)
+                # losses averaged over the shards of the batch
+                objective_losses = [
+                    sum(weight * tf.to_float(losses[i]) for weight, losses
+                        in zip(self.shard_weights, tower_losses))
+                    for i in range(len(objectives))]
+            else:
+                objective_losses = [o.loss for o in objectives]
+
             # unweighted losses for fetching
-            self.losses = [o.loss for o in objectives] + [l1_value, l2_value]
+            self.losses = objective_losses + [l1_value, l2_value]
             tf.summary.scalar("train_l1", l1_value,
                               collections=["summary_train"])
             tf.summary.scalar("train_l2", l2_value,
@@ -86,12 +128,16 @@ class GenericTrainer(object):
             update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS)
             with tf.control_dependencies(update_ops):
                 with tf.name_scope("gradient_collection"):
-                    differentiable_loss_sum = sum(
-                        (o.weight if o.weight is not None else 1) * o.loss
-                        for o in objectives
-                        if o.gradients is None) + l1_cost + l2_cost
-                    implicit_gradients = self._get_gradients(
-                        differentiable_loss_sum)
+                    differentiable_loss_sum = _differentiable_loss(
+                        objectives, objective_losses) + l1_cost + l2_cost
+
+                    if num_shards > 1:
+                        implicit_gradients = self._tower_gradients(
+                            objectives, tower_losses, l1_cost + l2_cost,
+                            loss_scale)
+                    else:
+                        implicit_gradients = self._get_gradients(
+                            differentiable_loss_sum, loss_scale)
 
                     # objectives that have their gradients explictly computed
                     other_gradients = [
@@ -108,17 +154,16 @@ class GenericTrainer(object):
                                       differentiable_loss_sum,
                                       collections=["summary_train"])
 
-                if clip_norm:
-                    assert clip_norm > 0.0
-                    gradients = [(tf.clip_by_norm(grad, clip_norm), var)
-                                 for grad, var in gradients
-                                 if grad is not None]
-
                 self.all_coders = set.union(*(obj.decoder.get_dependencies()
                                               for obj in objectives))
 
-                self.train_op = self.optimizer.apply_gradients(
-                    gradients, global_step=step)
+                if accumulation_steps > 1:
+                    self.train_op = self._accumulate_gradients(
+                        gradients, accumulation_steps, clip_norm, step)
+                else:
+                    self.train_op = self.optimizer.apply_gradients(
+                        _clip_gradients(gradients, clip_norm),
+                        global_step=step)
 
             for grad, var in gradients:
                 if grad is not None:
@@ -131,15 +176,169 @@ class GenericTrainer(object):
             self.scalar_summaries = tf.summary.merge(
                 tf.get_collection("summary_train"))
 
-    def _get_gradients(self, tensor: tf.Tensor) -> Gradients:
-        gradient_list = self.optimizer.compute_gradients(tensor, self.var_list)
+    def _get_gradients(self, tensor: tf.Tensor,
+                       loss_scale: float = 1.0) -> Gradients:
+        # static loss scaling keeps small float16 gradients from
+        # vanishing, the gradients are unscaled in float32
+        if loss_scale != 1.0:
+            return _scale_gradients(
+                self._get_gradients(tensor * loss_scale), 1. / loss_scale)
+
+        # the gradients of each tower are computed on its device
+        gradient_list = self.optimizer.compute_gradients(
+            tensor, self.var_list,
+            colocate_gradients_with_ops=self.num_shards > 1)
         return gradient_list
 
+    def _build_towers(self, objectives: List[Objective],
+                      devices: List[Optional[str]]) -> List[List[tf.Tensor]]:
+        """Build the towers computing the losses on the shards of a batch.
+
+        The first tower is the model itself. The other ones are built from
+        replicas of the model parts the objectives depend on, which share
+        the variables of the model (see ``_replicate``). Each tower has a
+        placeholder for the relative size of its shard of the batch.
+
+        The gradients of the first tower alone are computed separately as
+        ``reference_op``. Their time is the reference for the data-parallel
+        efficiency of the training steps.
+
+        Arguments:
+            objectives: The objectives computed by the model itself. Their
+                losses must be tensor properties of their decoders.
+            devices: The devices of the replicated towers.
+
+        Returns:
+            The losses of the objectives in each of the towers.
+        """
+        parts = set.union(*(o.decoder.get_dependencies()
+                            for o in objectives))
+        self.towers = [parts]  # type: List[Set[ModelPart]]
+        tower_losses = [[o.loss for o in objectives]]
+
+        # the summaries are taken from the first tower
+        summaries = tf.get_collection_ref("summary_train")
+        first_tower_summaries = list(summaries)
+
+        for device in devices:
+            with tf.device(device):
+                replicas = _replicate(parts)
+                tower_losses.append([
+                    _replica_tensor(o.decoder, o.loss, replicas[o.decoder])
+                    for o in objectives])
+            self.towers.append(set(replicas.values()))
+        summaries[:] = first_tower_summaries
+
+        self.shard_weights = [tf.placeholder(tf.float32, [], "shard_weight")
+                              for _ in self.towers]
+
+        reference_gradients = tf.gradients(
+            _differentiable_loss(objectives, tower_losses[0]), self.var_list)
+        self.reference_op = tf.group(*[
+            grad.values if isinstance(grad, tf.IndexedSlices) else grad
+            for grad in reference_gradients if grad is not None])
+
+        return tower_losses
+
+    def _tower_gradients(self, objectives: List[Objective],
+                         tower_losses: List[List[tf.Tensor]],
+                         regularization: Any,
+                         loss_scale: float) -> Gradients:
+        """Average the gradients of the towers weighted by the shard sizes.
+
+        The gradients of the regularization are computed only once.
+        """
+        gradients_list = [
+            _scale_gradients(
+                self._get_gradients(
+                    _differentiable_loss(objectives, losses), loss_scale),
+                weight)
+            for losses, weight in zip(tower_losses, self.shard_weights)]
+
+        if isinstance(regularization, tf.Tensor):
+            gradients_list.append(
+                self._get_gradients(regularization, loss_scale))
+
+        return _sum_gradients(gradients_list)
+
+    def _accumulate_gradients(self, gradients: Gradients,
+                              accumulation_steps: int,
+                              clip_norm: Optional[float],
+                              step: tf.Variable) -> tf.Operation:
+        """Accumulate the gradients and apply them every few steps.
+
+        The gradients are summed in non-trainable variables. Every
+        ``accumulation_steps``-th run, the averaged sum is clipped and applied
+        (which also increments the global step) and the accumulators are
+        reset. The slots of the optimizer are created beforehand, so that
+        they are not initialized in the condition.
+
+        Returns:
+            The operation to run in every training step.
+        """
+        gradients = [(grad, var) for grad, var in gradients
+                     if grad is not None]
+
+        with tf.name_scope("gradient_accumulation"):
+            # variables must not depend on the update ops
+            with tf.control_dependencies(None):
+                accumulators = [
+                    tf.Variable(tf.zeros(var.get_shape(),
+                                         dtype=var.dtype.base_dtype),
+                                trainable=False, name="accumulator")
+                    for _, var in gradients]
+                counter = tf.Variable(0, trainable=False, name="counter")
+
+            accumulate_ops = []
+            for accumulator, (grad, _) in zip(accumulators, gradients):
+                if isinstance(grad, tf.IndexedSlices):
+                    accumulate_ops.append(tf.scatter_add(
+                        accumulator, grad.indices, grad.values))
+                else:
+                    accumulate_ops.append(tf.assign_add(accumulator, grad))
+
+            with tf.control_dependencies(accumulate_ops):
+                count = tf.assign_add(counter, 1)
+
+            # the optimizer variables (e.g., the moments of Adam) must be
+            # created outside of the condition which applies the gradients
+            with outside_control_flow():
+                # pylint: disable=protected-access
+                self.optimizer._create_slots([var for _, var in gradients])
+                # pylint: enable=protected-access
+
+            def apply_accumulated() -> tf.Operation:
+                averaged = [(accumulator / accumulation_steps, var)
+                            for accumulator, (_, var)
+                            in zip(accumulators, gradients)]
+                apply_op = self.optimizer.apply_gradients(
+                    _clip_gradients(averaged, clip_norm), global_step=step)
+
+                with tf.control_dependencies([apply_op]):
+                    return tf.group(*[
+                        tf.assign(accumulator, tf.zeros_like(accumulator))
+                        for accumulator in accumulators])
+
+            return tf.cond(tf.equal(count % accumulation_steps, 0),
+                           apply_accumulated, tf.no_op)
+
     def get_executable(
             self, compute_losses=True, summaries=True,
             num_sessions=1) -> Executable:
         assert compute_losses
 
+        if self.num_shards > 1:
+            return DataParallelTrainExecutable(
+                self.all_coders,
+                num_sessions,
+                self.train_op,
+                self.losses,
+                self.scalar_summaries if summaries else None,
+                self.histogram_summaries if summaries else None,
+                self.towers,
+                self.shard_weights,
+                self.reference_op)
+
         return TrainExecutable(self.all_coders,
                                num_sessions,
                                self.train_op,
@@ -148,6 +347,109 @@ class GenericTrainer(object):
                                self.histogram_summaries if summaries else None)
 
 
+def _differentiable_loss(objectives: List[Objective],
+                         losses: List[tf.Tensor]) -> tf.Tensor:
+    """Sum the weighted losses of the objectives without own gradients.
+
+    The losses of reduced-precision models are summed in float32.
+    """
+    return sum((o.weight if o.weight is not None else 1) * tf.to_float(loss)
+               for o, loss in zip(objectives, losses)
+               if o.gradients is None)
+
+
+def _replicate(parts: Set[ModelPart]) -> Dict[ModelPart, ModelPart]:
+    """Create replicas of model parts for a new tower of the model.
+
+    A replica is a shallow copy of a model part which reuses its variables,
+    but has its own placeholders and builds its tensors anew, because the
+    cached values of the ``tensor`` properties are dropped. The references
+    to the other replicated parts are replaced by their replicas.
+
+    The model parts must keep the tensors which depend on the fed data
+    either in the ``tensor`` properties or in placeholder attributes. Other
+    attributes with such tensors (e.g., a mask computed in the constructor)
+    would be shared by the towers, so they raise an error.
+    """
+    replicas = {part: copy.copy(part) for part in parts}
+
+    def replicate_value(value: Any, part: ModelPart, attribute: str) -> Any:
+        if isinstance(value, ModelPart):
+            return replicas.get(value, value)
+        if isinstance(value, tf.Tensor):
+            name = value.op.name.rpartition("/")[2]
+            if value.op.type == "Placeholder":
+                return tf.placeholder(value.dtype, value.get_shape(), name)
+            if value.op.type == "PlaceholderWithDefault":
+                return tf.placeholder_with_default(
+                    value.op.inputs[0], value.get_shape(), name)
+            if _depends_on_placeholders(value):
+                raise ValueError(
+                    "Model part {} keeps tensor {} computed from the fed "
+                    "data in attribute '{}'. It cannot be replicated for "
+                    "data-parallel training, compute the tensor in a tensor "
+                    "property instead.".format(part.name, value.name,
+                                               attribute))
+        # pylint: disable=unidiomatic-typecheck
+        if type(value) in [list, tuple]:
+            return type(value)(replicate_value(item, part, attribute)
+                               for item in value)
+        return value
+
+    for part, replica in replicas.items():
+        with part.use_scope():
+            for name, value in vars(part).items():
+                if name.endswith(_CACHE_SUFFIX):
+                    delattr(replica, name)
+                else:
+                    setattr(replica, name,
+                            replicate_value(value, part, name))
+
+        # pylint: disable=protected-access
+        with tf.variable_scope(part._variable_scope, reuse=True) as scope:
+            replica._variable_scope = scope
+        # pylint: enable=protected-access
+
+    return replicas
+
+
+def _depends_on_placeholders(tensor: tf.Tensor) -> bool:
+    """Check whether a tensor is computed from some placeholders."""
+    visited = {tensor.op}
+    stack = [tensor.op]
+    while stack:
+        operation = stack.pop()
+        if operation.type in _PLACEHOLDER_TYPES:
+            return True
+        for input_tensor in operation.inputs:
+            if input_tensor.op not in visited:
+                visited.add(input_tensor.op)
+                stack.append(input_tensor.op)
+    return False
+
+
+def _replica_tensor(part: ModelPart, value: tf.Tensor,
+                    replica: ModelPart) -> tf.Tensor:
+    """Get the tensor of a replica corresponding to a tensor of the part."""
+    for name, cached_value in vars(part).items():
+        if cached_value is value and name.endswith(_CACHE_SUFFIX):
+            return getattr(replica, name[1:-len(_CACHE_SUFFIX)])
+
+    raise ValueError(
+        "Tensor {} is not a tensor property of model part {}, it cannot be "
+        "computed in a replica of the model".format(value.name, part.name))
+
+
+def _clip_gradients(gradients: Gradients,
+                    clip_norm: Optional[float]) -> Gradients:
+    if not clip_norm:
+        return gradients
+
+    assert clip_norm > 0.0
+    return [(tf.clip_by_norm(grad, clip_norm), var)
+            for grad, var in gradients if grad is not None]
+
+
 def _sum_gradients(gradients_list: List[Gradients]) -> Gradients:
     summed_dict = {}  # type: Dict[tf.Variable, tf.Tensor]
     for gradients in gradients_list:
@@ -155,8 +457,16 @@ def _sum_gradients(gradients_list: List[Gradients]) -> Gradients:
             if tensor is not None:
                 if var not in summed_dict:
                     summed_dict[var] = tensor
+                elif (isinstance(tensor, tf.IndexedSlices)
+                      and isinstance(summed_dict[var], tf.IndexedSlices)):
+                    summed = summed_dict[var]
+                    summed_dict[var] = tf.IndexedSlices(
+                        tf.concat([summed.values, tensor.values], 0),
+                        tf.concat([summed.indices, tensor.indices], 0),
+                        summed.dense_shape)
                 else:
-                    summed_dict[var] += tensor
+                    summed_dict[var] = (tf.convert_to_tensor(summed_dict[var])
+                                        + tf.convert_to_tensor(tensor))
     return [(tensor, var) for var, tensor in summed_dict.items()]
 
 
@@ -165,7 +475,11 @@ def _scale_gradients(gradients: Gradients,
 
     result = []  # type: Gradients
     for tensor, var in gradients:
-        if weight is not None and tensor is not None:
+        if weight is not None and isinstance(tensor, tf.IndexedSlices):
+            result.append((tf.IndexedSlices(
+                weight * tensor.values, tensor.indices, tensor.dense_shape),
+                           var))
+        elif weight is not None and tensor is not None:
             result.append((weight * tensor, var))
         else:
             result.append((tensor, var))
@@ -217,3 +531,46 @@ class TrainExecutable(Executable):
             scalar_summaries=scalar_summaries,
             histogram_summaries=histogram_summaries,
             image_summaries=None)
+
+
+class DataParallelTrainExecutable(TrainExecutable):
+    """Training step computing the gradients on shards of the batch.
+
+    The TensorFlow manager feeds each shard of the batch to the model parts
+    of one of the towers together with the relative size of the shard. The
+    gradients of the towers are averaged in the graph and applied by the
+    training operation in a single session run.
+
+    The manager also measures the throughput of the step and, when the
+    summaries are computed, its efficiency: the time of the reference
+    operation, which computes the gradients of the first shard in a single
+    tower, divided by the time of the step. The measures are added to the
+    summaries.
+    """
+
+    def __init__(self, all_coders, num_sessions, train_op, losses,
+                 scalar_summaries, histogram_summaries, towers, weights,
+                 reference_op):
+        TrainExecutable.__init__(self, all_coders, num_sessions, train_op,
+                                 losses, scalar_summaries,
+                                 histogram_summaries)
+        self.towers = towers
+        self.weights = weights
+        self.reference_op = reference_op
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.towers)
+
+    def collect_results(self, results: List[Dict]) -> None:
+        TrainExecutable.collect_results(self, results)
+
+        if self.result.scalar_summaries is not None:
+            summary = tf.Summary()
+            summary.ParseFromString(self.result.scalar_summaries)
+            for name in ["examples_per_second", "efficiency"]:
+                summary.value.add(
+                    tag="data_parallel_{}".format(name),
+                    simple_value=sum(res[name] for res in results)
+                    / len(results))
+            self.result = self.result._replace(scalar_summaries=summary)
@@ -6,19 +6,25 @@ can be used to obtain a Vocabulary instance.
 # pylint: disable=too-many-lines
 
 import collections
+import collections.abc
+import hashlib
+import heapq
 import json
+import multiprocessing
 import os
 import random
+import zlib
+from itertools import islice
 
 # pylint: disable=unused-import
-from typing import List, Optional, Tuple, Dict, Union
+from typing import Iterable, Iterator, List, Optional, Tuple, Dict, Union
 # pylint: enable=unused-import
 
 import numpy as np
 from typeguard import check_argument_types
 
 from neuralmonkey.logging import log, warn
-from neuralmonkey.dataset import Dataset, LazyDataset
+from neuralmonkey.dataset import Dataset
 
 PAD_TOKEN = "<pad>"
 START_TOKEN = "<s>"
@@ -181,14 +187,151 @@ def from_nematus_json(path: str, max_size: int = None,
     return vocabulary
 
 
-# pylint: disable=too-many-arguments
+def from_binary(path: str) -> "Vocabulary":
+    """Load a vocabulary stored by :py:meth:`Vocabulary.save_binary`.
+
+    The file is memory-mapped and the words are decoded only when they are
+    looked up. The vocabulary is converted to the usual in-memory
+    representation only when it is modified.
+
+    Arguments:
+        path: The path to the binary vocabulary file.
+
+    Returns:
+        The new Vocabulary instance.
+    """
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    if data[:len(_BINARY_MAGIC)].tobytes() != _BINARY_MAGIC:
+        raise ValueError(
+            "File {} is not a binary vocabulary file.".format(path))
+
+    header_start = len(_BINARY_MAGIC)
+    num_words, table_size, blob_len, alphabet_len, correct_counts = (
+        int(x) for x in data[header_start:header_start + 40].view("<u8"))
+    unk_sample_prob = float(
+        data[header_start + 40:header_start + 48].view("<f8")[0])
+
+    parts = []
+    position = header_start + 48
+    for length, dtype in [(8 * (num_words + 1), "<i8"), (8 * num_words, "<i8"),
+                          (8 * table_size, "<i8"), (blob_len, np.uint8),
+                          (alphabet_len, np.uint8)]:
+        parts.append(data[position:position + length].view(dtype))
+        position += length + (-length % 8)
+    offsets, counts, table, blob, alphabet = parts
+
+    vocabulary = Vocabulary(unk_sample_prob=unk_sample_prob)
+    words = _MappedWords(blob, offsets)
+    word_index = _MappedWordIndex(words, table)
+    vocabulary.index_to_word = words  # type: ignore
+    vocabulary.word_to_index = word_index  # type: ignore
+    vocabulary.word_count = _MappedWordCounts(  # type: ignore
+        word_index, counts)
+    vocabulary.alphabet = set(json.loads(alphabet.tobytes().decode("utf-8")))
+    vocabulary.correct_counts = bool(correct_counts)
+
+    log("Binary vocabulary loaded, containing {} words"
+        .format(len(vocabulary)))
+    vocabulary.log_sample()
+    return vocabulary
+
+
+_BINARY_MAGIC = b"NMVOCAB1"
+
+
+class _MappedWords(collections.abc.Sequence):
+    """Words of a binary vocabulary, decoded on access."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray) -> None:
+        self.blob = blob
+        self.offsets = offsets
+
+    def encoded(self, index: int) -> bytes:
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Word index out of range: {}".format(index))
+        return self.encoded(index).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class _MappedWordIndex(collections.abc.Mapping):
+    """Mapping from words to indices using the stored hash table."""
+
+    def __init__(self, words: _MappedWords, table: np.ndarray) -> None:
+        self.words = words
+        self.table = table
+        self.mask = len(table) - 1
+
+    def find(self, word: str) -> int:
+        """Get the index of the word or -1 if it is not present."""
+        encoded = word.encode("utf-8")
+        slot = zlib.crc32(encoded) & self.mask
+        while True:
+            index = int(self.table[slot])
+            if index < 0 or self.words.encoded(index) == encoded:
+                return index
+            slot = (slot + 1) & self.mask
+
+    def __getitem__(self, word: str) -> int:
+        index = self.find(word)
+        if index < 0:
+            raise KeyError(word)
+        return index
+
+    def __contains__(self, word: object) -> bool:
+        return isinstance(word, str) and self.find(word) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.words)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+class _MappedWordCounts(collections.abc.Mapping):
+    """Mapping from words to their counts in a binary vocabulary."""
+
+    def __init__(self, word_index: _MappedWordIndex,
+                 counts: np.ndarray) -> None:
+        self.word_index = word_index
+        self.counts = counts
+
+    def __getitem__(self, word: str) -> int:
+        return int(self.counts[self.word_index[word]])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.word_index)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
+# pylint: disable=too-many-arguments,too-many-locals
 # helper function, this number of parameters is needed
 def from_dataset(datasets: List[Dataset], series_ids: List[str], max_size: int,
                  save_file: str = None, overwrite: bool = False,
                  min_freq: Optional[int] = None,
-                 unk_sample_prob: float = 0.5) -> "Vocabulary":
+                 unk_sample_prob: float = 0.5,
+                 num_workers: int = 1,
+                 chunk_size: int = 10000,
+                 max_tracked_words: int = None) -> "Vocabulary":
     """Load a vocabulary from a dataset with an option to save it.
 
+    The words are counted in a streaming fashion, chunk by chunk, so the
+    series do not need to be held in memory at once. This is useful with lazy
+    datasets.
+
     Arguments:
         datasets: A list of datasets from which to create the vocabulary
         series_ids: A list of ids of series of the datasets that should be used
@@ -200,19 +343,27 @@ def from_dataset(datasets: List[Dataset], series_ids: List[str], max_size: int,
         min_freq: Do not include words with frequency smaller than this.
         unk_sample_prob: The probability with which to sample unks out of
                          words with frequency 1. Defaults to 0.5.
+        num_workers: Number of processes counting the chunks of the data.
+        chunk_size: Number of sentences in a chunk.
+        max_tracked_words: If specified, the words are counted approximately
+                           using a count-min sketch and only this many most
+                           frequent candidate words are tracked, which bounds
+                           the memory needed for the counting. It should be
+                           set well above ``max_size``. The alphabet then
+                           contains only the characters of the tracked
+                           words.
 
     Returns:
         The new Vocabulary instance.
     """
     check_argument_types()
 
-    vocabulary = Vocabulary(unk_sample_prob=unk_sample_prob)
-    vocabulary.correct_counts = True
+    if max_tracked_words is None:
+        counter = collections.Counter()  # type: _WordCounter
+    else:
+        counter = _ApproximateCounter(max_tracked_words)
 
     for dataset in datasets:
-        if isinstance(dataset, LazyDataset):
-            warn("Inferring vocabulary from lazy dataset!")
-
         for series_id in series_ids:
             if not dataset.has_series(series_id):
                 warn("Data series '{}' not present in the dataset"
@@ -220,10 +371,32 @@ def from_dataset(datasets: List[Dataset], series_ids: List[str], max_size: int,
 
             series = dataset.maybe_get_series(series_id)
             if series is not None:
-                vocabulary.add_tokenized_text(
-                    [token for sent in series for token in sent])
+                for chunk_counts in _count_chunks(
+                        series, chunk_size, num_workers):
+                    counter.update(chunk_counts)
 
-    vocabulary.truncate(max_size)
+    vocabulary = Vocabulary(unk_sample_prob=unk_sample_prob)
+    vocabulary.correct_counts = True
+
+    # Select the most frequent words before building the vocabulary. Ties
+    # are broken the same way as in Vocabulary.truncate.
+    word_counts = counter.items()
+    words_to_keep = set(
+        word for word, _ in heapq.nlargest(
+            max_size - len(_SPECIAL_TOKENS),
+            ((w, c) for w, c in word_counts if not _is_special_token(w)),
+            key=lambda p: (p[1], p[0])))
+
+    for word, count in word_counts:
+        if word in words_to_keep or _is_special_token(word):
+            vocabulary.add_word(word, count)
+        else:
+            # the alphabet includes the characters of the dropped words
+            vocabulary.add_characters(word)
+
+    if len(vocabulary) < max_size:
+        warn("Actual vocabulary size ({}) is smaller than max_size ({})"
+             .format(len(vocabulary), max_size))
 
     if min_freq is not None:
         if min_freq > 1:
@@ -241,6 +414,93 @@ def from_dataset(datasets: List[Dataset], series_ids: List[str], max_size: int,
         vocabulary.save_wordlist(save_file, overwrite, True)
 
     return vocabulary
+# pylint: enable=too-many-arguments,too-many-locals
+
+
+def _count_chunk(sentences: List[List[str]]) -> collections.Counter:
+    counts = collections.Counter()  # type: collections.Counter
+    for sentence in sentences:
+        counts.update(sentence)
+    return counts
+
+
+def _count_chunks(series: Iterable[List[str]], chunk_size: int,
+                  num_workers: int) -> Iterable[collections.Counter]:
+    """Count words in chunks of the series, possibly in worker processes.
+
+    The counts are yielded in the order of the chunks, so merging them
+    preserves the order in which the words first appeared in the series.
+    """
+    series_iter = iter(series)
+    chunks = iter(lambda: list(islice(series_iter, chunk_size)), [])
+
+    if num_workers <= 1:
+        yield from map(_count_chunk, chunks)
+    else:
+        with multiprocessing.Pool(num_workers) as pool:
+            yield from pool.imap(_count_chunk, chunks)
+
+
+# A BLAKE2b digest has at most 64 bytes, 4 bytes for each row
+_MAX_SKETCH_DEPTH = 16
+
+
+class _ApproximateCounter(object):
+    """Memory-bounded approximate word counter.
+
+    The counts of all words are kept in a count-min sketch, a fixed-size
+    table of counters indexed by several hash functions. The estimate of a
+    count is the minimum over the rows of the table, so it is never lower
+    than the true count. The column of each row is taken from a different
+    part of a single BLAKE2 digest, so the rows are hashed independently.
+    Only a bounded number of candidate heavy hitters are kept together with
+    their estimated counts.
+    """
+
+    def __init__(self, max_tracked_words: int, depth: int = 4,
+                 width: int = 2 ** 20) -> None:
+        if not 0 < depth <= _MAX_SKETCH_DEPTH:
+            raise ValueError("The sketch depth must be between 1 and {}."
+                             .format(_MAX_SKETCH_DEPTH))
+
+        self.max_tracked_words = max_tracked_words
+        self.width = width
+        self.sketch = np.zeros([depth, width], dtype=np.int64)
+        self.rows = np.arange(depth)
+        self.candidates = {}  # type: Dict[str, int]
+
+    def _hashes(self, word: str) -> np.ndarray:
+        digest = hashlib.blake2b(word.encode("utf-8"),
+                                 digest_size=4 * len(self.rows)).digest()
+        return np.frombuffer(digest, dtype="<u4") % self.width
+
+    def update(self, counts: collections.Counter) -> None:
+        for word, count in counts.items():
+            columns = self._hashes(word)
+            self.sketch[self.rows, columns] += count
+            self.candidates[word] = int(self.sketch[self.rows, columns].min())
+
+        if len(self.candidates) > 2 * self.max_tracked_words:
+            self._prune()
+
+    def _prune(self) -> None:
+        to_keep = set(heapq.nlargest(
+            self.max_tracked_words, self.candidates,
+            key=self.candidates.__getitem__))
+        self.candidates = {w: c for w, c in self.candidates.items()
+                           if w in to_keep}
+
+    def items(self) -> List[Tuple[str, int]]:
+        self._prune()
+        return list(self.candidates.items())
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+
+# pylint: disable=invalid-name
+_WordCounter = Union[collections.Counter, _ApproximateCounter]
+# pylint: enable=invalid-name
 
 
 def initialize_vocabulary(directory: str, name: str,
@@ -339,6 +599,7 @@ class Vocabulary(collections.Sized):
             word: The word to add. If it's already there, increment the count.
             occurences: increment the count of word by the number of occurences
         """
+        self._ensure_mutable()
         if word not in self:
             self.word_to_index[word] = len(self.index_to_word)
             self.index_to_word.append(word)
@@ -348,7 +609,16 @@ class Vocabulary(collections.Sized):
         self.word_count[word] += occurences
 
     def add_characters(self, word: str) -> None:
-        self.alphabet |= {c for c in word}
+        self.alphabet.update(word)
+
+    def _ensure_mutable(self) -> None:
+        """Convert a memory-mapped vocabulary to the in-memory structures."""
+        if isinstance(self.index_to_word, list):
+            return
+
+        self.index_to_word = list(self.index_to_word)
+        self.word_to_index = {w: i for i, w in enumerate(self.index_to_word)}
+        self.word_count = dict(self.word_count.items())
 
     def add_tokenized_text(self, tokenized_text: List[str]) -> None:
         """Add words from a list to the vocabulary.
@@ -369,9 +639,10 @@ class Vocabulary(collections.Sized):
             Index of the word or index of the unknown token if the word is not
             present in the vocabulary.
         """
-        if word not in self:
-            return self.get_word_index(UNK_TOKEN)
-        return self.word_to_index[word]
+        index = self.word_to_index.get(word)
+        if index is None:
+            return self.word_to_index[UNK_TOKEN]
+        return index
 
     def get_unk_sampled_word_index(self, word):
         """Return index of the specified word with sampling of unknown words.
@@ -412,10 +683,7 @@ class Vocabulary(collections.Sized):
             raise ValueError("The vocabulary does not have correct "
                              "word_counts to use for vocabulary truncate")
 
-        # sort by frequency
-        # sorting words first makes vocabulary generation deterministic
-        words_by_freq = sorted(list(sorted(self.word_count.keys())),
-                               key=lambda w: self.word_count[w])
+        self._ensure_mutable()
 
         # keep the least frequent words which are not special symbols
         to_delete = len(self) - size
@@ -423,26 +691,21 @@ class Vocabulary(collections.Sized):
             to_delete = 0
             warn("Actual vocabulary size ({}) is smaller than max_size ({})"
                  .format(len(self), size))
-        words_to_delete = []  # type: List[str]
-        for word in words_by_freq:
-            if len(words_to_delete) == to_delete:
-                break
-            if not _is_special_token(word):
-                words_to_delete.append(word)
-
-        # sort by index ... bigger indices needs to be removed first
-        # to keep the lists propertly shaped
-        delete_words_by_index = sorted(
-            [(w, self.word_to_index[w]) for w in words_to_delete],
-            key=lambda p: -p[1])
-
-        for word, index in delete_words_by_index:
-            del self.word_count[word]
-            del self.index_to_word[index]
-
-        self.word_to_index = {}
-        for index, word in enumerate(self.index_to_word):
-            self.word_to_index[word] = index
+
+        # sort by frequency, ties are broken by the words themselves, which
+        # makes vocabulary generation deterministic
+        words_to_delete = set(heapq.nsmallest(
+            to_delete,
+            (w for w in self.word_count if not _is_special_token(w)),
+            key=lambda w: (self.word_count[w], w)))
+
+        if words_to_delete:
+            self.index_to_word = [w for w in self.index_to_word
+                                  if w not in words_to_delete]
+            self.word_to_index = {
+                w: i for i, w in enumerate(self.index_to_word)}
+            self.word_count = {w: self.word_count[w]
+                               for w in self.index_to_word}
 
     def truncate_by_min_freq(self, min_freq: int) -> None:
         """Truncate the vocabulary only keeping words with a minimum frequency.
@@ -612,6 +875,59 @@ class Vocabulary(collections.Sized):
 
                 output_file.write("\n")
 
+    def save_binary(self, path: str, overwrite: bool = False) -> None:
+        """Save the vocabulary in the compact binary format.
+
+        The file contains all the words in a single UTF-8 blob with an array
+        of offsets, an array of word counts and an open-addressing hash table
+        mapping words to their indices. The header also stores the
+        probability of sampling the unknown token. The file can be loaded
+        using :py:func:`from_binary` without parsing.
+
+        Arguments:
+            path: The path to save the file to.
+            overwrite: Flag whether to overwrite existing file.
+                Defaults to False.
+
+        Raises:
+            FileExistsError if the file exists and overwrite flag is
+            disabled.
+        """
+        if os.path.exists(path) and not overwrite:
+            raise FileExistsError("Cannot save vocabulary: File exists and "
+                                  "overwrite is disabled. {}".format(path))
+
+        encoded_words = [w.encode("utf-8") for w in self.index_to_word]
+        offsets = np.zeros(len(encoded_words) + 1, dtype="<i8")
+        offsets[1:] = np.cumsum([len(w) for w in encoded_words])
+        counts = np.array(
+            [self.word_count.get(w, 0) for w in self.index_to_word],
+            dtype="<i8")
+
+        table_size = 1
+        while table_size < 2 * len(encoded_words):
+            table_size *= 2
+        table = np.full(table_size, -1, dtype="<i8")
+        for index, word in enumerate(encoded_words):
+            slot = zlib.crc32(word) & (table_size - 1)
+            while table[slot] >= 0:
+                slot = (slot + 1) & (table_size - 1)
+            table[slot] = index
+
+        blob = b"".join(encoded_words)
+        alphabet = json.dumps(sorted(self.alphabet)).encode("utf-8")
+        header = np.array(
+            [len(encoded_words), table_size, len(blob), len(alphabet),
+             int(self.correct_counts), 0], dtype="<u8")
+        header[5:].view("<f8")[0] = self.unk_sample_prob
+
+        with open(path, "wb") as f_out:
+            f_out.write(_BINARY_MAGIC)
+            for part in [header.tobytes(), offsets.tobytes(),
+                         counts.tobytes(), table.tobytes(), blob, alphabet]:
+                f_out.write(part)
+                f_out.write(bytes(-len(part) % 8))
+
     def log_sample(self, size: int = 5) -> None:
         """Log a sample of the vocabulary.
 
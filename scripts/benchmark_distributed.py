@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Measure how the training throughput scales with the number of workers.
+
+The experiment is trained with each of the given numbers of worker
+processes (the 'workers' option of the main section). The script reports
+the training time and the speed-up relative to the first run. Each run
+writes to its own subdirectory of the benchmark directory.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from neuralmonkey.logging import log
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("config", metavar="INI-FILE",
+                        help="the configuration file for the experiment")
+    parser.add_argument("output", type=str,
+                        help="directory for the experiments of the runs")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="numbers of workers to benchmark")
+    parser.add_argument("-s", "--set", type=str, metavar="SETTING",
+                        action="append", dest="config_changes", default=[],
+                        help="override an option in the configuration, "
+                        "e.g. main.epochs=1")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+
+    times = []
+    for num_workers in args.workers:
+        run_output = os.path.join(
+            args.output, "workers.{}".format(num_workers))
+        command = [sys.executable, "-c",
+                   "from neuralmonkey.train import main; main()",
+                   args.config, "-f",
+                   "-s", "main.workers={}".format(num_workers),
+                   "-s", "main.output=\"{}\"".format(run_output)]
+        for change in args.config_changes:
+            command.extend(["-s", change])
+
+        log("Training with {} workers.".format(num_workers))
+        start_time = time.monotonic()
+        subprocess.run(command, check=True)
+        times.append(time.monotonic() - start_time)
+
+    print("workers\ttime [s]\tspeed-up\tefficiency")
+    for num_workers, duration in zip(args.workers, times):
+        speedup = times[0] / duration
+        efficiency = speedup * args.workers[0] / num_workers
+        print("{}\t{:.1f}\t{:.2f}\t{:.2f}".format(
+            num_workers, duration, speedup, efficiency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Compare the throughput of the standard and the fused recurrent encoders.
+
+For each cell type, the script builds an encoder RNN layer from the
+standard cells and the same layer computed by the fused kernels, which
+shares the variables of the first one. Both layers are run on the same
+random batches and the script reports the number of encoded tokens per
+second, the speed-up of the fused layer and the largest difference of the
+outputs of the two layers.
+
+By default, the layers run on CPU only.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+# pylint: disable=protected-access
+from neuralmonkey.encoders.recurrent import _make_rnn_spec, rnn_layer
+from neuralmonkey.logging import log
+
+
+def _tokens_per_second(sess: tf.Session, outputs: tf.Tensor,
+                       feed_dict, num_tokens: int, repeat: int) -> float:
+    # the first run allocates the memory and is not measured
+    sess.run(outputs, feed_dict)
+
+    start = time.monotonic()
+    for _ in range(repeat):
+        sess.run(outputs, feed_dict)
+    return num_tokens * repeat / (time.monotonic() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cell-types", type=str, nargs="+",
+                        default=["GRU", "LSTM"],
+                        help="the cell types to benchmark")
+    parser.add_argument("--direction", type=str, default="bidirectional",
+                        help="the direction of the RNN")
+    parser.add_argument("--rnn-size", type=int, default=512,
+                        help="the size of the RNN state")
+    parser.add_argument("--input-size", type=int, default=512,
+                        help="the dimension of the input embeddings")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="the number of sentences in a batch")
+    parser.add_argument("--max-length", type=int, default=50,
+                        help="the maximum length of the sentences")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="the number of measured runs")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="the number of threads of TensorFlow, 0 means "
+                        "the system default")
+    parser.add_argument("--gpu", action="store_true",
+                        help="allow running the layers on GPU")
+    args = parser.parse_args()
+
+    random = np.random.RandomState(0)
+    lengths_value = random.randint(
+        1, args.max_length + 1, size=args.batch_size).astype(np.int32)
+    lengths_value[0] = args.max_length
+    inputs_value = random.normal(
+        size=[args.batch_size, args.max_length, args.input_size])
+    num_tokens = int(lengths_value.sum())
+
+    session_config = tf.ConfigProto(
+        intra_op_parallelism_threads=args.threads,
+        inter_op_parallelism_threads=args.threads,
+        device_count={} if args.gpu else {"GPU": 0})
+
+    print("cell\tstandard [tok/s]\tfused [tok/s]\tspeed-up\tmax diff")
+    for cell_type in args.cell_types:
+        log("Benchmarking the {} cells.".format(cell_type))
+        with tf.Graph().as_default():
+            inputs = tf.placeholder(
+                tf.float32, [None, None, args.input_size], "inputs")
+            lengths = tf.placeholder(tf.int32, [None], "lengths")
+            feed_dict = {inputs: inputs_value, lengths: lengths_value}
+
+            with tf.variable_scope("encoder"):
+                standard, _ = rnn_layer(inputs, lengths, _make_rnn_spec(
+                    args.rnn_size, args.direction, cell_type))
+            with tf.variable_scope("encoder", reuse=True):
+                fused, _ = rnn_layer(inputs, lengths, _make_rnn_spec(
+                    args.rnn_size, args.direction, cell_type, fused=True))
+
+            with tf.Session(config=session_config) as sess:
+                sess.run(tf.global_variables_initializer())
+                standard_speed = _tokens_per_second(
+                    sess, standard, feed_dict, num_tokens, args.repeat)
+                fused_speed = _tokens_per_second(
+                    sess, fused, feed_dict, num_tokens, args.repeat)
+                standard_value, fused_value = sess.run(
+                    [standard, fused], feed_dict)
+
+        print("{}\t{:.0f}\t{:.0f}\t{:.2f}\t{:.2e}".format(
+            cell_type, standard_speed, fused_speed,
+            fused_speed / standard_speed,
+            np.max(np.abs(standard_value - fused_value))))
+
+
+if __name__ == "__main__":
+    main()
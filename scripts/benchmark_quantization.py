@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Compare the quality and speed of float and int8-quantized models.
+
+For each trained experiment, the script quantizes its checkpoint and runs
+the model from the original and from the quantized checkpoint on the test
+datasets. It reports the checkpoint size, the loading and the running time,
+the peak memory of the process and the evaluation results (e.g., BLEU).
+
+Each run happens in a separate process, so the memory measurements are not
+affected by the other runs. The experiments need to be trained first, e.g.,
+by ``tests/tests_run.sh`` for the configurations in ``tests/*.ini``.
+"""
+
+import argparse
+import glob
+import multiprocessing
+import numbers
+import os
+import resource
+import time
+from typing import Any, Dict, List
+
+from neuralmonkey.config.configuration import Configuration
+from neuralmonkey.experiment import Experiment
+from neuralmonkey.logging import log
+from neuralmonkey.quantization import quantize_checkpoint
+
+
+def _checkpoint_size(checkpoint: str) -> int:
+    return sum(os.path.getsize(path)
+               for path in glob.glob("{}.*".format(checkpoint)))
+
+
+def _measure(config: str, datasets: str, checkpoint: str,
+             quantized: bool) -> Dict[str, Any]:
+    test_datasets = Configuration()
+    test_datasets.add_argument("test_datasets")
+    test_datasets.add_argument("batch_size", cond=lambda x: x > 0)
+    test_datasets.add_argument("variables", required=False, default=None)
+    test_datasets.load_file(datasets)
+    test_datasets.build_model()
+    datasets_model = test_datasets.model
+
+    exp = Experiment(
+        config_path=config,
+        config_changes=["main.quantized={}".format(quantized)])
+
+    start = time.monotonic()
+    exp.build_model()
+    exp.load_variables([checkpoint])
+    load_time = time.monotonic() - start
+
+    start = time.monotonic()
+    results = {}  # type: Dict[str, float]
+    for dataset in datasets_model.test_datasets:
+        if exp.config.args.evaluation is None:
+            exp.run_model(dataset, batch_size=datasets_model.batch_size)
+            continue
+        eval_result = exp.evaluate(dataset,
+                                   batch_size=datasets_model.batch_size)
+        results.update(("{}/{}".format(dataset.name, name), value)
+                       for name, value in eval_result.items())
+    run_time = time.monotonic() - start
+
+    for session in exp.config.model.tf_manager.sessions:
+        session.close()
+
+    return {"load_time": load_time,
+            "run_time": run_time,
+            # kilobytes on Linux
+            "peak_memory": resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("datasets", metavar="INI-TEST-DATASETS",
+                        help="the configuration of the test datasets")
+    parser.add_argument("configs", metavar="INI-FILE", nargs="+",
+                        help="configurations of the trained experiments")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    rows = []  # type: List[List[Any]]
+    for config in args.configs:
+        exp = Experiment(config_path=config)
+        checkpoint = exp.get_path("variables.data")
+        quantized_checkpoint = exp.get_path("variables.int8")
+
+        log("Quantizing {}".format(checkpoint))
+        quantize_checkpoint(checkpoint, quantized_checkpoint)
+
+        for quantized, variables in [(False, checkpoint),
+                                     (True, quantized_checkpoint)]:
+            log("Running {} with {}".format(config, variables))
+            with context.Pool(1) as pool:
+                measured = pool.apply(
+                    _measure, (config, args.datasets, variables, quantized))
+
+            rows.append([
+                os.path.basename(config),
+                "int8" if quantized else "float",
+                _checkpoint_size(variables) / 2**20,
+                measured["load_time"], measured["run_time"],
+                measured["peak_memory"],
+                ", ".join("{} {:.4g}".format(name, value)
+                          for name, value in sorted(
+                              measured["results"].items())
+                          if isinstance(value, numbers.Real))])
+
+    print("config\tweights\tsize [MB]\tload [s]\trun [s]\tmemory [MB]\t"
+          "results")
+    for row in rows:
+        print("{}\t{}\t{:.2f}\t{:.2f}\t{:.2f}\t{:.0f}\t{}".format(*row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Build a lexical table for the vocabulary shortlist of a decoder.
+
+The table lists the most probable translations of each source word in
+lines ``source target probability``. With word alignments (one sentence
+per line in the ``s-t`` format used by WordAlignmentPreprocessor), the
+probability is estimated from the aligned word pairs. Without them, the
+co-occurrence of the words in the sentence pairs is scored by the Dice
+coefficient.
+"""
+
+import argparse
+from collections import Counter
+from itertools import repeat
+import re
+from typing import Dict  # pylint: disable=unused-import
+
+from neuralmonkey.logging import log as _log
+
+ID_SEP = re.compile(r"[-:]")
+
+
+def log(message: str, color: str = "blue") -> None:
+    _log(message, color)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", type=str,
+                        help="tokenized source side of the parallel corpus")
+    parser.add_argument("target", type=str,
+                        help="tokenized target side of the parallel corpus")
+    parser.add_argument("output", type=str, help="the lexical table")
+    parser.add_argument("--alignment", type=str, default=None,
+                        help="word alignment of the corpus")
+    parser.add_argument("--top", type=int, default=100,
+                        help="number of translations kept for a word")
+    args = parser.parse_args()
+
+    source_counts = Counter()  # type: Counter
+    target_counts = Counter()  # type: Counter
+    pair_counts = Counter()  # type: Counter
+
+    log("Counting word pairs.")
+    with open(args.source, encoding="utf-8") as f_src, \
+            open(args.target, encoding="utf-8") as f_tgt:
+        f_ali = (open(args.alignment, encoding="utf-8")
+                 if args.alignment else repeat(None))
+        for src_line, tgt_line, ali_line in zip(f_src, f_tgt, f_ali):
+            src_words, tgt_words = src_line.split(), tgt_line.split()
+            if ali_line is None:
+                src_set, tgt_set = set(src_words), set(tgt_words)
+                source_counts.update(src_set)
+                target_counts.update(tgt_set)
+                pair_counts.update((s, t) for s in src_set for t in tgt_set)
+            else:
+                source_counts.update(src_words)
+                for pair in ali_line.split():
+                    i, j = [int(idx) for idx in
+                            ID_SEP.split(pair.partition("/")[0])]
+                    pair_counts[(src_words[i], tgt_words[j])] += 1
+        if args.alignment:
+            f_ali.close()
+
+    translations = {}  # type: Dict[str, Counter]
+    for (src, tgt), count in pair_counts.items():
+        if args.alignment:
+            score = count / source_counts[src]
+        else:
+            score = 2 * count / (source_counts[src] + target_counts[tgt])
+        translations.setdefault(src, Counter())[tgt] = score
+
+    log("Writing translations of {} source words.".format(len(translations)))
+    with open(args.output, "w", encoding="utf-8") as f_out:
+        for src in sorted(translations):
+            for tgt, score in translations[src].most_common(args.top):
+                print("{} {} {:.6g}".format(src, tgt, score), file=f_out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Quantize the weight matrices in a checkpoint to 8-bit integers.
+
+The embedding matrices and the output projections are stored as int8
+matrices with a float32 scale for each word, which makes them about four
+times smaller. To run the model from the quantized checkpoint, set
+``quantized=True`` in the main section of the experiment configuration.
+"""
+
+import argparse
+
+from neuralmonkey.logging import log as _log
+from neuralmonkey.quantization import quantize_checkpoint
+
+
+def log(message: str, color: str = "blue") -> None:
+    _log(message, color)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("checkpoint", metavar="EXPERIMENT-CHECKPOINT",
+                        help="path to the original checkpoint")
+    parser.add_argument("output_path", metavar="OUTPUT-CHECKPOINT",
+                        help="path to the quantized checkpoint")
+    args = parser.parse_args()
+
+    log("Quantizing checkpoint {}".format(args.checkpoint))
+    quantized = quantize_checkpoint(args.checkpoint, args.output_path)
+    log("Quantized variables: {}".format(", ".join(quantized)))
+    log("Quantized checkpoint saved to {}".format(args.output_path))
+
+
+if __name__ == "__main__":
+    main()
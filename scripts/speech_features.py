@@ -3,8 +3,13 @@
 This script precomputes speech features for a given set of recordings and
 saves them as a list of NumPy arrays.
 
+With --ragged, the features are computed in parallel and saved into a ragged
+array store which can be memory-mapped during training using
+readers.numpy_reader.ragged_array_reader.
+
 usage example:
   %(prog)s src.train src.train.npy -t mfcc -o delta_order 2
+  %(prog)s src.train src.train.feats --ragged -j 8 -t mfcc -o delta_order 2
 """
 
 import argparse
@@ -13,7 +18,8 @@ from typing import Union
 
 import numpy as np
 
-from neuralmonkey.processors.speech import SpeechFeaturesPreprocessor
+from neuralmonkey.processors.speech import (
+    SpeechFeaturesPreprocessor, extract_features)
 from neuralmonkey.readers.audio_reader import audio_reader
 
 
@@ -47,6 +53,11 @@ def main():
                         nargs=2, action='append', default=[],
                         metavar=('OPTION', 'VALUE'),
                         help='other arguments for SpeechFeaturesPreprocessor')
+    parser.add_argument('--ragged', action='store_true',
+                        help='write a ragged array store instead of .npy')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes used with --ragged '
+                        '(default: %(default)s)')
 
     args = parser.parse_args()
 
@@ -57,6 +68,12 @@ def main():
 
     feats_kwargs = {k: try_parse_number(v) for k, v in args.option}
 
+    if args.ragged:
+        extract_features([args.input], args.output, prefix=prefix,
+                         audio_format=args.format, num_workers=args.jobs,
+                         feature_type=args.type, **feats_kwargs)
+        return
+
     read = audio_reader(prefix=prefix, audio_format=args.format)
     process = SpeechFeaturesPreprocessor(
         feature_type=args.type, **feats_kwargs)
@@ -28,6 +28,8 @@ export NM_EXPERIMENT_NAME='"small"'
 bin/neuralmonkey-run tests/small.ini tests/test_data.ini
 bin/neuralmonkey-run tests/small.ini tests/test_data.ini --json /dev/stdout \
     | python -c 'import sys,json; print(json.load(sys.stdin)[0]["target/bleu"])'
+bin/neuralmonkey-export tests/small.ini tests/outputs/small-export
+python -c 'from neuralmonkey.frozen_model import FrozenModel; print(FrozenModel("tests/outputs/small-export").run({"source": [["I", "am", "the", "walrus", "."]]}))'
 unset NM_EXPERIMENT_NAME
 
 bin/neuralmonkey-train tests/small_sent_cnn.ini